@@ -0,0 +1,237 @@
+"""
+One chat turn, shared by the HTTP and WebSocket endpoints:
+save the user message, build the prompt, call the LLM (optionally
+streaming tokens) and save the reply. Memory commands in the message are
+applied after the turn, on the post-turn executor.
+"""
+import logging
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlmodel import Session
+
+from ..crud import delete_user_memory, load_user_memory, save_user_memory
+from ..models import Bot, Conversation, Message
+from ..utils.bot_memory import select_bot_memory
+from ..utils.branches import message_scope
+from ..sharding import bind_user, new_session
+from ..utils.deadline import PARTIAL_SUFFIX, Deadline, DeadlineExceeded, deadline_scope
+from ..utils.memory import extract_user_memory
+from ..utils.post_turn import post_turn
+from ..utils.turn_buffer import record_turn, recent_turns
+from . import llm
+from .retrieval import retrieve
+
+CHAT_MODEL = "llama-3.1-8b-instant"
+MAX_TOKENS = 512
+UNAVAILABLE_REPLY = "⚠️ AI is temporarily unavailable."
+
+logger = logging.getLogger(__name__)
+
+
+def message_out(msg: Message) -> Dict:
+    return {
+        "id": msg.id,
+        "role": msg.role,
+        "text": msg.text,
+        "created_at": msg.created_at.isoformat(),
+        "latency_ms": msg.latency_ms,
+    }
+
+
+# ─────────────────────────────────────────────
+# USER MESSAGE + MEMORY
+# ─────────────────────────────────────────────
+
+def save_user_message(db: Session, conv: Conversation, text: str) -> Message:
+    """Store the user's message; call after_turn() once the reply is out."""
+    msg = Message(conversation_id=conv.id, role="user", text=text)
+    db.add(msg)
+    db.commit()
+    db.refresh(msg)
+    record_turn(msg)
+    return msg
+
+
+def after_turn(user_id: int, bot_id: int, text: str):
+    """Queue the work the reply does not depend on, in order per (user, bot)."""
+    post_turn.submit((user_id, bot_id), "user_memory", lambda: apply_memory_commands(user_id, bot_id, text))
+
+
+def apply_memory_commands(user_id: int, bot_id: int, text: str):
+    memory_to_save, memory_to_delete = extract_user_memory(text)
+    if not memory_to_save and not memory_to_delete:
+        return
+    with new_session() as db:
+        bind_user(db, user_id)
+        for key in memory_to_delete:
+            delete_user_memory(db, user_id=user_id, bot_id=bot_id, key=key)
+        for key, value in memory_to_save.items():
+            save_user_memory(db, user_id=user_id, bot_id=bot_id, key=key, value=value)
+
+
+# ─────────────────────────────────────────────
+# PROMPT
+# ─────────────────────────────────────────────
+
+def build_chat_messages(db: Session, bot: Bot, conv: Conversation, user_id: int, text: str) -> List[Dict]:
+    """System prompt (user memory, bot memory, knowledge) plus history."""
+    # Memory written after earlier turns of this user with this bot
+    post_turn.wait_idle((user_id, bot.id))
+    user_memory = load_user_memory(db, user_id=user_id, bot_id=bot.id)
+    system_prompt = build_system_prompt(db, bot, text, user_memory)
+    return [{"role": "system", "content": system_prompt}] + history_messages(db, conv)
+
+
+def history_messages(db: Session, conv: Conversation) -> List[Dict]:
+    """Conversation history (last 10, from the in-memory ring when active)."""
+    return [
+        {"role": "assistant" if m.role == "bot" else "user", "content": m.text}
+        for m in recent_turns(db, conv.id, message_scope(db, conv))
+    ]
+
+
+def build_system_prompt(db: Session, bot: Bot, text: str, user_memory: Dict[str, str]) -> str:
+    """Bot prompt plus user memory, bot memory and knowledge relevant to `text`."""
+    return with_bot_prompt(bot.system_prompt, prompt_context(db, bot, text, user_memory))
+
+
+def with_bot_prompt(system_prompt: str, context: str) -> str:
+    return f"""
+{system_prompt}
+
+{context}"""
+
+
+def prompt_context(db: Session, bot: Bot, text: str, user_memory: Dict[str, str]) -> str:
+    """User memory, bot memory and knowledge relevant to `text`."""
+    memory_prompt = ""
+    if user_memory:
+        memory_prompt = "User memory:\n"
+        for k, v in user_memory.items():
+            memory_prompt += f"- {k}: {v}\n"
+
+    settings = bot.settings or {}
+    bot_memory = select_bot_memory(
+        db,
+        bot.id,
+        token_budget=int(settings.get("memory_token_budget", 300)),
+        k=int(settings.get("memory_k", 20)),
+    )
+    if bot_memory:
+        memory_prompt = "Bot memory:\n" + "\n".join(bot_memory) + "\n" + memory_prompt
+
+    knowledge = retrieve(
+        bot.id,
+        text,
+        k=int(settings.get("retrieval_k", 3)),
+        hybrid=bool(settings.get("retrieval_hybrid", False)),
+    )
+
+    knowledge_prompt = ""
+    if knowledge:
+        knowledge_prompt = "Relevant knowledge:\n"
+        for chunk in knowledge:
+            knowledge_prompt += f"- {chunk}\n"
+
+    logger.debug(
+        "memory injected",
+        extra={
+            "memory": memory_prompt,
+            "bot_memory_lines": len(bot_memory),
+            "knowledge_chunks": len(knowledge),
+        },
+    )
+    return f"{memory_prompt}\n{knowledge_prompt}\n"
+
+
+# ─────────────────────────────────────────────
+# LLM CALL
+# ─────────────────────────────────────────────
+
+def complete(bot: Bot, chat_messages: List[Dict], deadline: Optional[Deadline] = None) -> str:
+    try:
+        return llm.complete(chat_messages, CHAT_MODEL, bot.temperature, MAX_TOKENS, deadline=deadline)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.warning("llm call failed", extra={"bot_id": bot.id, "error": f"{type(e).__name__}: {e}"})
+        return UNAVAILABLE_REPLY
+
+
+def stream_completion(bot: Bot, chat_messages: List[Dict], deadline: Optional[Deadline] = None) -> Iterator[str]:
+    """Yield reply tokens as they arrive; falls back to the unavailable reply."""
+    sent = False
+    try:
+        for delta in llm.stream(chat_messages, CHAT_MODEL, bot.temperature, MAX_TOKENS, deadline=deadline):
+            sent = True
+            yield delta
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.warning("llm stream failed", extra={"bot_id": bot.id, "error": f"{type(e).__name__}: {e}"})
+        if not sent:
+            yield UNAVAILABLE_REPLY
+
+
+def save_bot_reply(db: Session, conv: Conversation, text: str, latency_ms: int) -> Message:
+    msg = Message(conversation_id=conv.id, role="bot", text=text, latency_ms=latency_ms)
+    db.add(msg)
+    db.commit()
+    db.refresh(msg)
+    record_turn(msg)
+    return msg
+
+
+def run_turn(
+    db: Session,
+    bot: Bot,
+    conv: Conversation,
+    user_id: int,
+    text: str,
+    on_user_message: Optional[Callable[[Message], None]] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    deadline: Optional[Deadline] = None,
+) -> Message:
+    """
+    Full turn. With `on_token` the reply is streamed token by token;
+    returns the saved bot message. Raises DeadlineExceeded when `deadline`
+    passes or is cancelled (see utils.deadline for what is saved then).
+    """
+    start_time = time.time()
+    if deadline is not None:
+        deadline.apply_default((bot.settings or {}).get("request_timeout_ms"))
+
+    parts: List[str] = []
+    turn_started = False
+    with deadline_scope(deadline):
+        try:
+            user_msg = save_user_message(db, conv, text)
+            turn_started = True
+            if on_user_message:
+                on_user_message(user_msg)
+
+            chat_messages = build_chat_messages(db, bot, conv, user_id, text)
+
+            if on_token is None:
+                reply_text = complete(bot, chat_messages, deadline)
+            else:
+                for token in stream_completion(bot, chat_messages, deadline):
+                    parts.append(token)
+                    on_token(token)
+                reply_text = "".join(parts)
+        except DeadlineExceeded as e:
+            logger.info("turn cancelled", extra={"conversation_id": conv.id, "reason": e.reason, "streamed_tokens": len(parts)})
+            if parts:
+                # Clients already saw these tokens: keep them in the history
+                db.rollback()
+                with deadline_scope(None):
+                    save_bot_reply(db, conv, "".join(parts) + PARTIAL_SUFFIX, int((time.time() - start_time) * 1000))
+            if turn_started:
+                after_turn(user_id, bot.id, text)
+            raise
+
+    latency_ms = int((time.time() - start_time) * 1000)
+    bot_msg = save_bot_reply(db, conv, reply_text, latency_ms)
+    after_turn(user_id, bot.id, text)
+    return bot_msg
@@ -0,0 +1,165 @@
+"""
+Side-by-side comparison: one prompt, several models or bot configs.
+
+The shared part of the prompt (user memory, bot memory, knowledge and
+history) is built once. Each branch only swaps the bot prompt, model,
+temperature or provider. Branches run concurrently, each under its own
+timeout, and results are yielded as they finish; calls are not hedged,
+so a branch's latency is that of one request.
+
+Nothing is written to the conversation until choose_branch() saves the
+user message with the picked answer. Comparisons are kept in memory
+(the last MAX_TRACKED_COMPARISONS) for that.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+from sqlmodel import Session
+
+from ..crud import load_user_memory
+from ..models import Bot, Conversation, Message
+from ..schemas import CompareBranch
+from ..utils.deadline import DISCONNECT, TIMEOUT, Deadline, DeadlineExceeded
+from ..utils.post_turn import post_turn
+from . import llm
+from .chat import (
+    CHAT_MODEL, MAX_TOKENS, after_turn, history_messages, prompt_context, save_bot_reply,
+    save_user_message, with_bot_prompt,
+)
+
+COMPARE_WORKERS = 16
+MAX_TRACKED_COMPARISONS = 1000
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=COMPARE_WORKERS, thread_name_prefix="compare")
+
+
+class Comparison:
+    def __init__(self, bot: Bot, conv: Conversation, user_id: int, text: str, branches: List[CompareBranch]):
+        self.id = uuid.uuid4().hex
+        self.bot_id = bot.id
+        self.conversation_id = conv.id
+        self.user_id = user_id
+        self.text = text
+        self.branches = branches
+        self.chat_messages: List[List[Dict]] = []
+        self.results: Dict[int, Dict] = {}
+
+
+_comparisons: "OrderedDict[str, Comparison]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def branch_pool(branch: CompareBranch) -> List[llm.Provider]:
+    pool = llm.unhedged_pool()
+    if branch.provider is None:
+        return pool
+    chosen = [p for p in pool if p.name == branch.provider]
+    if not chosen:
+        raise ValueError(f"Unknown provider {branch.provider!r}; configured: {[p.name for p in pool]}")
+    return chosen
+
+
+def start_comparison(db: Session, bot: Bot, conv: Conversation, user_id: int, text: str,
+                     branches: List[CompareBranch]) -> Comparison:
+    """Build the shared context once; raises ValueError for an unknown provider."""
+    for branch in branches:
+        branch_pool(branch)
+
+    comparison = Comparison(bot, conv, user_id, text, branches)
+    post_turn.wait_idle((user_id, bot.id))
+    user_memory = load_user_memory(db, user_id=user_id, bot_id=bot.id)
+    context = prompt_context(db, bot, text, user_memory)
+    history = history_messages(db, conv) + [{"role": "user", "content": text}]
+
+    for branch in branches:
+        system_prompt = with_bot_prompt(branch.system_prompt or bot.system_prompt, context)
+        comparison.chat_messages.append([{"role": "system", "content": system_prompt}] + history)
+
+    with _lock:
+        _comparisons[comparison.id] = comparison
+        while len(_comparisons) > MAX_TRACKED_COMPARISONS:
+            _comparisons.popitem(last=False)
+    return comparison
+
+
+def _run_branch(index: int, branch: CompareBranch, chat_messages: List[Dict], temperature: float,
+                deadline: Deadline) -> Dict:
+    model = branch.model or CHAT_MODEL
+    result = {"branch": index, "label": branch.label or model, "model": model, "provider": branch.provider}
+    start = time.perf_counter()
+    try:
+        text = llm.complete(chat_messages, model, temperature, MAX_TOKENS, pool=branch_pool(branch), deadline=deadline)
+        result.update(status="ok", text=text)
+    except DeadlineExceeded as e:
+        result.update(status="timeout" if e.reason == TIMEOUT else "cancelled", text=None)
+    except Exception as e:
+        result.update(status="error", text=None, error=f"{type(e).__name__}: {e}")
+    result["latency_ms"] = int((time.perf_counter() - start) * 1000)
+    return result
+
+
+def run_comparison(comparison: Comparison, bot_temperature: float) -> Iterator[Dict]:
+    """
+    Yield each branch's result as it finishes, then a summary with the
+    wall time next to the serial total (the sum of branch latencies).
+    Closing the iterator early cancels the branches still running.
+    """
+    deadlines = [Deadline(branch.timeout_ms) for branch in comparison.branches]
+    start = time.perf_counter()
+    futures = [
+        _executor.submit(
+            _run_branch, i, branch, comparison.chat_messages[i],
+            branch.temperature if branch.temperature is not None else bot_temperature, deadlines[i],
+        )
+        for i, branch in enumerate(comparison.branches)
+    ]
+
+    try:
+        for future in as_completed(futures):
+            result = future.result()
+            comparison.results[result["branch"]] = result
+            yield {"type": "branch", **result}
+    finally:
+        for deadline in deadlines:
+            deadline.cancel(DISCONNECT)
+
+    wall_ms = int((time.perf_counter() - start) * 1000)
+    serial_ms = sum(r["latency_ms"] for r in comparison.results.values())
+    answered = [r for r in comparison.results.values() if r["status"] == "ok"]
+    summary = {
+        "type": "summary",
+        "compare_id": comparison.id,
+        "wall_ms": wall_ms,
+        "serial_ms": serial_ms,
+        "speedup": round(serial_ms / wall_ms, 2) if wall_ms else None,
+        "fastest": min(answered, key=lambda r: r["latency_ms"])["branch"] if answered else None,
+    }
+    logger.info("comparison finished", extra={"bot_id": comparison.bot_id, "branches": len(futures), **summary})
+    yield summary
+
+
+def get_comparison(compare_id: str) -> Optional[Comparison]:
+    with _lock:
+        return _comparisons.get(compare_id)
+
+
+def choose_branch(db: Session, comparison: Comparison, conv: Conversation, index: int) -> List[Message]:
+    """Save the prompt and the chosen answer as a normal turn; returns both messages."""
+    result = comparison.results.get(index)
+    if not result or result["status"] != "ok":
+        raise ValueError("Branch has no answer")
+    with _lock:
+        if _comparisons.pop(comparison.id, None) is None:
+            raise ValueError("Comparison already saved")
+
+    user_msg = save_user_message(db, conv, comparison.text)
+    bot_msg = save_bot_reply(db, conv, result["text"], result["latency_ms"])
+    after_turn(comparison.user_id, comparison.bot_id, comparison.text)
+    return [user_msg, bot_msg]
@@ -0,0 +1,444 @@
+"""
+Offline evaluation of a bot over a TrainingDataset.
+
+Every example's prompt goes through the same system prompt assembly as a
+chat turn (bot prompt, bot memory, knowledge; no user memory, no
+history) and one LLM call; the reply, latency and any error are stored
+as an EvalResult. A run can override the bot's system prompt, model and
+temperature, so a change can be compared with the current settings
+before it is saved.
+
+- Concurrency: `concurrency` calls in flight per run.
+- Rate limits: one token bucket per provider, EVAL_RPS requests/s
+  ("5", or "primary=5,backup=2"), shared by all runs in the process. A
+  429 halves that provider's rate and retries after Retry-After; the
+  rate then creeps back up. Evaluation calls are not hedged.
+- Checkpoints: results are committed every CHECKPOINT_EVERY replies and
+  the examples that already have one are skipped, so an interrupted
+  run (crash, restart, Ctrl-C, cancel) resumes where it stopped.
+
+    python -m backend.ai.evals run --bot-id 1 --dataset-id 2 --concurrency 8
+    python -m backend.ai.evals resume 7
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import exists, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from ..models import Bot, EvalResult, EvalRun, TrainingExample
+from ..sharding import new_session
+from ..utils.sketches import add_latency, quantiles
+from . import llm
+from .chat import CHAT_MODEL, MAX_TOKENS, build_system_prompt
+
+EVAL_RPS = os.getenv("EVAL_RPS", "5")
+MIN_RPS = 0.2
+MAX_RATE_LIMIT_RETRIES = 5
+CHECKPOINT_EVERY = 25
+CHECKPOINT_SECONDS = 2.0
+PAGE_SIZE = 200
+
+BOT_OVERRIDES = ("system_prompt", "temperature")
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────
+# PROVIDER RATE LIMITS
+# ─────────────────────────────────────────────
+
+class RateLimiter:
+    """Token bucket; throttle() on a 429 halves the rate, successes add it back in steps."""
+
+    def __init__(self, rps: float, burst: float = 1.0, clock=time.monotonic):
+        self.max_rps = rps
+        self.rps = rps
+        self.burst = max(burst, 1.0)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rps)
+                self._updated = now
+                wait_s = max(self._paused_until - now, 0.0)
+                if not wait_s:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait_s = (1 - self._tokens) / self.rps
+            time.sleep(wait_s)
+
+    def throttle(self, retry_after_s: Optional[float] = None):
+        with self._lock:
+            # Calls in flight get their 429s together: halve once per pause
+            if self.clock() >= self._paused_until:
+                self.rps = max(MIN_RPS, self.rps / 2)
+            self._tokens = 0.0
+            pause = retry_after_s if retry_after_s is not None else 1 / self.rps
+            self._paused_until = max(self._paused_until, self.clock() + pause)
+
+    def recover(self):
+        with self._lock:
+            self.rps = min(self.max_rps, self.rps + self.max_rps / 20)
+
+
+def _parse_rps(value: str) -> Dict[str, float]:
+    """'5' (every provider) or 'primary=5,backup=2'."""
+    rates = {}
+    for item in filter(None, value.split(",")):
+        name, _, rps = item.rpartition("=")
+        rates[name.strip() or "*"] = float(rps)
+    return rates
+
+
+_rates = _parse_rps(EVAL_RPS)
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(provider: llm.Provider) -> RateLimiter:
+    with _limiters_lock:
+        if provider.name not in _limiters:
+            rps = _rates.get(provider.name, _rates.get("*", 5.0))
+            _limiters[provider.name] = RateLimiter(rps, burst=rps)
+        return _limiters[provider.name]
+
+
+def _target(pool: List[llm.Provider]) -> llm.Provider:
+    """Provider the next call goes to: the first one whose breaker is not open."""
+    for provider in pool:
+        if provider.breaker.state != llm.CircuitBreaker.OPEN:
+            return provider
+    return pool[0]
+
+
+def _rate_limited(e: Exception) -> Tuple[bool, Optional[float]]:
+    """Is it worth waiting and retrying (429, or every breaker open)? And for how long."""
+    if isinstance(e, llm.ProviderUnavailable) and e.__cause__ is None:
+        return True, None
+    cause = e.__cause__ or e
+    if getattr(cause, "status_code", None) != 429:
+        return False, None
+    headers = getattr(getattr(cause, "response", None), "headers", None) or {}
+    try:
+        return True, float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return True, None
+
+
+# ─────────────────────────────────────────────
+# ONE EXAMPLE
+# ─────────────────────────────────────────────
+
+def eval_bot(bot: Bot, config: Dict) -> Bot:
+    """Detached copy of the bot with the run's overrides applied."""
+    values = bot.model_dump()
+    values.update({k: config[k] for k in BOT_OVERRIDES if config.get(k) is not None})
+    return Bot(**values)
+
+
+def evaluate_example(bot: Bot, model: str, prompt: str) -> Dict:
+    with new_session() as db:
+        system_prompt = build_system_prompt(db, bot, prompt, {})
+    chat_messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+
+    pool = llm.unhedged_pool()
+    attempts = 0
+    while True:
+        attempts += 1
+        limiter = limiter_for(_target(pool))
+        limiter.acquire()
+        start = time.perf_counter()
+        try:
+            reply = llm.complete(chat_messages, model, bot.temperature, MAX_TOKENS, pool=pool)
+        except Exception as e:
+            limited, retry_after = _rate_limited(e)
+            if limited and attempts <= MAX_RATE_LIMIT_RETRIES:
+                limiter.throttle(retry_after)
+                continue
+            return {"reply": None, "error": f"{type(e).__name__}: {e}", "attempts": attempts,
+                    "latency_ms": int((time.perf_counter() - start) * 1000)}
+        limiter.recover()
+        return {"reply": reply, "error": None, "attempts": attempts,
+                "latency_ms": int((time.perf_counter() - start) * 1000)}
+
+
+# ─────────────────────────────────────────────
+# RUNS
+# ─────────────────────────────────────────────
+
+_active: Dict[int, threading.Event] = {}
+_active_lock = threading.Lock()
+
+
+def create_run(db: Session, bot: Bot, dataset_id: int, config: Dict) -> EvalRun:
+    run = EvalRun(bot_id=bot.id, dataset_id=dataset_id, config=config)
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    return run
+
+
+def is_active(run_id: int) -> bool:
+    with _active_lock:
+        return run_id in _active
+
+
+def cancel_run(db: Session, run: EvalRun):
+    """Stop a running run after its in-flight calls; it can be resumed."""
+    with _active_lock:
+        stop = _active.get(run.id)
+    if stop:
+        stop.set()
+    if run.status in ("queued", "running"):
+        run.status = "cancelled"
+        run.finished_at = datetime.utcnow()
+        db.add(run)
+        db.commit()
+
+
+def _examples(db: Session, run: EvalRun, limit: Optional[int]):
+    scope = select(TrainingExample.id).where(TrainingExample.dataset_id == run.dataset_id)
+    total = db.exec(select(func.count()).select_from(scope.subquery())).one()
+    last_id = None
+    if limit and limit < total:
+        total = limit
+        last_id = db.exec(scope.order_by(TrainingExample.id).offset(limit - 1).limit(1)).one()
+    return total, last_id
+
+
+def _pending(run_id: int, dataset_id: int, last_id: Optional[int]) -> Iterator[Tuple[int, str]]:
+    """(example_id, prompt) without a result yet, in id order."""
+    after = 0
+    while True:
+        with new_session() as db:
+            query = (
+                select(TrainingExample.id, TrainingExample.prompt)
+                .where(
+                    TrainingExample.dataset_id == dataset_id,
+                    TrainingExample.id > after,
+                    ~exists().where(EvalResult.run_id == run_id, EvalResult.example_id == TrainingExample.id),
+                )
+                .order_by(TrainingExample.id)
+                .limit(PAGE_SIZE)
+            )
+            if last_id is not None:
+                query = query.where(TrainingExample.id <= last_id)
+            page = db.exec(query).all()
+        if not page:
+            return
+        yield from page
+        after = page[-1][0]
+
+
+def _checkpoint(db: Session, run: EvalRun, rows: List[Dict]):
+    if rows:
+        stmt = sqlite_insert(EvalResult.__table__).on_conflict_do_nothing(index_elements=["run_id", "example_id"])
+        db.execute(stmt, rows)
+    hist = dict(run.latency_hist or {})
+    for row in rows:
+        if row.get("error"):
+            run.failed += 1
+        else:
+            run.completed += 1
+            add_latency(hist, row["latency_ms"])
+    run.latency_hist = hist
+    db.add(run)
+    db.commit()
+
+
+def run_eval(run_id: int, on_progress=None) -> Optional[EvalRun]:
+    """
+    Run (or resume) an evaluation to the end; blocks. Returns the run, or
+    None when it is already running in this process.
+    """
+    stop = threading.Event()
+    with _active_lock:
+        if run_id in _active:
+            return None
+        _active[run_id] = stop
+
+    try:
+        with new_session() as db:
+            run = db.get(EvalRun, run_id)
+            bot = db.get(Bot, run.bot_id) if run else None
+            if not run or not bot:
+                return run
+            config = dict(run.config or {})
+            total, last_id = _examples(db, run, config.get("limit"))
+            run.total = total
+            run.status = "running"
+            run.error = None
+            run.finished_at = None
+            run.started_at = run.started_at or datetime.utcnow()
+            db.add(run)
+            db.commit()
+            logger.info("eval started", extra={"run_id": run_id, "bot_id": bot.id, "total": total,
+                                               "done": run.completed + run.failed})
+
+            target = eval_bot(bot, config)
+            model = config.get("model") or CHAT_MODEL
+            concurrency = int(config.get("concurrency", 4))
+            examples = _pending(run_id, run.dataset_id, last_id)
+            buffered: List[Dict] = []
+            last_checkpoint = time.monotonic()
+
+            try:
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"eval-{run_id}") as ex:
+                    in_flight = {}
+                    while True:
+                        while not stop.is_set() and len(in_flight) < concurrency * 2:
+                            example = next(examples, None)
+                            if example is None:
+                                break
+                            in_flight[ex.submit(evaluate_example, target, model, example[1])] = example[0]
+                        if not in_flight:
+                            break
+
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            buffered.append({"run_id": run_id, "example_id": in_flight.pop(future), **future.result()})
+
+                        if len(buffered) >= CHECKPOINT_EVERY or time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+                            _checkpoint(db, run, buffered)
+                            buffered, last_checkpoint = [], time.monotonic()
+                            if on_progress:
+                                on_progress(run)
+                            db.refresh(run)
+                            if run.status == "cancelled":
+                                stop.set()
+            except BaseException:
+                stop.set()
+                raise
+            finally:
+                _checkpoint(db, run, buffered)
+
+            if run.status != "cancelled":
+                run.status = "cancelled" if stop.is_set() else "done"
+            run.finished_at = datetime.utcnow()
+            db.add(run)
+            db.commit()
+            db.refresh(run)
+            logger.info("eval finished", extra={"run_id": run_id, "status": run.status,
+                                                "completed": run.completed, "failed": run.failed})
+            return run
+    except Exception as e:
+        logger.exception("eval failed", extra={"run_id": run_id})
+        with new_session() as db:
+            run = db.get(EvalRun, run_id)
+            if run:
+                run.status = "failed"
+                run.error = f"{type(e).__name__}: {e}"
+                run.finished_at = datetime.utcnow()
+                db.add(run)
+                db.commit()
+        return run
+    finally:
+        with _active_lock:
+            _active.pop(run_id, None)
+
+
+def run_out(run: EvalRun) -> Dict:
+    return {
+        "run_id": run.id,
+        "bot_id": run.bot_id,
+        "dataset_id": run.dataset_id,
+        "status": run.status,
+        "config": run.config,
+        "total": run.total,
+        "completed": run.completed,
+        "failed": run.failed,
+        "latency_ms": quantiles(run.latency_hist or {}),
+        "error": run.error,
+        "created_at": run.created_at.isoformat(),
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+    }
+
+
+# ─────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a bot over a dataset")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run")
+    run_p.add_argument("--bot-id", type=int, required=True)
+    run_p.add_argument("--dataset-id", type=int, required=True)
+    run_p.add_argument("--concurrency", type=int, default=4)
+    run_p.add_argument("--limit", type=int, default=None)
+    run_p.add_argument("--model", default=None)
+    run_p.add_argument("--temperature", type=float, default=None)
+    run_p.add_argument("--system-prompt-file", default=None)
+
+    resume_p = sub.add_parser("resume")
+    resume_p.add_argument("run_id", type=int)
+
+    args = parser.parse_args()
+
+    from ..db import init_db
+    from ..sharding import router
+    from ..utils.log import setup_logging
+
+    setup_logging()
+    init_db()
+    if router.enabled:
+        router.init()
+
+    with new_session() as db:
+        if args.command == "run":
+            bot = db.get(Bot, args.bot_id)
+            if not bot:
+                raise SystemExit(f"Bot {args.bot_id} not found")
+            system_prompt = None
+            if args.system_prompt_file:
+                with open(args.system_prompt_file, encoding="utf-8") as f:
+                    system_prompt = f.read()
+            config = {
+                "system_prompt": system_prompt, "model": args.model, "temperature": args.temperature,
+                "concurrency": args.concurrency, "limit": args.limit,
+            }
+            run_id = create_run(db, bot, args.dataset_id, config).id
+        else:
+            run_id = args.run_id
+            if not db.get(EvalRun, run_id):
+                raise SystemExit(f"Run {run_id} not found")
+
+    logger.info("eval run started", extra={"run_id": run_id, "resume": f"python -m backend.ai.evals resume {run_id}"})
+
+    def progress(run: EvalRun):
+        logger.info("eval progress", extra={
+            "run_id": run.id, "done": run.completed + run.failed, "total": run.total, "failed": run.failed,
+        })
+
+    try:
+        run = run_eval(run_id, on_progress=progress)
+    except KeyboardInterrupt:
+        logger.warning("eval run interrupted", extra={"run_id": run_id})
+        print(f"Interrupted; resume with `python -m backend.ai.evals resume {run_id}`")
+        return
+    out = run_out(run)
+    print(f"Run {run_id} {out['status']}: {out['completed']} ok, {out['failed']} failed, latency {out['latency_ms']}")
+
+
+if __name__ == "__main__":
+    main()
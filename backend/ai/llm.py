@@ -0,0 +1,472 @@
+"""
+LLM calls with hedged requests and per-provider circuit breakers.
+
+A single slow completion used to set the whole turn's latency. Now:
+
+- Hedging: if the first attempt has not answered after the hedge delay
+  (LLM_HEDGE_DELAY_MS, or the provider's observed p95 when unset), a
+  duplicate goes to the backup provider (or the same one when there is
+  no backup). The first answer wins and the other call is cancelled.
+  A fast failure fires the hedge immediately. For streams, the race is
+  to the first token.
+- Circuit breaker: after LLM_BREAKER_FAILURES consecutive failures a
+  provider is skipped (fail fast) for LLM_BREAKER_RESET_S, then one
+  probe request decides whether it closes again.
+- LLM_TIMEOUT_S bounds the whole call, and so does the request's
+  Deadline when one is passed; cancelling the deadline (client gone)
+  cancels the call. cancellations estimates the work that saved.
+
+Calls run on a private event loop thread with the async SDK, so a losing
+request really is cancelled (its HTTP connection closed) instead of
+running to completion in a worker thread.
+
+Providers speak the OpenAI-compatible API the groq SDK uses: the primary
+is GROQ_API_KEY / GROQ_BASE_URL; LLM_BACKUP_BASE_URL adds a backup.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from ..utils.deadline import TIMEOUT, Deadline, DeadlineExceeded
+
+load_dotenv()
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", 30))
+HEDGE_DELAY_MS = os.getenv("LLM_HEDGE_DELAY_MS", "")   # empty = observed p95, 0 = no hedging
+HEDGE_DEFAULT_MS = 2000   # until enough latencies have been observed
+HEDGE_MIN_MS = 100
+MAX_ATTEMPTS = 2
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", 30))
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderUnavailable(Exception):
+    """No provider answered (all failed, timed out or have an open breaker)."""
+
+
+# ─────────────────────────────────────────────
+# CIRCUIT BREAKER
+# ─────────────────────────────────────────────
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_s: float = BREAKER_RESET_S,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failures = failures
+        self.reset_s = reset_s
+        self.clock = clock
+        self.state = self.CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """May a request go out now? In half-open state only one probe at a time."""
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_s:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._consecutive = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == self.HALF_OPEN or self._consecutive >= self.failures:
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+                self._probing = False
+
+    def release(self):
+        """A request that ended without a verdict (cancelled): free the probe slot."""
+        with self._lock:
+            self._probing = False
+
+
+# ─────────────────────────────────────────────
+# PROVIDERS
+# ─────────────────────────────────────────────
+
+class Provider:
+    def __init__(self, name: str, api_key: Optional[str], base_url: Optional[str] = None,
+                 model: Optional[str] = None, hedge_delay_ms: Optional[float] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        if hedge_delay_ms is None and HEDGE_DELAY_MS:
+            hedge_delay_ms = float(HEDGE_DELAY_MS)
+        self.hedge_delay_ms = hedge_delay_ms   # None = observed p95
+        self.breaker = breaker or CircuitBreaker()
+        # Full completions and time to first token are tracked separately
+        self.latencies_ms = {"complete": deque(maxlen=LATENCY_WINDOW), "stream": deque(maxlen=LATENCY_WINDOW)}
+        self._client = None
+
+    @property
+    def client(self):
+        # Created (and only used) on the LLM loop
+        if self._client is None:
+            from groq import AsyncGroq
+            self._client = AsyncGroq(
+                api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=LLM_TIMEOUT_S
+            )
+        return self._client
+
+    def hedge_delay_s(self, kind: str = "complete") -> float:
+        if self.hedge_delay_ms is not None:
+            return self.hedge_delay_ms / 1000
+        samples = self.latencies_ms[kind]
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return HEDGE_DEFAULT_MS / 1000
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return max(HEDGE_MIN_MS, p95) / 1000
+
+    def snapshot(self) -> Dict:
+        return {
+            "name": self.name,
+            "breaker": self.breaker.state,
+            "hedge_delay_ms": {kind: round(self.hedge_delay_s(kind) * 1000) for kind in self.latencies_ms},
+        }
+
+
+def load_providers() -> List[Provider]:
+    providers = [Provider("primary", os.getenv("GROQ_API_KEY"), os.getenv("GROQ_BASE_URL") or None)]
+    if os.getenv("LLM_BACKUP_BASE_URL"):
+        providers.append(Provider(
+            "backup",
+            os.getenv("LLM_BACKUP_API_KEY") or os.getenv("GROQ_API_KEY"),
+            os.getenv("LLM_BACKUP_BASE_URL"),
+            os.getenv("LLM_BACKUP_MODEL") or None,
+        ))
+    return providers
+
+
+providers = load_providers()
+_unhedged: Optional[List[Provider]] = None
+
+
+def unhedged_pool() -> List[Provider]:
+    """
+    The same providers (and breakers) without hedging: one attempt, plus
+    failover on errors. For batch and comparison calls, where duplicates
+    would add load or muddy the latency being measured.
+    """
+    global _unhedged
+    if _unhedged is None:
+        _unhedged = [
+            Provider(p.name, p.api_key, p.base_url, p.model, hedge_delay_ms=0, breaker=p.breaker)
+            for p in providers
+        ]
+    return _unhedged
+
+
+# ─────────────────────────────────────────────
+# EVENT LOOP THREAD
+# ─────────────────────────────────────────────
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True).start()
+        return _loop
+
+
+def _run(coro, deadline: Optional[Deadline] = None):
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    if deadline is None:
+        return future.result()
+    with deadline.on_cancel(future.cancel):
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            raise DeadlineExceeded(deadline.reason or TIMEOUT)
+
+
+def _timeout(deadline: Optional[Deadline]) -> Tuple[float, bool]:
+    """(seconds left for the call, whether the request deadline is the limit)"""
+    if deadline is None or deadline.remaining() >= LLM_TIMEOUT_S:
+        return LLM_TIMEOUT_S, False
+    deadline.check()
+    return deadline.remaining(), True
+
+
+# ─────────────────────────────────────────────
+# CANCELLATION METRICS
+# ─────────────────────────────────────────────
+
+class CancellationMetrics:
+    """
+    Calls cancelled by a deadline or a disconnect, and an estimate of the
+    upstream work avoided: the median duration / completion tokens of
+    recent finished calls minus what the cancelled call had used.
+    """
+
+    def __init__(self):
+        self.cancelled = {"timeout": 0, "disconnect": 0}
+        self.seconds_saved = 0.0
+        self.tokens_saved = 0
+        self._seconds = deque(maxlen=LATENCY_WINDOW)
+        self._tokens = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def completed(self, seconds: float, tokens: int):
+        with self._lock:
+            self._seconds.append(seconds)
+            self._tokens.append(tokens)
+
+    def record(self, reason: str, elapsed_s: float, tokens: int):
+        with self._lock:
+            self.cancelled[reason] = self.cancelled.get(reason, 0) + 1
+            if self._seconds:
+                self.seconds_saved += max(0.0, _median(self._seconds) - elapsed_s)
+                self.tokens_saved += max(0, int(_median(self._tokens)) - tokens)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "cancelled": dict(self.cancelled),
+                "seconds_saved": round(self.seconds_saved, 1),
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+def _median(values) -> float:
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+cancellations = CancellationMetrics()
+
+
+# ─────────────────────────────────────────────
+# HEDGING
+# ─────────────────────────────────────────────
+
+async def _attempt(provider: Provider, call: Callable[[Provider], Awaitable], kind: str):
+    start = time.perf_counter()
+    samples = provider.latencies_ms[kind]
+    try:
+        result = await call(provider)
+    except asyncio.CancelledError:
+        # Lost the race: its latency is at least this long. Counting it keeps
+        # the p95 from drifting down as hedges win.
+        samples.append((time.perf_counter() - start) * 1000)
+        provider.breaker.release()
+        raise
+    except Exception as e:
+        if getattr(e, "status_code", None) == 429:
+            # Over quota is not an outage: the provider stays in rotation
+            provider.breaker.release()
+        else:
+            provider.breaker.record_failure()
+        logger.warning("llm attempt failed", extra={
+            "provider": provider.name, "breaker": provider.breaker.state, "error": f"{type(e).__name__}: {e}",
+        })
+        raise
+    provider.breaker.record_success()
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+async def _race(call: Callable[[Provider], Awaitable], pool: List[Provider], kind: str,
+                discard: Optional[Callable[[object], Awaitable]] = None):
+    """
+    First successful `call(provider)`: one attempt, plus a hedge after the
+    delay (or right after a failure). Returns (result, provider).
+    """
+    # At most two attempts: the hedge goes to the backup if there is one,
+    # else duplicates on the same provider. A provider with an open breaker
+    # is skipped, so with the primary down the backup hedges itself.
+    backup = pool[1] if len(pool) > 1 else pool[0]
+    plan = [pool[0], backup, backup]
+    delay = 0.0
+    pending: Dict[asyncio.Task, Provider] = {}
+    launched = 0
+    last_error: Optional[BaseException] = None
+
+    def launch() -> bool:
+        nonlocal delay, launched
+        while plan and launched < MAX_ATTEMPTS:
+            provider = plan.pop(0)
+            if provider.breaker.allow():
+                if not launched:
+                    delay = provider.hedge_delay_s(kind)
+                launched += 1
+                pending[asyncio.ensure_future(_attempt(provider, call, kind))] = provider
+                return True
+        return False
+
+    try:
+        while pending or launch():
+            hedge_at = delay if launched < MAX_ATTEMPTS and delay > 0 else None
+            done, _ = await asyncio.wait(pending, timeout=hedge_at, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if launch():
+                    logger.info("llm hedge fired", extra={"after_ms": round(delay * 1000)})
+                continue
+
+            winner = None
+            for task in done:
+                provider = pending.pop(task)
+                if task.exception() is not None:
+                    last_error = task.exception()
+                elif winner is None:
+                    winner = (task.result(), provider)
+                elif discard:
+                    await discard(task.result())
+            if winner:
+                return winner
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise ProviderUnavailable(str(last_error) if last_error else "all providers have an open circuit") from last_error
+
+
+def complete(chat_messages: List[Dict], model: str, temperature: float, max_tokens: int,
+             pool: Optional[List[Provider]] = None, deadline: Optional[Deadline] = None) -> str:
+    """Hedged non-streaming completion; raises ProviderUnavailable or DeadlineExceeded."""
+    async def call(provider: Provider):
+        response = await provider.client.chat.completions.create(
+            model=provider.model or model,
+            messages=chat_messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        return response
+
+    timeout, bounded = _timeout(deadline)
+
+    async def run():
+        response, _ = await asyncio.wait_for(_race(call, pool or providers, "complete"), timeout)
+        return response
+
+    start = time.perf_counter()
+    try:
+        response = _run(run(), deadline)
+    except (asyncio.TimeoutError, DeadlineExceeded) as e:
+        if isinstance(e, asyncio.TimeoutError) and not bounded:
+            raise ProviderUnavailable(f"no answer within {LLM_TIMEOUT_S}s")
+        reason = e.reason if isinstance(e, DeadlineExceeded) else TIMEOUT
+        cancellations.record(reason, time.perf_counter() - start, 0)
+        raise DeadlineExceeded(reason)
+
+    text = response.choices[0].message.content
+    usage = getattr(response, "usage", None)
+    cancellations.completed(time.perf_counter() - start, usage.completion_tokens if usage else len(text) // 4)
+    return text
+
+
+def stream(chat_messages: List[Dict], model: str, temperature: float, max_tokens: int,
+           pool: Optional[List[Provider]] = None, deadline: Optional[Deadline] = None) -> Iterator[str]:
+    """
+    Hedged streaming completion: attempts race to their first token, the
+    winner's stream is then relayed. Raises ProviderUnavailable before the
+    first token; errors after it end the stream. DeadlineExceeded at any
+    point closes the upstream stream.
+    """
+    async def first_token(provider: Provider) -> Tuple[object, AsyncIterator, str]:
+        response = await provider.client.chat.completions.create(
+            model=provider.model or model,
+            messages=chat_messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        chunks = response.__aiter__()
+        try:
+            return response, chunks, await next_delta(chunks) or ""
+        except BaseException:
+            await response.close()
+            raise
+
+    async def next_delta(chunks: AsyncIterator) -> Optional[str]:
+        async for chunk in chunks:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                return delta
+        return None
+
+    async def close(opened):
+        await opened[0].close()
+
+    start = time.perf_counter()
+    tokens = 0
+
+    def cancelled(e: Exception) -> DeadlineExceeded:
+        reason = e.reason if isinstance(e, DeadlineExceeded) else TIMEOUT
+        cancellations.record(reason, time.perf_counter() - start, tokens)
+        return DeadlineExceeded(reason)
+
+    timeout, bounded = _timeout(deadline)
+
+    async def begin():
+        return await asyncio.wait_for(_race(first_token, pool or providers, "stream", discard=close), timeout)
+
+    try:
+        (response, chunks, first), provider = _run(begin(), deadline)
+    except (asyncio.TimeoutError, DeadlineExceeded) as e:
+        if isinstance(e, asyncio.TimeoutError) and not bounded:
+            raise ProviderUnavailable(f"no first token within {LLM_TIMEOUT_S}s")
+        raise cancelled(e)
+
+    try:
+        if first:
+            tokens += 1
+            yield first
+        while True:
+            try:
+                timeout, bounded = _timeout(deadline)
+                delta = _run(asyncio.wait_for(next_delta(chunks), timeout), deadline)
+            except (asyncio.TimeoutError, DeadlineExceeded) as e:
+                if isinstance(e, asyncio.TimeoutError) and not bounded:
+                    raise
+                raise cancelled(e)
+            if delta is None:
+                cancellations.completed(time.perf_counter() - start, tokens)
+                return
+            tokens += 1
+            yield delta
+    except DeadlineExceeded:
+        raise
+    except Exception:
+        provider.breaker.record_failure()
+        raise
+    finally:
+        _run(response.close())
+
+
+def status() -> Dict:
+    return {"providers": [p.snapshot() for p in providers], "cancellations": cancellations.snapshot()}
@@ -0,0 +1,705 @@
+"""
+Per-bot local knowledge base: chunked documents, an on-disk BM25 inverted
+index and (when NumPy is installed) a memory-mapped matrix of hashed
+embeddings. Everything lives under KNOWLEDGE_DIR/bot_<id>/ and needs no
+network access.
+
+Layout of a bot directory:
+    chunks.jsonl     one {"source", "text"} line per chunk (chunk id = line no.)
+    offsets.bin      uint64 byte offset of every chunk line
+    doclen.bin       uint32 token count of every chunk
+    chunksrc.bin     uint32 source number of every chunk (names in meta.json)
+    deleted.bin      uint32 ids of removed chunks
+    seg-000001.post  postings added by one update: a JSON line of
+                     {term: postings}, then the uint32 ids and uint16 tfs
+    embeddings.f32   float32 rows, one per chunk (optional)
+    meta.json        written last; counts in here are the source of truth
+
+Chunks are only ever appended. Indexing a source that is already in the
+index (the same dataset or file name again) replaces it: its chunks are
+marked deleted and the new ones added. Once deleted chunks would make up
+more than half of the index it is rebuilt without them.
+
+Every worker process loads its own copy. Updates hold an flock on
+bot_<id>.lock (next to the directory) and first reload the index if
+meta.json changed since it was read, so chunk ids never collide; searches
+reload the same way.
+"""
+import heapq
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import zlib
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from ..models import TrainingExample
+
+try:
+    import numpy as np
+except ImportError:  # embeddings and vectorised scoring are optional
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: one process per index there
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", os.path.join(BASE_DIR, "knowledge"))
+
+INDEX_FORMAT = 2  # 1: pickled segments, no per-chunk sources (rebuilt on load)
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 20
+EMBED_DIM = 256
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+MAX_SEGMENTS = 16
+MAX_DELETED_FRACTION = 0.5
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in is it "
+    "its me my of on or so that the this to was we were what when which who "
+    "will with you your".split()
+)
+
+
+# ─────────────────────────────────────────────
+# TEXT PROCESSING
+# ─────────────────────────────────────────────
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def chunk_text(
+    lines: Iterable[str],
+    chunk_words: int = CHUNK_WORDS,
+    overlap: int = CHUNK_OVERLAP,
+) -> Iterator[str]:
+    """Split a stream of lines into overlapping word windows."""
+    words: List[str] = []
+    emitted = False
+
+    for line in lines:
+        words.extend(line.split())
+        while len(words) >= chunk_words:
+            yield " ".join(words[:chunk_words])
+            emitted = True
+            words = words[chunk_words - overlap:]
+
+    if words and (not emitted or len(words) > overlap):
+        yield " ".join(words)
+
+
+def embed(tokens: List[str], dim: int = EMBED_DIM):
+    """
+    Signed feature hashing of unigrams + bigrams, L2 normalised.
+    Cheap, deterministic and good enough to rescue paraphrases BM25 misses.
+    """
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    hashes = np.fromiter(
+        (zlib.crc32(f.encode("utf-8")) for f in features),
+        dtype=np.uint32,
+        count=len(features),
+    )
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+    vec = np.bincount(hashes % dim, weights=signs, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+# ─────────────────────────────────────────────
+# SEGMENTS
+# ─────────────────────────────────────────────
+
+Segment = Dict[str, Tuple[array, array]]
+
+
+def write_segment(path: str, segment: Segment):
+    """Terms and their posting counts as JSON, then all ids, then all tfs."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(json.dumps({term: len(ids) for term, (ids, _) in segment.items()}).encode("utf-8") + b"\n")
+        for ids, _ in segment.values():
+            ids.tofile(f)
+        for _, tfs in segment.values():
+            tfs.tofile(f)
+    os.replace(tmp, path)
+
+
+def read_segment(path: str) -> Segment:
+    with open(path, "rb") as f:
+        counts = json.loads(f.readline())
+        total = sum(counts.values())
+        ids, tfs = array("I"), array("H")
+        ids.fromfile(f, total)
+        tfs.fromfile(f, total)
+
+    segment: Segment = {}
+    pos = 0
+    for term, count in counts.items():
+        segment[term] = (ids[pos:pos + count], tfs[pos:pos + count])
+        pos += count
+    return segment
+
+
+# ─────────────────────────────────────────────
+# INDEX
+# ─────────────────────────────────────────────
+
+def index_path(bot_id: int, root: Optional[str] = None) -> str:
+    return os.path.join(root or KNOWLEDGE_DIR, f"bot_{bot_id}")
+
+
+class KnowledgeIndex:
+    def __init__(self, bot_id: int, root: Optional[str] = None, path: Optional[str] = None):
+        self.bot_id = bot_id
+        self.path = path or index_path(bot_id, root)
+        self._lock = threading.RLock()
+        self._lock_fd: Optional[int] = None
+        self._reset_memory()
+        self._load()
+
+    def _reset_memory(self):
+        self.postings: Segment = {}
+        self.offsets = array("Q")
+        self.doc_len = array("I")
+        self.chunk_sources = array("I")
+        self.total_len = 0
+        self.segments = 0
+        self.embedded = 0
+        self.sources: Dict[str, int] = {}  # source -> live chunks
+        self.source_names: List[str] = []  # source number -> name
+        self.source_numbers: Dict[str, int] = {}
+        self.deleted_ids = array("I")
+        self.deleted = set()
+        self.deleted_len = 0
+        self._stamp = None
+        self._norm = None
+        self._dead = None
+        self._embeddings = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @property
+    def size(self) -> int:
+        return len(self.doc_len)
+
+    @property
+    def live(self) -> int:
+        return self.size - len(self.deleted)
+
+    # ---------- locking ----------
+
+    @contextmanager
+    def _locked(self):
+        """This process's lock, plus an flock other processes respect (re-entrant)."""
+        with self._lock:
+            if self._lock_fd is not None or fcntl is None:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(self._lock_fd)  # releases the flock
+                self._lock_fd = None
+
+    def _meta_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self._file("meta.json"))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _refresh(self):
+        """Reload if another process changed the index since it was read here."""
+        if self._meta_stamp() != self._stamp:
+            with self._locked():
+                self._reset_memory()
+                self._load()
+
+    # ---------- persistence ----------
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self._file("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self):
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({
+                "format": INDEX_FORMAT,
+                "chunks": self.size,
+                "total_len": self.total_len,
+                "segments": self.segments,
+                "embedded": self.embedded,
+                "dim": EMBED_DIM,
+                "deleted": len(self.deleted_ids),
+                "sources": self.sources,
+                "source_names": self.source_names,
+            }, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._stamp = self._meta_stamp()
+
+    def _read_array(self, name: str, typecode: str, n: int) -> array:
+        values = array(typecode)
+        if n:
+            with open(self._file(name), "rb") as f:
+                values.fromfile(f, n)
+        return values
+
+    def _append_array(self, name: str, values: array, start: int):
+        """Write values[start:], dropping whatever a failed update left past `start`."""
+        with open(self._file(name), "ab") as f:
+            f.truncate(start * values.itemsize)
+            values[start:].tofile(f)
+
+    def _load(self):
+        self._stamp = self._meta_stamp()
+        meta = self._read_meta()
+        if not meta:
+            return
+        if meta.get("format") != INDEX_FORMAT:
+            self._upgrade()
+            return
+
+        n = meta["chunks"]
+        self.offsets = self._read_array("offsets.bin", "Q", n)
+        self.doc_len = self._read_array("doclen.bin", "I", n)
+        self.chunk_sources = self._read_array("chunksrc.bin", "I", n)
+        self.deleted_ids = self._read_array("deleted.bin", "I", meta["deleted"])
+        self.deleted = set(self.deleted_ids)
+        self.deleted_len = sum(self.doc_len[cid] for cid in self.deleted)
+
+        self.total_len = meta["total_len"]
+        self.segments = meta["segments"]
+        self.embedded = meta["embedded"]
+        self.sources = meta["sources"]
+        self.source_names = meta["source_names"]
+        self.source_numbers = {name: i for i, name in enumerate(self.source_names)}
+
+        for seq in range(1, self.segments + 1):
+            self._merge(read_segment(self._file(f"seg-{seq:06d}.post")))
+
+    def _upgrade(self):
+        """Rebuild an index written by an older version from its chunks."""
+        with self._locked():
+            self._reset_memory()
+            meta = self._read_meta()
+            if meta and meta.get("format") == INDEX_FORMAT:  # another process did it
+                self._load()
+                return
+            n = meta["chunks"] if meta else 0
+            self.offsets = self._read_array("offsets.bin", "Q", n)
+            self.doc_len = self._read_array("doclen.bin", "I", n)
+            self._rebuild()
+
+    def _merge(self, segment: Segment):
+        for term, (ids, tfs) in segment.items():
+            existing = self.postings.get(term)
+            if existing is None:
+                self.postings[term] = (ids, tfs)
+            else:
+                existing[0].extend(ids)
+                existing[1].extend(tfs)
+
+    def _compact(self):
+        """Rewrite all postings as a single segment."""
+        write_segment(self._file("seg-000001.post"), self.postings)
+        for seq in range(2, self.segments + 1):
+            os.remove(self._file(f"seg-{seq:06d}.post"))
+        self.segments = 1
+        self._write_meta()
+
+    def _rebuild(self, batch: int = 5000):
+        """
+        Rewrite the index from its live chunks next to the current one and
+        swap it in: chunk ids are positions in the append-only files.
+        """
+        rebuilt_path = self.path + ".rebuild"
+        shutil.rmtree(rebuilt_path, ignore_errors=True)
+        rebuilt = KnowledgeIndex(self.bot_id, path=rebuilt_path)
+        pending = []
+        for chunk in self._iter_chunks():
+            pending.append((chunk["source"], chunk["text"]))
+            if len(pending) >= batch:
+                rebuilt.add_documents(pending)
+                pending = []
+        rebuilt.add_documents(pending)
+
+        old = self.path + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.replace(self.path, old)
+        os.replace(rebuilt_path, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        try:
+            os.remove(rebuilt_path + ".lock")
+        except FileNotFoundError:
+            pass
+
+        self._reset_memory()
+        self._load()
+
+    # ---------- updates ----------
+
+    def _iter_chunks(self) -> Iterator[Dict]:
+        """Live chunks in id order."""
+        if not self.size:
+            return
+        with open(self._file("chunks.jsonl"), "rb") as f:
+            for cid in range(self.size):
+                if cid in self.deleted:
+                    continue
+                f.seek(self.offsets[cid])
+                yield json.loads(f.readline())
+
+    def source_counts(self) -> Dict[str, int]:
+        """Live chunks per source."""
+        with self._lock:
+            self._refresh()
+            return dict(self.sources)
+
+    def add_documents(self, docs: Iterable[Tuple[str, str]]) -> int:
+        """
+        Append (source, text) chunks to the index. Each call writes one new
+        postings segment, so updates never rewrite what is already on disk.
+        Returns the number of chunks added.
+        """
+        with self._locked():
+            self._refresh()
+            try:
+                return self._add_documents(docs)
+            except BaseException:
+                self._stamp = None  # memory may be ahead of disk: reload next time
+                raise
+
+    def _add_documents(self, docs: Iterable[Tuple[str, str]]) -> int:
+        os.makedirs(self.path, exist_ok=True)
+        start = self.size
+        segment: Segment = {}
+        vectors = []
+
+        with open(self._file("chunks.jsonl"), "ab") as f:
+            f.seek(0, os.SEEK_END)
+            for source, text in docs:
+                tokens = tokenize(text)
+                if not tokens:
+                    continue
+
+                number = self.source_numbers.get(source)
+                if number is None:
+                    number = self.source_numbers[source] = len(self.source_names)
+                    self.source_names.append(source)
+
+                cid = self.size
+                self.offsets.append(f.tell())
+                f.write(json.dumps({"source": source, "text": text}).encode("utf-8") + b"\n")
+                self.doc_len.append(len(tokens))
+                self.chunk_sources.append(number)
+                self.total_len += len(tokens)
+                self.sources[source] = self.sources.get(source, 0) + 1
+
+                for term, tf in Counter(tokens).items():
+                    entry = segment.get(term)
+                    if entry is None:
+                        entry = segment[term] = (array("I"), array("H"))
+                    entry[0].append(cid)
+                    entry[1].append(min(tf, 0xFFFF))
+
+                if np is not None:
+                    vectors.append(embed(tokens))
+
+        added = self.size - start
+        if not added:
+            if not os.path.exists(self._file("meta.json")):
+                self._write_meta()
+            return 0
+
+        self._append_array("offsets.bin", self.offsets, start)
+        self._append_array("doclen.bin", self.doc_len, start)
+        self._append_array("chunksrc.bin", self.chunk_sources, start)
+
+        self.segments += 1
+        write_segment(self._file(f"seg-{self.segments:06d}.post"), segment)
+        self._merge(segment)
+
+        # Embeddings only stay usable while every chunk has one
+        if vectors and self.embedded == start:
+            with open(self._file("embeddings.f32"), "ab") as f:
+                f.truncate(start * EMBED_DIM * 4)
+                np.stack(vectors).astype(np.float32).tofile(f)
+            self.embedded = self.size
+
+        self._norm = None
+        self._dead = None
+        self._embeddings = None
+        self._write_meta()
+
+        if self.segments > MAX_SEGMENTS:
+            self._compact()
+
+        return added
+
+    def remove_source(self, source: str) -> int:
+        """
+        Drop every chunk of `source` by marking it deleted; nothing is
+        rewritten until deleted chunks outweigh live ones, then the index
+        is rebuilt. Returns the chunks removed.
+        """
+        with self._locked():
+            self._refresh()
+            removed = self.sources.get(source, 0)
+            if not removed:
+                return 0
+
+            if len(self.deleted) + removed > self.size * MAX_DELETED_FRACTION:
+                self.deleted.update(
+                    cid for cid, number in enumerate(self.chunk_sources)
+                    if number == self.source_numbers[source]
+                )
+                self._rebuild()
+                return removed
+
+            start = len(self.deleted_ids)
+            number = self.source_numbers[source]
+            for cid, chunk_source in enumerate(self.chunk_sources):
+                if chunk_source == number and cid not in self.deleted:
+                    self.deleted_ids.append(cid)
+                    self.deleted.add(cid)
+                    self.deleted_len += self.doc_len[cid]
+            self._append_array("deleted.bin", self.deleted_ids, start)
+
+            del self.sources[source]
+            self._norm = None
+            self._dead = None
+            self._write_meta()
+            return removed
+
+    def clear(self):
+        with self._locked():
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._reset_memory()
+
+    # ---------- search ----------
+
+    def _dead_mask(self):
+        """Boolean mask of deleted chunk ids (NumPy), None when there are none."""
+        if not self.deleted:
+            return None
+        if self._dead is None:
+            self._dead = np.zeros(self.size, dtype=bool)
+            self._dead[np.frombuffer(self.deleted_ids, dtype=np.uint32)] = True
+        return self._dead
+
+    def _bm25(self, tokens: List[str], k: int) -> List[Tuple[int, float]]:
+        n = self.size
+        live = self.live
+        avgdl = (self.total_len - self.deleted_len) / live
+        terms = [t for t in set(tokens) if t in self.postings]
+        if not terms:
+            return []
+
+        if np is not None:
+            if self._norm is None:
+                dl = np.array(self.doc_len, dtype=np.float32)
+                self._norm = BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl)
+
+            dead = self._dead_mask()
+            scores = np.zeros(n, dtype=np.float32)
+            for term in terms:
+                ids, tfs = self.postings[term]
+                idx = np.array(ids, dtype=np.int64)
+                tf = np.array(tfs, dtype=np.float32)
+                if dead is not None:
+                    keep = ~dead[idx]
+                    idx, tf = idx[keep], tf[keep]
+                if not len(idx):
+                    continue
+                idf = math.log(1 + (live - len(idx) + 0.5) / (len(idx) + 0.5))
+                scores[idx] += idf * tf * (BM25_K1 + 1) / (tf + self._norm[idx])
+
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            return sorted(
+                ((int(i), float(scores[i])) for i in top if scores[i] > 0),
+                key=lambda x: -x[1],
+            )
+
+        scores: Dict[int, float] = {}
+        for term in terms:
+            ids, tfs = self.postings[term]
+            postings = [(cid, tf) for cid, tf in zip(ids, tfs) if cid not in self.deleted]
+            idf = math.log(1 + (live - len(postings) + 0.5) / (len(postings) + 0.5))
+            for cid, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[cid] / avgdl)
+                scores[cid] = scores.get(cid, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+    def _dense(self, tokens: List[str], k: int) -> List[Tuple[int, float]]:
+        if self._embeddings is None:
+            self._embeddings = np.memmap(
+                self._file("embeddings.f32"),
+                dtype=np.float32,
+                mode="r",
+                shape=(self.embedded, EMBED_DIM),
+            )
+
+        sims = self._embeddings @ embed(tokens)
+        dead = self._dead_mask()
+        if dead is not None:
+            sims[dead] = -np.inf
+        k = min(k, self.live)
+        top = np.argpartition(-sims, k - 1)[:k]
+        return sorted(((int(i), float(sims[i])) for i in top), key=lambda x: -x[1])
+
+    def _read_chunk(self, cid: int) -> Dict:
+        with open(self._file("chunks.jsonl"), "rb") as f:
+            f.seek(self.offsets[cid])
+            return json.loads(f.readline())
+
+    def search(self, query: str, k: int = 3, hybrid: bool = False) -> List[Dict]:
+        """
+        Top-k chunks for `query`. With hybrid=True the BM25 ranking is fused
+        (reciprocal rank fusion) with the embedding ranking.
+        """
+        tokens = tokenize(query)
+        with self._lock:
+            self._refresh()
+            if not tokens or not self.live or k <= 0:
+                return []
+
+            use_dense = hybrid and np is not None and self.embedded == self.size
+            pool = max(k * 5, 50) if use_dense else k
+            ranked = self._bm25(tokens, pool)
+
+            if use_dense:
+                fused: Dict[int, float] = {}
+                for results in (ranked, self._dense(tokens, pool)):
+                    for rank, (cid, _) in enumerate(results):
+                        fused[cid] = fused.get(cid, 0.0) + 1.0 / (RRF_K + rank + 1)
+                ranked = heapq.nlargest(k, fused.items(), key=lambda x: x[1])
+
+            return [
+                {"chunk_id": cid, "score": round(score, 4), **self._read_chunk(cid)}
+                for cid, score in ranked[:k]
+            ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "bot_id": self.bot_id,
+                "chunks": self.live,
+                "deleted_chunks": len(self.deleted),
+                "terms": len(self.postings),
+                "segments": self.segments,
+                "sources": len(self.sources),
+                "embeddings": self.embedded == self.size and self.embedded > 0,
+            }
+
+
+# ─────────────────────────────────────────────
+# REGISTRY (one loaded index per bot)
+# ─────────────────────────────────────────────
+
+_indexes: Dict[int, KnowledgeIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def has_index(bot_id: int) -> bool:
+    return bot_id in _indexes or os.path.exists(os.path.join(index_path(bot_id), "meta.json"))
+
+
+def get_index(bot_id: int) -> KnowledgeIndex:
+    with _registry_lock:
+        index = _indexes.get(bot_id)
+        if index is None:
+            index = _indexes[bot_id] = KnowledgeIndex(bot_id)
+        return index
+
+
+def drop_index(bot_id: int):
+    """Delete the bot's index files; an index that is not loaded stays unloaded."""
+    with _registry_lock:
+        index = _indexes.pop(bot_id, None)
+        if index is None:
+            shutil.rmtree(index_path(bot_id), ignore_errors=True)
+            return
+    index.clear()
+
+
+def retrieve(bot_id: int, query: str, k: int = 3, hybrid: bool = False) -> List[str]:
+    """Chunk texts to inject into a prompt; empty if the bot has no index."""
+    if k <= 0 or not has_index(bot_id):
+        return []
+    return [hit["text"] for hit in get_index(bot_id).search(query, k=k, hybrid=hybrid)]
+
+
+# ─────────────────────────────────────────────
+# BUILDERS
+# ─────────────────────────────────────────────
+
+def index_lines(bot_id: int, source: str, lines: Iterable[str], batch: int = 5000) -> int:
+    """Chunk a text stream into the bot's index in batches, replacing an earlier copy of `source`."""
+    index = get_index(bot_id)
+    index.remove_source(source)
+    added = 0
+    pending = []
+
+    for chunk in chunk_text(lines):
+        pending.append((source, chunk))
+        if len(pending) >= batch:
+            added += index.add_documents(pending)
+            pending = []
+
+    if pending:
+        added += index.add_documents(pending)
+    return added
+
+
+def index_dataset(session: Session, bot_id: int, dataset_id: int, batch: int = 5000) -> int:
+    """Index every example of a TrainingDataset as one Q/A chunk, replacing an earlier run."""
+    index = get_index(bot_id)
+    source = f"dataset:{dataset_id}"
+    index.remove_source(source)
+    added = 0
+    after_id = 0
+
+    while True:
+        rows = session.exec(
+            select(TrainingExample)
+            .where(
+                TrainingExample.dataset_id == dataset_id,
+                TrainingExample.id > after_id,
+            )
+            .order_by(TrainingExample.id)
+            .limit(batch)
+        ).all()
+        if not rows:
+            return added
+
+        after_id = rows[-1].id
+        added += index.add_documents(
+            (source, f"Q: {r.prompt}\nA: {r.response}" if r.response else r.prompt)
+            for r in rows
+        )
+        session.expunge_all()
@@ -0,0 +1,131 @@
+"""
+Hot-path message query latency before and after archiving idle sessions.
+
+    python -m backend.benchmarks.bench_archive --conversations 20000 --messages-per 50
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+from backend.models import Conversation, Message
+from backend.utils.archive import compact_idle_conversations, restore_conversation
+from backend.benchmarks.common import Timer, make_engine, percentiles, temp_db_path, write_result
+
+
+def populate(engine, args):
+    rng = random.Random(4)
+    now = datetime.utcnow()
+    raw = engine.raw_connection()
+    cur = raw.cursor()
+    cur.execute(
+        "INSERT INTO bot (id, name, model, system_prompt, temperature, settings, created_at) "
+        "VALUES (1, 'b', 'm', 'p', 0.7, '{}', ?)", (now,),
+    )
+
+    active = set(rng.sample(range(1, args.conversations + 1), int(args.conversations * args.active)))
+    cur.executemany(
+        "INSERT INTO conversation (id, bot_id, session_id, created_at, metadata_json) "
+        "VALUES (?, 1, ?, ?, '{}')",
+        [(c, f"s{c}", now) for c in range(1, args.conversations + 1)],
+    )
+
+    # Messages are interleaved across conversations, like real traffic
+    words = "order refund account login reset shipping invoice help thanks please card email".split()
+    rows = []
+    for i in range(args.conversations * args.messages_per):
+        conv = rng.randint(1, args.conversations)
+        age = timedelta(minutes=rng.randint(0, 600)) if conv in active else timedelta(days=rng.randint(60, 400))
+        rows.append((conv, "user" if i % 2 else "bot", " ".join(rng.choices(words, k=rng.randint(5, 60))), (now - age).isoformat(" ")))
+        if len(rows) >= 50_000:
+            cur.executemany("INSERT INTO message (conversation_id, role, text, created_at) VALUES (?, ?, ?, ?)", rows)
+            rows = []
+    if rows:
+        cur.executemany("INSERT INTO message (conversation_id, role, text, created_at) VALUES (?, ?, ?, ?)", rows)
+    raw.commit()
+    raw.close()
+    return sorted(active)
+
+
+def hot_path(engine, conv_ids, samples, rng):
+    full, last10 = [], []
+    with Session(engine) as db:
+        for _ in range(samples):
+            conv_id = rng.choice(conv_ids)
+            with Timer() as t:
+                db.exec(
+                    select(Message)
+                    .where(Message.conversation_id == conv_id)
+                    .order_by(Message.created_at)
+                ).all()
+            full.append(t.ms)
+            with Timer() as t:
+                db.exec(
+                    select(Message)
+                    .where(Message.conversation_id == conv_id)
+                    .order_by(Message.created_at.desc())
+                    .limit(10)
+                ).all()
+            last10.append(t.ms)
+            db.expunge_all()
+    return {"get_messages_ms": percentiles(full), "last_10_ms": percentiles(last10)}
+
+
+def table_stats(engine, path):
+    raw = engine.raw_connection()
+    count = raw.execute("SELECT count(*) FROM message").fetchone()[0]
+    raw.close()
+    return {"hot_messages": count, "db_mb": round(os.path.getsize(path) / (1024 * 1024), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--conversations", type=int, default=20_000)
+    parser.add_argument("--messages-per", type=int, default=50)
+    parser.add_argument("--active", type=float, default=0.1, help="fraction of non-idle sessions")
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    path = temp_db_path("archive")
+    engine = make_engine(path, wal=False)
+    active = populate(engine, args)
+
+    rng = random.Random(8)
+    before = {**table_stats(engine, path), **hot_path(engine, active, args.samples, rng)}
+
+    start = time.perf_counter()
+    with Session(engine) as db:
+        stats = compact_idle_conversations(db, idle_days=30)
+    archive_s = time.perf_counter() - start
+
+    raw = engine.raw_connection()
+    raw.execute("VACUUM")
+    raw.close()
+    after = {**table_stats(engine, path), **hot_path(engine, active, args.samples, rng)}
+
+    archived_ids = [c for c in range(1, args.conversations + 1) if c not in set(active)]
+    restore_ms = []
+    with Session(engine) as db:
+        for conv_id in rng.sample(archived_ids, min(50, len(archived_ids))):
+            conv = db.get(Conversation, conv_id)
+            with Timer() as t:
+                restore_conversation(db, conv)
+            restore_ms.append(t.ms)
+
+    write_result("archive", {
+        "conversations": args.conversations,
+        "messages": args.conversations * args.messages_per,
+        "archive_seconds": round(archive_s, 1),
+        "archive_stats": stats,
+        "compression_ratio": round(stats["raw_bytes"] / max(stats["stored_bytes"], 1), 1),
+        "before": before,
+        "after": after,
+        "restore_ms": percentiles(restore_ms),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Bot memory selection latency with 10k memories for one bot.
+
+    python -m backend.benchmarks.bench_bot_memory --memories 10000
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from backend.models import BotMemory
+from backend.utils.bot_memory import get_bot_memory_index, invalidate_bot_memory, select_bot_memory
+from backend.benchmarks.common import Timer, make_engine, percentiles, write_result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--memories", type=int, default=10_000)
+    parser.add_argument("--turns", type=int, default=5_000)
+    parser.add_argument("--token-budget", type=int, default=300)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    engine = make_engine()
+    now = datetime.utcnow()
+
+    with Session(engine) as db:
+        db.add_all(
+            BotMemory(
+                bot_id=1,
+                key=f"fact_{i}",
+                value=" ".join(["detail"] * rng.randint(2, 40)),
+                importance=rng.randint(1, 5),
+                created_at=now - timedelta(minutes=rng.randrange(100_000)),
+            )
+            for i in range(args.memories)
+        )
+        db.commit()
+
+        with Timer() as cold:
+            get_bot_memory_index(db, 1)
+
+        samples = []
+        for _ in range(args.turns):
+            with Timer() as t:
+                select_bot_memory(db, 1, token_budget=args.token_budget, k=args.k)
+            samples.append(t.ms)
+
+        invalidate_bot_memory(1)
+        with Timer() as reload:
+            selected = select_bot_memory(db, 1, token_budget=args.token_budget, k=args.k)
+
+    write_result("bot_memory", {
+        "memories": args.memories,
+        "token_budget": args.token_budget,
+        "k": args.k,
+        "selected": len(selected),
+        "cold_load_ms": round(cold.ms, 2),
+        "reload_after_invalidate_ms": round(reload.ms, 2),
+        "cached_select_ms": percentiles(samples),
+    })
+
+
+if __name__ == "__main__":
+    main()
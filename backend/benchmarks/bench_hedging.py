@@ -0,0 +1,116 @@
+"""
+Completion latency against a heavy-tailed provider, with and without
+hedged requests, and how fast calls fail while a provider is down.
+
+The stub LLM answers most requests in ~latency-ms, but --tail-rate of
+them wait an extra Pareto-distributed delay (scale --tail-ms). Configs:
+
+    no_hedge     one attempt per call (plus failover on errors)
+    hedge_fixed  duplicate after --hedge-ms
+    hedge_p95    duplicate after the observed p95 (the default)
+
+Then a dead primary (every request fails) with a healthy backup, with
+and without the circuit breaker.
+
+    python -m backend.benchmarks.bench_hedging --calls 400 --concurrency 8
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.ai import llm
+from backend.ai.llm import CircuitBreaker, Provider
+from backend.benchmarks.common import percentiles, write_result
+from backend.benchmarks.stub_llm import StubConfig, start_stub
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def run_calls(pool, calls: int, concurrency: int, stub_configs) -> dict:
+    before = sum(c.requests for c in stub_configs)
+    latencies, failures = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            llm.complete(MESSAGES, "stub", 0.7, 64, pool=pool)
+        except llm.ProviderUnavailable:
+            with lock:
+                failures += 1
+        with lock:
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(calls)))
+
+    sent = sum(c.requests for c in stub_configs) - before
+    return {
+        "latency_ms": {k: round(v, 1) for k, v in percentiles(latencies).items()},
+        "failures": failures,
+        "provider_requests_per_call": round(sent / calls, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--jitter-ms", type=float, default=30)
+    parser.add_argument("--tail-rate", type=float, default=0.02)
+    parser.add_argument("--tail-ms", type=float, default=1500)
+    parser.add_argument("--hedge-ms", type=float, default=300)
+    parser.add_argument("--port", type=int, default=9190)
+    args = parser.parse_args()
+
+    url = "http://127.0.0.1:{}"
+    tail = dict(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tail_rate=args.tail_rate,
+                tail_ms=args.tail_ms, tokens_per_s=1e6, reply_tokens=10)
+    primary_cfg, backup_cfg, dead_cfg = StubConfig(seed=1, **tail), StubConfig(seed=2, **tail), StubConfig(
+        latency_ms=20, jitter_ms=0, error_rate=1.0)
+    servers = [
+        start_stub(args.port, primary_cfg),
+        start_stub(args.port + 1, backup_cfg),
+        start_stub(args.port + 2, dead_cfg),
+    ]
+    primary, backup, dead = (url.format(args.port + i) for i in range(3))
+    stubs = [primary_cfg, backup_cfg, dead_cfg]
+
+    def provider(name, base_url, hedge_ms=None, breaker=None):
+        return Provider(name, "x", base_url, hedge_delay_ms=hedge_ms, breaker=breaker)
+
+    result = {"args": vars(args)}
+
+    # Warm the p95 estimate before measuring
+    auto = [provider("primary", primary), provider("backup", backup)]
+    run_calls(auto, 60, args.concurrency, stubs)
+
+    result["no_hedge"] = run_calls([provider("primary", primary, hedge_ms=0)], args.calls, args.concurrency, stubs)
+    result["hedge_fixed"] = run_calls(
+        [provider("primary", primary, hedge_ms=args.hedge_ms), provider("backup", backup)],
+        args.calls, args.concurrency, stubs,
+    )
+    result["hedge_p95"] = run_calls(auto, args.calls, args.concurrency, stubs)
+    result["hedge_p95"]["hedge_delay_ms"] = auto[0].snapshot()["hedge_delay_ms"]["complete"]
+
+    # Dead primary: without a breaker every call pays for the failed attempt
+    never_open = CircuitBreaker(failures=10 ** 9)
+    result["dead_primary_no_breaker"] = run_calls(
+        [provider("dead", dead, hedge_ms=args.hedge_ms, breaker=never_open), provider("backup", backup)],
+        args.calls, args.concurrency, stubs,
+    )
+    result["dead_primary_breaker"] = run_calls(
+        [provider("dead", dead, hedge_ms=args.hedge_ms), provider("backup", backup)],
+        args.calls, args.concurrency, stubs,
+    )
+
+    for server in servers:
+        server.shutdown()
+    write_result("hedging", result)
+
+
+if __name__ == "__main__":
+    main()
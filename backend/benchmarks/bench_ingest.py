@@ -0,0 +1,96 @@
+"""
+Ingest a large generated JSONL dataset and record throughput and peak RSS.
+
+    python -m backend.benchmarks.bench_ingest --size-mb 300
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from sqlmodel import Session
+
+from backend.models import Bot, TrainingDataset
+from backend.utils.ingest import ingest_stream, BATCH_SIZE
+from backend.benchmarks.common import make_engine, peak_rss_mb, temp_db_path, write_result
+
+WORDS = (
+    "account billing refund password login order shipping invoice reset "
+    "upgrade plan cancel email support delivery payment card address help"
+).split()
+
+
+def generate_jsonl(path: str, size_mb: int, duplicate_rate: float, seed: int = 7) -> int:
+    """Write roughly `size_mb` of prompt/response rows, one at a time."""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = rows = 0
+    recent = []
+
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            if recent and rng.random() < duplicate_rate:
+                line = rng.choice(recent)
+            else:
+                prompt = " ".join(rng.choices(WORDS, k=rng.randint(8, 40)))
+                response = " ".join(rng.choices(WORDS, k=rng.randint(20, 120)))
+                line = json.dumps({"prompt": f"{rows} {prompt}", "response": response}) + "\n"
+                recent.append(line)
+                if len(recent) > 1000:
+                    recent.pop(0)
+            f.write(line)
+            written += len(line)
+            rows += 1
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    db_path = temp_db_path("ingest")
+    data_path = os.path.join(os.path.dirname(db_path), "dataset.jsonl")
+
+    rows = generate_jsonl(data_path, args.size_mb, args.duplicate_rate)
+    file_bytes = os.path.getsize(data_path)
+    rss_before = peak_rss_mb()
+
+    engine = make_engine(db_path)
+    with Session(engine) as db:
+        bot = Bot(name="Bench Bot", model="llama-3.1-8b-instant")
+        db.add(bot)
+        db.commit()
+        dataset = TrainingDataset(bot_id=bot.id, data={"format": "jsonl"})
+        db.add(dataset)
+        db.commit()
+        db.refresh(dataset)
+
+        start = time.perf_counter()
+        with open(data_path, "rb") as f:
+            stats = ingest_stream(
+                db, dataset, f, "jsonl",
+                total_bytes=file_bytes,
+                batch_size=args.batch_size,
+            )
+        elapsed = time.perf_counter() - start
+
+    write_result("ingest", {
+        "file_mb": round(file_bytes / (1024 * 1024), 1),
+        "rows_generated": rows,
+        "batch_size": args.batch_size,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(stats["rows_read"] / elapsed),
+        "mb_per_sec": round(file_bytes / (1024 * 1024) / elapsed, 1),
+        "peak_rss_mb_before_ingest": round(rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stats": stats,
+    })
+
+
+if __name__ == "__main__":
+    main()
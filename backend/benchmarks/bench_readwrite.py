@@ -0,0 +1,157 @@
+"""
+Read latency under concurrent write load: one shared engine (the old
+setup, rollback journal) vs the writer + read-only pool from backend.db.
+
+Each config runs reads alone, then the same reads while writer threads
+append messages and commit as fast as they can. Keep the thread counts
+low: past a few threads, GIL scheduling dominates the read tail in both
+configs and hides the lock contention being measured.
+
+    python -m backend.benchmarks.bench_readwrite --seconds 10 --readers 2 --writers 2
+"""
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlmodel import Session, SQLModel, select
+
+import backend.models  # noqa: F401  (register tables)
+from backend.db import RoutingSession, create_engines
+from backend.models import Message
+from backend.benchmarks.common import percentiles, temp_db_path, write_result
+
+
+def populate(path: str, conversations: int, messages_per: int):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(3)
+    words = "order refund account login reset shipping invoice help thanks please card email".split()
+    now = datetime.utcnow()
+    raw = engine.raw_connection()
+    cur = raw.cursor()
+    cur.execute("INSERT INTO user (id, email, password_hash, created_at) VALUES (1, 'u@x', 'x', ?)", (now,))
+    cur.execute(
+        "INSERT INTO bot (id, owner_id, name, model, system_prompt, temperature, settings, created_at) "
+        "VALUES (1, 1, 'b', 'm', 'p', 0.7, '{}', ?)", (now,),
+    )
+    cur.executemany(
+        "INSERT INTO conversation (id, bot_id, user_id, session_id, created_at, metadata_json) "
+        "VALUES (?, 1, 1, ?, ?, '{}')",
+        [(c, f"s{c}", now) for c in range(1, conversations + 1)],
+    )
+    cur.executemany(
+        "INSERT INTO message (conversation_id, role, text, created_at) VALUES (?, ?, ?, ?)",
+        [
+            (i // messages_per + 1, "user" if i % 2 == 0 else "bot",
+             " ".join(rng.choices(words, k=rng.randint(5, 40))), now)
+            for i in range(conversations * messages_per)
+        ],
+    )
+    raw.commit()
+    raw.close()
+    engine.dispose()
+
+
+def run_phase(session_factory, conversations: int, seconds: float, readers: int, writers: int):
+    stop = threading.Event()
+    reads, writes, errors = [], [], []
+    lock = threading.Lock()
+
+    def reader(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            conv_id = rng.randint(1, conversations)
+            start = time.perf_counter()
+            try:
+                with session_factory() as db:
+                    db.exec(
+                        select(Message).where(Message.conversation_id == conv_id).order_by(Message.created_at)
+                    ).all()
+            except Exception as e:
+                with lock:
+                    errors.append(type(e).__name__)
+                continue
+            with lock:
+                reads.append((time.perf_counter() - start) * 1000)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with session_factory() as db:
+                    db.add(Message(conversation_id=rng.randint(1, conversations), role="user", text="load " * 20))
+                    db.commit()
+            except Exception as e:
+                with lock:
+                    errors.append(type(e).__name__)
+                continue
+            with lock:
+                writes.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(100 + i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    def rounded(samples):
+        return {k: round(v, 2) for k, v in percentiles(samples).items()}
+
+    return {
+        "read_ms": rounded(reads),
+        "reads_per_s": round(len(reads) / seconds),
+        "write_ms": rounded(writes),
+        "writes_per_s": round(len(writes) / seconds),
+        "errors": len(errors),
+        "error_types": sorted(set(errors)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages-per", type=int, default=50)
+    args = parser.parse_args()
+
+    result = {"args": vars(args)}
+
+    # Old setup: one engine for everything, default rollback journal
+    path = temp_db_path("rw-single")
+    populate(path, args.conversations, args.messages_per)
+    single = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    result["single_engine"] = {
+        "reads_only": run_phase(lambda: Session(single), args.conversations, args.seconds, args.readers, 0),
+        "mixed": run_phase(lambda: Session(single), args.conversations, args.seconds, args.readers, args.writers),
+    }
+    single.dispose()
+
+    # Writer + read-only pool, routed per statement
+    path = temp_db_path("rw-split")
+    populate(path, args.conversations, args.messages_per)
+    writer, reader = create_engines(path)
+
+    def routed():
+        return RoutingSession(writer=writer, reader=reader)
+
+    result["split_engines"] = {
+        "reads_only": run_phase(routed, args.conversations, args.seconds, args.readers, 0),
+        "mixed": run_phase(routed, args.conversations, args.seconds, args.readers, args.writers),
+    }
+    writer.dispose()
+    reader.dispose()
+
+    write_result("readwrite", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Serialization time and bytes on the wire for a large conversation.
+
+Compares the stdlib encoder with orjson, raw vs gzip (and brotli when
+installed) body sizes, and end-to-end GET /sessions/{id}/messages with
+and without compression and with the history page cache.
+
+    python -m backend.benchmarks.bench_responses --messages 5000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from backend.benchmarks.common import make_engine, percentiles, temp_db_path, write_result
+
+SESSION_ID = "bench-responses"
+
+
+def populate(engine, messages: int):
+    rng = random.Random(11)
+    now = datetime.utcnow()
+    words = "order refund account login reset shipping invoice help thanks please card email".split()
+    raw = engine.raw_connection()
+    cur = raw.cursor()
+    cur.execute("INSERT INTO user (id, email, password_hash, created_at) VALUES (1, 'u@x', 'x', ?)", (now,))
+    cur.execute(
+        "INSERT INTO bot (id, owner_id, name, model, system_prompt, temperature, settings, created_at) "
+        "VALUES (1, 1, 'b', 'm', 'p', 0.7, '{}', ?)", (now,),
+    )
+    cur.execute(
+        "INSERT INTO conversation (id, bot_id, user_id, session_id, created_at, metadata_json) "
+        "VALUES (1, 1, 1, ?, ?, '{}')", (SESSION_ID, now),
+    )
+    cur.executemany(
+        "INSERT INTO message (conversation_id, role, text, created_at, latency_ms) VALUES (1, ?, ?, ?, ?)",
+        [
+            (
+                "user" if i % 2 == 0 else "bot",
+                " ".join(rng.choices(words, k=rng.randint(5, 120))),
+                (now - timedelta(seconds=messages - i)).isoformat(" "),
+                None if i % 2 == 0 else rng.randint(200, 3000),
+            )
+            for i in range(messages)
+        ],
+    )
+    raw.commit()
+    raw.close()
+
+
+def time_calls(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {k: round(v, 3) for k, v in percentiles(samples).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    db_path = temp_db_path("responses")
+    populate(make_engine(db_path), args.messages)
+    os.environ["CHATBOT_DB_PATH"] = db_path
+
+    # Imported after CHATBOT_DB_PATH is set so the app uses the temp file
+    from fastapi.testclient import TestClient
+
+    from backend.auth import create_access_token
+    from backend.main import app
+    from backend.utils import responses
+    from backend.utils.page_cache import history_pages
+
+    with TestClient(app) as client:
+        auth = {"Authorization": f"Bearer {create_access_token('1')}"}
+        url = f"/sessions/{SESSION_ID}/messages"
+        payload = client.get(url, headers={**auth, "Accept-Encoding": "identity"}).json()
+        stdlib_body = json.dumps(payload).encode("utf-8")
+        fast_body = responses.dumps(payload)
+
+        result = {
+            "messages": args.messages,
+            "orjson": responses.orjson is not None,
+            "serialize_ms": {
+                "stdlib_json": time_calls(lambda: json.dumps(payload).encode("utf-8"), args.repeat),
+                "fast": time_calls(lambda: responses.dumps(payload), args.repeat),
+            },
+            "bytes": {
+                "stdlib_json": len(stdlib_body),
+                "fast": len(fast_body),
+                "gzip": len(gzip.compress(fast_body, compresslevel=responses.GZIP_LEVEL)),
+            },
+        }
+        if responses.brotli is not None:
+            result["bytes"]["br"] = len(responses.brotli.compress(fast_body, quality=responses.BROTLI_QUALITY))
+
+        result["gzip_ms"] = time_calls(
+            lambda: gzip.compress(fast_body, compresslevel=responses.GZIP_LEVEL), args.repeat
+        )
+
+        full = {}
+        for name, encoding in (("identity", "identity"), ("gzip", "gzip")):
+            res = client.get(url, headers={**auth, "Accept-Encoding": encoding})
+            full[name] = {
+                "wire_bytes": int(res.headers.get("content-length", len(res.content))),
+                "content_encoding": res.headers.get("content-encoding"),
+                "latency_ms": time_calls(
+                    lambda: client.get(url, headers={**auth, "Accept-Encoding": encoding}), args.repeat
+                ),
+            }
+        result["full_history"] = full
+
+        # Second page onward is served from the page cache
+        first = client.get(url, params={"limit": args.page_size}, headers=auth)
+        before_id = int(first.headers["x-next-before-id"])
+        params = {"limit": args.page_size, "before_id": before_id}
+
+        def uncached():
+            history_pages.invalidate_conversation(1)
+            client.get(url, params=params, headers={**auth, "Accept-Encoding": "gzip"})
+
+        result["page"] = {
+            "size": args.page_size,
+            "uncached_ms": time_calls(uncached, args.repeat),
+            "cached_ms": time_calls(
+                lambda: client.get(url, params=params, headers={**auth, "Accept-Encoding": "gzip"}), args.repeat
+            ),
+            "cache_bytes": history_pages.bytes,
+        }
+
+    write_result("responses", result)
+
+
+if __name__ == "__main__":
+    main()
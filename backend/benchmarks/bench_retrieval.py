@@ -0,0 +1,89 @@
+"""
+Build a synthetic knowledge base and measure retrieval latency.
+
+    python -m backend.benchmarks.bench_retrieval --chunks 100000
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from backend.ai.retrieval import KnowledgeIndex, np
+from backend.benchmarks.common import Timer, percentiles, peak_rss_mb, write_result
+
+TOPICS = [
+    "refund", "invoice", "password", "shipping", "warranty", "subscription",
+    "upgrade", "firmware", "battery", "router", "printer", "bluetooth",
+    "calendar", "export", "backup", "encryption", "latency", "timeout",
+]
+FILLER = (
+    "please contact support team account settings page click open menu select "
+    "option device customer order update version install restart check status "
+    "message error window screen network cable power button email address"
+).split()
+
+
+def make_chunk(rng: random.Random) -> str:
+    words = rng.choices(FILLER, k=rng.randint(60, 120))
+    for _ in range(rng.randint(1, 4)):
+        words.insert(rng.randrange(len(words)), rng.choice(TOPICS))
+    words.append(f"ref{rng.randrange(1_000_000)}")
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    root = tempfile.mkdtemp(prefix="chatbot-kb-")
+    index = KnowledgeIndex(bot_id=1, root=root)
+
+    build_start = time.perf_counter()
+    for start in range(0, args.chunks, args.batch):
+        n = min(args.batch, args.chunks - start)
+        index.add_documents(("bench", make_chunk(rng)) for _ in range(n))
+    build_s = time.perf_counter() - build_start
+
+    with Timer() as load:
+        index = KnowledgeIndex(bot_id=1, root=root)
+
+    with Timer() as incremental:
+        index.add_documents(("bench", make_chunk(rng)) for _ in range(100))
+
+    queries = [
+        " ".join(rng.sample(TOPICS, 2) + rng.sample(FILLER, 3))
+        for _ in range(args.queries)
+    ]
+
+    results = {}
+    for mode in ("bm25", "hybrid"):
+        if mode == "hybrid" and np is None:
+            continue
+        samples = []
+        for q in queries:
+            with Timer() as t:
+                index.search(q, k=args.k, hybrid=(mode == "hybrid"))
+            samples.append(t.ms)
+        results[mode] = percentiles(samples)
+
+    write_result("retrieval", {
+        "chunks": index.size,
+        "terms": len(index.postings),
+        "numpy": np is not None,
+        "build_seconds": round(build_s, 2),
+        "load_ms": round(load.ms, 1),
+        "incremental_add_100_ms": round(incremental.ms, 1),
+        "search_ms": results,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    })
+    shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
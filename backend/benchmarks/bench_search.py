@@ -0,0 +1,120 @@
+"""
+Full-text search latency over a large message table.
+
+    python -m backend.benchmarks.bench_search --messages 1000000
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime
+
+from sqlmodel import Session
+
+from backend.utils.search import init_search, search_messages
+from backend.benchmarks.common import Timer, make_engine, percentiles, write_result
+
+
+def vocabulary(size: int):
+    rng = random.Random(5)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(size)]
+
+
+def populate(engine, args, words):
+    rng = random.Random(9)
+    # Zipf-like weights: a few very common words, a long tail of rare ones
+    cum_weights = list(itertools.accumulate(1.0 / (i + 1) for i in range(len(words))))
+    now = datetime.utcnow().isoformat(" ")
+
+    raw = engine.raw_connection()
+    cur = raw.cursor()
+    cur.executemany(
+        "INSERT INTO user (id, email, password_hash, created_at) VALUES (?, ?, 'x', ?)",
+        [(u, f"user{u}@bench.local", now) for u in range(1, args.users + 1)],
+    )
+    cur.executemany(
+        "INSERT INTO bot (id, owner_id, name, model, system_prompt, temperature, settings, created_at) "
+        "VALUES (?, NULL, ?, 'm', 'p', 0.7, '{}', ?)",
+        [(b, f"bot{b}", now) for b in range(1, args.bots + 1)],
+    )
+    cur.executemany(
+        "INSERT INTO conversation (id, bot_id, user_id, session_id, created_at, metadata_json) "
+        "VALUES (?, ?, ?, ?, ?, '{}')",
+        [
+            (c, rng.randint(1, args.bots), rng.randint(1, args.users), f"s{c}", now)
+            for c in range(1, args.conversations + 1)
+        ],
+    )
+
+    batch = []
+    for i in range(args.messages):
+        body = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(8, 30)))
+        batch.append((rng.randint(1, args.conversations), "user" if i % 2 else "bot", body, now))
+        if len(batch) >= 50_000:
+            cur.executemany(
+                "INSERT INTO message (conversation_id, role, text, created_at) VALUES (?, ?, ?, ?)",
+                batch,
+            )
+            batch = []
+    if batch:
+        cur.executemany(
+            "INSERT INTO message (conversation_id, role, text, created_at) VALUES (?, ?, ?, ?)",
+            batch,
+        )
+    raw.commit()
+    raw.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--conversations", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--bots", type=int, default=10)
+    parser.add_argument("--vocab", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    with engine.begin() as conn:
+        init_search(conn)
+
+    words = vocabulary(args.vocab)
+    start = time.perf_counter()
+    populate(engine, args, words)
+    load_s = time.perf_counter() - start
+
+    rng = random.Random(1)
+    scenarios = {
+        # mid-frequency words: the typical "find that chat about X" query
+        "two_terms": lambda: f"{rng.choice(words[200:5000])} {rng.choice(words[200:5000])}",
+        "rare_term": lambda: rng.choice(words[5000:]),
+        "prefix": lambda: rng.choice(words[50:2000])[:3],
+        "common_term": lambda: rng.choice(words[:20]),
+    }
+
+    results = {}
+    with Session(engine) as db:
+        for name, make_query in scenarios.items():
+            samples = []
+            for _ in range(args.queries):
+                q = make_query()
+                user_id = rng.randint(1, args.users)
+                bot_id = rng.randint(1, args.bots) if rng.random() < 0.5 else None
+                with Timer() as t:
+                    search_messages(db, user_id, q, bot_id=bot_id, limit=20)
+                samples.append(t.ms)
+            results[name] = percentiles(samples)
+
+    write_result("search", {
+        "messages": args.messages,
+        "conversations": args.conversations,
+        "users": args.users,
+        "load_seconds": round(load_s, 1),
+        "query_ms": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
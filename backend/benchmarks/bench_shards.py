@@ -0,0 +1,138 @@
+"""
+Aggregate chat write throughput as the shard count grows.
+
+Each configuration gets a fresh catalog (users, bots, conversation
+directory) and N shard files. Writer processes (separate processes, so
+the GIL is out of the picture and SQLite's file lock is the only thing
+they share) append messages to random users' conversations through
+ShardedSession, one commit per message like a chat turn.
+
+    python -m backend.benchmarks.bench_shards --seconds 10 --processes 8 --shards 1,2,4,8
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import time
+
+from sqlmodel import Session, SQLModel
+
+from backend.db import create_engines
+from backend.models import Bot, Conversation, Message, User
+from backend.sharding import ShardRouter, ShardedSession, bind_user, register_conversation
+from backend.benchmarks.common import percentiles, temp_db_path, write_result
+
+
+def _router(catalog_path: str, shards: int) -> ShardRouter:
+    catalog = create_engines(catalog_path)
+    return ShardRouter(shards, catalog_path, os.path.dirname(catalog_path), catalog=catalog)
+
+
+def populate(catalog_path: str, shards: int, users: int) -> list:
+    """Users with one conversation each; returns [(user_id, conversation_id)]."""
+    router = _router(catalog_path, shards)
+    SQLModel.metadata.create_all(router.catalog[0])
+    router.init()
+
+    pairs = []
+    with Session(router.catalog[0]) as db:
+        owner = User(email="owner@bench", password_hash="x")
+        db.add(owner)
+        db.commit()
+        bot = Bot(owner_id=owner.id, name="bench", model="m", system_prompt="p")
+        db.add(bot)
+        db.commit()
+        user_ids = []
+        for i in range(users):
+            user = User(email=f"u{i}@bench", password_hash="x")
+            db.add(user)
+            db.flush()
+            user_ids.append(user.id)
+        db.commit()
+        bot_id = bot.id
+
+    for user_id in user_ids:
+        with ShardedSession(router, writer=router.catalog[0], reader=router.catalog[1]) as db:
+            conv = Conversation(bot_id=bot_id, user_id=user_id, session_id=f"s{user_id}")
+            register_conversation(db, conv)
+            db.add(conv)
+            db.commit()
+            pairs.append((user_id, conv.id))
+
+    router.dispose()
+    return pairs
+
+
+def writer(catalog_path, shards, pairs, start, seconds, seed, out):
+    router = _router(catalog_path, shards)
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user_id, conversation_id = rng.choice(pairs)
+        t0 = time.perf_counter()
+        try:
+            with ShardedSession(router, writer=router.catalog[0], reader=router.catalog[1]) as db:
+                bind_user(db, user_id)
+                db.add(Message(conversation_id=conversation_id, role="user", text="load " * 20))
+                db.commit()
+        except Exception:
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    router.dispose()
+    out.put((latencies, errors))
+
+
+def run(shards: int, processes: int, users: int, seconds: float) -> dict:
+    catalog_path = temp_db_path(f"shards-{shards}")
+    pairs = populate(catalog_path, shards, users)
+
+    ctx = mp.get_context("spawn")
+    start, out = ctx.Event(), ctx.Queue()
+    procs = [
+        ctx.Process(target=writer, args=(catalog_path, shards, pairs, start, seconds, i, out))
+        for i in range(processes)
+    ]
+    for p in procs:
+        p.start()
+    time.sleep(2)  # let the spawned interpreters import and connect
+    start.set()
+
+    latencies, errors = [], 0
+    for _ in procs:
+        part, failed = out.get()
+        latencies += part
+        errors += failed
+    for p in procs:
+        p.join()
+
+    return {
+        "writes_per_s": round(len(latencies) / seconds),
+        "write_ms": {k: round(v, 2) for k, v in percentiles(latencies).items()},
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--users", type=int, default=256)
+    parser.add_argument("--shards", default="1,2,4,8")
+    args = parser.parse_args()
+
+    result = {"args": vars(args), "by_shards": {}}
+    for shards in [int(n) for n in args.shards.split(",")]:
+        result["by_shards"][shards] = run(shards, args.processes, args.users, args.seconds)
+        print(shards, result["by_shards"][shards])
+
+    write_result("shards", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Export / import throughput (rows per second) and peak memory.
+
+    python -m backend.benchmarks.bench_transfer --conversations 10000 --messages-per 40
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from backend.utils.transfer import export_records, gzip_jsonl, import_records, open_jsonl
+from backend.benchmarks.common import make_engine, peak_rss_mb, temp_db_path, write_result
+
+
+def populate(engine, args):
+    rng = random.Random(5)
+    now = datetime.utcnow()
+    raw = engine.raw_connection()
+    cur = raw.cursor()
+    cur.execute("INSERT INTO user (id, email, password_hash, created_at) VALUES (1, 'u@x', 'x', ?)", (now,))
+    cur.execute(
+        "INSERT INTO bot (id, owner_id, name, model, system_prompt, temperature, settings, created_at) "
+        "VALUES (1, 1, 'b', 'm', 'p', 0.7, '{}', ?)", (now,),
+    )
+    cur.executemany(
+        "INSERT INTO conversation (id, bot_id, user_id, session_id, created_at, metadata_json) "
+        "VALUES (?, 1, 1, ?, ?, '{}')",
+        [(c, f"s{c}", now - timedelta(days=rng.randint(0, 365))) for c in range(1, args.conversations + 1)],
+    )
+
+    words = "order refund account login reset shipping invoice help thanks please card email".split()
+    rows = []
+    for i in range(args.conversations * args.messages_per):
+        rows.append((
+            i // args.messages_per + 1,
+            "user" if i % 2 == 0 else "bot",
+            " ".join(rng.choices(words, k=rng.randint(5, 60))),
+            now.isoformat(" "),
+        ))
+        if len(rows) >= 50_000:
+            cur.executemany("INSERT INTO message (conversation_id, role, text, created_at) VALUES (?, ?, ?, ?)", rows)
+            rows = []
+    if rows:
+        cur.executemany("INSERT INTO message (conversation_id, role, text, created_at) VALUES (?, ?, ?, ?)", rows)
+    cur.executemany(
+        "INSERT INTO usermemory (user_id, bot_id, key, value, created_at, updated_at) VALUES (1, 1, ?, ?, ?, ?)",
+        [(f"k{i}", f"v{i}", now, now) for i in range(args.memories)],
+    )
+    raw.commit()
+    raw.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--conversations", type=int, default=10_000)
+    parser.add_argument("--messages-per", type=int, default=40)
+    parser.add_argument("--memories", type=int, default=1000)
+    args = parser.parse_args()
+
+    source = make_engine(temp_db_path("export"))
+    populate(source, args)
+    rows = args.conversations * (args.messages_per + 1) + args.memories
+    out_path = os.path.join(os.path.dirname(temp_db_path("export-file")), "history.jsonl.gz")
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    with Session(source) as db, open(out_path, "wb") as f:
+        for chunk in gzip_jsonl(export_records(db, user_id=1)):
+            f.write(chunk)
+    export_s = time.perf_counter() - start
+    rss_export = peak_rss_mb()
+
+    target = make_engine(temp_db_path("import"))
+    with Session(target) as db:
+        raw = target.raw_connection()
+        raw.execute("INSERT INTO user (id, email, password_hash, created_at) VALUES (1, 'u@x', 'x', ?)", (datetime.utcnow(),))
+        raw.execute(
+            "INSERT INTO bot (id, owner_id, name, model, system_prompt, temperature, settings, created_at) "
+            "VALUES (1, 1, 'b', 'm', 'p', 0.7, '{}', ?)", (datetime.utcnow(),),
+        )
+        raw.commit()
+        raw.close()
+
+        start = time.perf_counter()
+        with open(out_path, "rb") as f:
+            stats = import_records(db, 1, open_jsonl(f))
+        import_s = time.perf_counter() - start
+
+    write_result("transfer", {
+        "rows": rows,
+        "file_mb": round(os.path.getsize(out_path) / (1024 * 1024), 2),
+        "export_seconds": round(export_s, 2),
+        "export_rows_per_s": round(rows / export_s),
+        "import_seconds": round(import_s, 2),
+        "import_rows_per_s": round(rows / import_s),
+        "import_stats": stats,
+        "rss_mb_before_export": round(rss_before, 1),
+        "peak_rss_mb_after_export": round(rss_export, 1),
+        "peak_rss_mb_after_import": round(peak_rss_mb(), 1),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Shared helpers for the benchmark scripts in this package.
+
+Benchmarks run against throwaway SQLite files in a temp directory, never
+against backend/chatbot.db. Results are written as JSON under
+backend/benchmarks/results/ so runs can be compared.
+"""
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, create_engine
+
+import backend.models  # noqa: F401  (register tables)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def temp_db_path(name: str = "bench") -> str:
+    directory = tempfile.mkdtemp(prefix=f"chatbot-{name}-")
+    return os.path.join(directory, f"{name}.db")
+
+
+def make_engine(path: Optional[str] = None, wal: bool = True):
+    """Engine on a fresh SQLite file with all tables created."""
+    path = path or temp_db_path()
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+    )
+
+    if wal:
+        @event.listens_for(engine, "connect")
+        def _pragmas(dbapi_conn, _):
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.close()
+
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def percentiles(samples: Iterable[float]) -> Dict[str, float]:
+    data = sorted(samples)
+    if not data:
+        return {"count": 0}
+
+    def pick(q):
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+    return {
+        "count": len(data),
+        "mean": sum(data) / len(data),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": data[-1],
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self.start) * 1000
+
+
+def write_result(name: str, payload: Dict) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(RESULTS_DIR, f"{name}-{stamp}.json")
+    payload = {"benchmark": name, "timestamp": stamp, **payload}
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, default=str)
+    print(json.dumps(payload, indent=2, default=str))
+    print(f"📄 Results written to {path}")
+    return path
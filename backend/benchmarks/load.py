@@ -0,0 +1,236 @@
+"""
+End-to-end load test of the HTTP API against a stub LLM.
+
+Seeds a throwaway database, starts the stub LLM and the API (as a
+subprocess, via backend.benchmarks.serve) and runs the scenarios:
+
+    login    login storm (POST /auth/login)
+    chat     send a message (POST /bots/{bot_id}/sessions/{session_id}/message)
+    history  read a conversation (GET /bots/conversations/{id}/messages)
+    today    today's sessions of a bot (GET /bots/{bot_id}/history/today)
+
+Each reports throughput, latency percentiles, error counts and SQL
+statements per request; results are stored as JSON for comparison.
+
+    python -m backend.benchmarks.load --concurrency 16 --requests 500
+    python -m backend.benchmarks.load --scenario chat --llm-latency-ms 800 --llm-error-rate 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+from backend.benchmarks.common import make_engine, percentiles, temp_db_path, write_result
+from backend.benchmarks.seed import BENCH_PASSWORD, seed_dataset
+from backend.benchmarks.stub_llm import StubConfig, start_stub
+
+SCENARIOS = ("login", "chat", "history", "today")
+
+
+# ─────────────────────────────────────────────
+# PROCESS SETUP
+# ─────────────────────────────────────────────
+
+def start_api(db_path: str, port: int, llm_url: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "CHATBOT_DB_PATH": db_path,
+        "GROQ_BASE_URL": llm_url,
+        "GROQ_API_KEY": os.getenv("GROQ_API_KEY") or "stub",
+        "SECRET_KEY": os.getenv("SECRET_KEY") or "bench-secret",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "backend.benchmarks.serve", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("API process exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("API did not start within 30s")
+
+
+def load_fixtures(db_path: str, limit: int = 5000) -> List[Dict]:
+    """Seeded sessions to drive the scenarios with (user, bot, conversation)."""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT c.id, c.session_id, c.bot_id, c.user_id, u.email "
+        "FROM conversation c JOIN user u ON u.id = c.user_id "
+        "ORDER BY random() LIMIT ?", (limit,),
+    ).fetchall()
+    conn.close()
+    return [
+        {"conversation_id": r[0], "session_id": r[1], "bot_id": r[2], "user_id": r[3], "email": r[4]}
+        for r in rows
+    ]
+
+
+# ─────────────────────────────────────────────
+# RUNNER
+# ─────────────────────────────────────────────
+
+async def query_count(client: httpx.AsyncClient) -> int:
+    return (await client.get("/__bench__/queries")).json()["queries"]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    request: Callable[[int], Awaitable[httpx.Response]],
+    total: int,
+    concurrency: int,
+) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                status = str((await request(i)).status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    queries_before = await query_count(client)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    queries = await query_count(client) - queries_before - 1  # minus the probe itself
+
+    ok = sum(n for s, n in statuses.items() if s.startswith("2"))
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 1),
+        "latency_ms": {k: round(v, 1) for k, v in percentiles(latencies).items()},
+        "status": statuses,
+        "error_rate": round(1 - ok / total, 4) if total else 0.0,
+        "db_queries_per_request": round(queries / total, 2) if total else 0.0,
+    }
+
+
+async def run_all(args, base_url: str, fixtures: List[Dict]) -> Dict:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    timeout = httpx.Timeout(120.0)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        # Tokens for the scenario users (outside any measurement)
+        tokens: Dict[str, str] = {}
+        for email in {f["email"] for f in fixtures[: args.users_in_play]}:
+            r = await client.post("/auth/login", data={"username": email, "password": BENCH_PASSWORD})
+            tokens[email] = r.json()["access_token"]
+        in_play = [f for f in fixtures if f["email"] in tokens]
+
+        def auth(f):
+            return {"Authorization": f"Bearer {tokens[f['email']]}"}
+
+        async def login(i):
+            return await client.post(
+                "/auth/login",
+                data={"username": rng.choice(in_play)["email"], "password": BENCH_PASSWORD},
+            )
+
+        async def chat(i):
+            f = rng.choice(in_play)
+            return await client.post(
+                f"/bots/{f['bot_id']}/sessions/{f['session_id']}/message",
+                data={"message": f"benchmark message {i}: can you help with my order?"},
+                headers=auth(f),
+            )
+
+        async def history(i):
+            f = rng.choice(in_play)
+            return await client.get(f"/bots/conversations/{f['conversation_id']}/messages", headers=auth(f))
+
+        async def today(i):
+            f = rng.choice(in_play)
+            return await client.get(f"/bots/{f['bot_id']}/history/today", headers=auth(f))
+
+        requests = {"login": login, "chat": chat, "history": history, "today": today}
+        results = {}
+        for name in args.scenario:
+            print(f"▶️ {name}: {args.requests} requests @ {args.concurrency} concurrent")
+            results[name] = await run_scenario(client, requests[name], args.requests, args.concurrency)
+            print(f"   {results[name]['throughput_rps']} req/s, p95 {results[name]['latency_ms'].get('p95')} ms")
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=300, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions-per-user", type=int, default=5)
+    parser.add_argument("--messages-per-session", type=int, default=20)
+    parser.add_argument("--users-in-play", type=int, default=50, help="sessions sampled by scenarios")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    db_path = temp_db_path("load")
+    engine = make_engine(db_path)
+    from backend.utils.search import init_search
+    with engine.begin() as conn:
+        init_search(conn)
+    dataset = seed_dataset(
+        engine,
+        users=args.users,
+        sessions_per_user=args.sessions_per_user,
+        messages_per_session=args.messages_per_session,
+        seed=args.seed,
+    )
+    engine.dispose()
+    fixtures = load_fixtures(db_path)
+
+    stub = start_stub(args.llm_port, StubConfig(
+        latency_ms=args.llm_latency_ms,
+        jitter_ms=args.llm_jitter_ms,
+        error_rate=args.llm_error_rate,
+        seed=args.seed,
+    ))
+    api = start_api(db_path, args.port, f"http://127.0.0.1:{args.llm_port}")
+
+    try:
+        results = asyncio.run(run_all(args, f"http://127.0.0.1:{args.port}", fixtures))
+    finally:
+        api.terminate()
+        api.wait(timeout=10)
+        stub.shutdown()
+
+    write_result("load", {
+        "dataset": dataset,
+        "llm": {
+            "latency_ms": args.llm_latency_ms,
+            "jitter_ms": args.llm_jitter_ms,
+            "error_rate": args.llm_error_rate,
+        },
+        "scenarios": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
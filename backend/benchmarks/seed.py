@@ -0,0 +1,133 @@
+"""
+Deterministic dataset generator for load tests.
+
+Builds on seed_bots.py (the three system bots) and adds users, sessions
+and messages at scale with plain executemany inserts. Every user gets
+the password BENCH_PASSWORD so scenarios can log in.
+
+    python -m backend.benchmarks.seed --db /tmp/bench.db --users 1000 --sessions-per-user 5
+"""
+import argparse
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlmodel import Session
+
+from backend.auth import get_password_hash
+from backend.seed_bots import seed_system_bots
+
+BENCH_PASSWORD = "bench-password"
+WORDS = (
+    "order refund account login reset shipping invoice help thanks please card "
+    "email lesson homework explain joke story python math history weather"
+).split()
+
+
+def bench_email(i: int) -> str:
+    return f"bench{i}@example.com"
+
+
+def seed_dataset(
+    engine,
+    users: int = 200,
+    sessions_per_user: int = 5,
+    messages_per_session: int = 20,
+    today_fraction: float = 0.2,
+    seed: int = 1,
+) -> Dict:
+    """
+    Populate an initialised database. A `today_fraction` of sessions are
+    created today so /history/today has work to do.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    with Session(engine) as db:
+        bot_ids = [b.id for b in seed_system_bots(db)]
+
+    password_hash = get_password_hash(BENCH_PASSWORD)  # hashing is slow; share one
+    raw = engine.raw_connection()
+    cur = raw.cursor()
+
+    start_user = (cur.execute("SELECT coalesce(max(id), 0) FROM user").fetchone()[0]) + 1
+    cur.executemany(
+        "INSERT INTO user (id, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+        [(start_user + i, bench_email(start_user + i), password_hash, now) for i in range(users)],
+    )
+
+    conv_id = cur.execute("SELECT coalesce(max(id), 0) FROM conversation").fetchone()[0]
+    conversations, messages = [], []
+    for user_id in range(start_user, start_user + users):
+        for _ in range(sessions_per_user):
+            conv_id += 1
+            if rng.random() < today_fraction:
+                started = now.replace(hour=0, minute=0) + timedelta(minutes=rng.randint(0, now.hour * 60 + now.minute))
+            else:
+                started = now - timedelta(days=rng.randint(1, 90), minutes=rng.randint(0, 1440))
+            conversations.append((conv_id, rng.choice(bot_ids), user_id, str(uuid.uuid4()), started))
+
+            for i in range(messages_per_session):
+                messages.append((
+                    conv_id,
+                    "user" if i % 2 == 0 else "bot",
+                    " ".join(rng.choices(WORDS, k=rng.randint(4, 40))),
+                    None if i % 2 == 0 else rng.randint(200, 1500),
+                    started + timedelta(seconds=20 * i),
+                ))
+
+            if len(messages) >= 50_000:
+                _flush(cur, conversations, messages)
+                conversations, messages = [], []
+    _flush(cur, conversations, messages)
+
+    raw.commit()
+    raw.close()
+    return {
+        "users": users,
+        "first_user_id": start_user,
+        "bot_ids": bot_ids,
+        "conversations": users * sessions_per_user,
+        "messages": users * sessions_per_user * messages_per_session,
+    }
+
+
+def _flush(cur, conversations, messages):
+    cur.executemany(
+        "INSERT INTO conversation (id, bot_id, user_id, session_id, created_at, metadata_json) "
+        "VALUES (?, ?, ?, ?, ?, '{}')",
+        conversations,
+    )
+    cur.executemany(
+        "INSERT INTO message (conversation_id, role, text, latency_ms, created_at) VALUES (?, ?, ?, ?, ?)",
+        messages,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark database")
+    parser.add_argument("--db", required=True, help="SQLite file to create / extend")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions-per-user", type=int, default=5)
+    parser.add_argument("--messages-per-session", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from backend.benchmarks.common import make_engine
+    from backend.utils.search import init_search
+
+    engine = make_engine(args.db)
+    with engine.begin() as conn:
+        init_search(conn)
+    print(seed_dataset(
+        engine,
+        users=args.users,
+        sessions_per_user=args.sessions_per_user,
+        messages_per_session=args.messages_per_session,
+        seed=args.seed,
+    ))
+
+
+if __name__ == "__main__":
+    main()
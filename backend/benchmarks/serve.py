@@ -0,0 +1,47 @@
+"""
+Run the API for a load test, with a SQL statement counter.
+
+Adds GET /__bench__/queries (total statements executed by this process)
+so load.py can report DB queries per request. Configure the database and
+LLM with CHATBOT_DB_PATH and GROQ_BASE_URL before starting:
+
+    CHATBOT_DB_PATH=/tmp/bench.db GROQ_BASE_URL=http://127.0.0.1:9100 \\
+        python -m backend.benchmarks.serve --port 8100
+"""
+import argparse
+import itertools
+
+from sqlalchemy import event
+
+from backend.db import engine, read_engine
+from backend.main import app
+
+_statements = itertools.count(1)  # next() is atomic under the GIL
+_last = [0]
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    _last[0] = next(_statements)
+
+
+for _engine in (engine, read_engine):
+    event.listen(_engine, "before_cursor_execute", _count_statement)
+
+
+@app.get("/__bench__/queries", include_in_schema=False)
+def bench_queries():
+    return {"queries": _last[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API for benchmarks")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
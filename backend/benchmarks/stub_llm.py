@@ -0,0 +1,218 @@
+"""
+Local stand-in for the Groq chat completions API.
+
+Speaks the OpenAI-compatible wire format the groq SDK uses, so the API
+can be load-tested without network calls or rate limits. Point the
+backend at it with GROQ_BASE_URL:
+
+    python -m backend.benchmarks.stub_llm --port 9100 --latency-ms 300 --error-rate 0.01
+    GROQ_BASE_URL=http://127.0.0.1:9100 uvicorn backend.main:app
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = "sure here is a short answer to your question about that topic hope it helps".split()
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 100.0,
+        error_rate: float = 0.0,
+        tokens_per_s: float = 200.0,
+        reply_tokens: int = 40,
+        tail_rate: float = 0.0,
+        tail_ms: float = 0.0,
+        rate_limit_rps: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.tokens_per_s = tokens_per_s
+        self.reply_tokens = reply_tokens
+        # Heavy tail: this fraction of requests waits an extra Pareto(2) * tail_ms
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        # Answer 429 (Retry-After: 1) above this many requests per second; 0 = no limit
+        self.rate_limit_rps = rate_limit_rps
+        self._window = (0, 0)  # (second, requests in it)
+        self.rate_limited = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def sample(self):
+        """(time to first token in seconds, inject an error?)"""
+        with self.lock:
+            self.requests += 1
+            delay = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            if self.rng.random() < self.tail_rate:
+                delay += self.tail_ms * self.rng.paretovariate(2.0) / 1000
+            fail = self.rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def over_limit(self) -> bool:
+        if not self.rate_limit_rps:
+            return False
+        with self.lock:
+            second = int(time.time())
+            count = self._window[1] + 1 if self._window[0] == second else 1
+            self._window = (second, count)
+            if count > self.rate_limit_rps:
+                self.rate_limited += 1
+                return True
+        return False
+
+
+def make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):  # keep benchmark output clean
+            pass
+
+        def _json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                return self._json(200, {"requests": config.requests, "errors": config.errors,
+                                        "rate_limited": config.rate_limited})
+            self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            if not self.path.endswith("/chat/completions"):
+                return self._json(404, {"error": {"message": "not found"}})
+
+            if config.over_limit():
+                return self._json(429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}},
+                                  {"Retry-After": "1"})
+
+            delay, fail = config.sample()
+            time.sleep(delay)
+            if fail:
+                status = random.choice((429, 500, 503))
+                return self._json(status, {"error": {"message": "stub failure", "type": "server_error"}})
+
+            words = [random.choice(WORDS) for _ in range(config.reply_tokens)]
+            created = int(time.time())
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "stub")
+
+            if request.get("stream"):
+                return self._stream(words, completion_id, created, model)
+
+            # Non-streaming callers still wait for the full generation
+            time.sleep(len(words) / config.tokens_per_s)
+            self._json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": sum(len(str(m.get("content", ""))) // 4 for m in request.get("messages", [])),
+                    "completion_tokens": len(words),
+                    "total_tokens": len(words),
+                },
+            })
+
+        def _stream(self, words, completion_id, created, model):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(data: str):
+                chunk = f"data: {data}\n\n".encode()
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+
+            for i, word in enumerate(words):
+                send(json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": word if i == 0 else " " + word},
+                        "finish_reason": "stop" if i == len(words) - 1 else None,
+                    }],
+                }))
+                time.sleep(1 / config.tokens_per_s)
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def start_stub(port: int = 9100, config: StubConfig = None) -> ThreadingHTTPServer:
+    """Run the stub in a daemon thread; call .shutdown() to stop it."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config or StubConfig()))
+    server.daemon_threads = True
+    # Clients hang up on purpose (cancelled hedges, timeouts): no tracebacks
+    server.handle_error = lambda request, client_address: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub LLM server")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-s", type=float, default=200.0)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="fraction of requests in the slow tail")
+    parser.add_argument("--tail-ms", type=float, default=0.0, help="scale of the extra tail latency")
+    parser.add_argument("--rate-limit-rps", type=float, default=0.0, help="answer 429 above this rate")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        tokens_per_s=args.tokens_per_s,
+        reply_tokens=args.reply_tokens,
+        tail_rate=args.tail_rate,
+        tail_ms=args.tail_ms,
+        rate_limit_rps=args.rate_limit_rps,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(config))
+    server.daemon_threads = True
+    server.handle_error = lambda request, client_address: None
+    print(f"🤖 Stub LLM listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
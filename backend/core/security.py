@@ -1,3 +1,4 @@
+import logging
 import os
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
@@ -16,6 +17,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440)
 if not SECRET_KEY:
     raise RuntimeError("SECRET_KEY is not set in .env")
 
+logger = logging.getLogger(__name__)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 pwd_context = CryptContext(
@@ -42,7 +45,7 @@ def get_current_user(
     token: str = Depends(oauth2_scheme)
 ):
     from ..models import User
-    from ..db import engine
+    from ..db import read_engine
     
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -51,7 +54,7 @@ def get_current_user(
             raise HTTPException(status_code=401, detail="Invalid token")
 
         # Use context manager to properly close the session
-        with Session(engine) as db:
+        with Session(read_engine) as db:
             user = db.get(User, int(user_id))
             if not user:
                 raise HTTPException(status_code=401, detail="User not found")
@@ -65,5 +68,5 @@ def get_current_user(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[Security] Unexpected error in get_current_user: {type(e).__name__}: {e}")
+        logger.warning("unexpected error in get_current_user", extra={"error": f"{type(e).__name__}: {e}"})
         raise HTTPException(status_code=401, detail="Authentication failed")
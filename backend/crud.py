@@ -1,9 +1,10 @@
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import Session, select
 
-from .models import User, Bot, UserMemory
+from .models import User, Bot, UserMemory, BotMemory
 
 
 # ─────────────────────────────────────────────
@@ -143,3 +144,73 @@ def delete_user_memory(
     session.delete(memory)
     session.commit()
     return True
+
+
+# ─────────────────────────────────────────────
+# BOT MEMORY (SHARED BY ALL USERS OF A BOT)
+# ─────────────────────────────────────────────
+
+def save_bot_memory(
+    session: Session,
+    bot_id: int,
+    key: str,
+    value: str,
+    importance: int = 1,
+) -> BotMemory:
+    """
+    Save or update a bot-level memory (one row per key).
+    Example: key="store_hours", value="9am-5pm", importance=4
+    """
+    # One statement, so concurrent saves of a key cannot both insert
+    stmt = sqlite_insert(BotMemory.__table__).values(
+        bot_id=bot_id,
+        key=key,
+        value=value,
+        importance=importance,
+        created_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["bot_id", "key"],
+        set_={"value": stmt.excluded.value, "importance": stmt.excluded.importance},
+    )
+    session.execute(stmt)
+    session.commit()
+
+    return session.exec(
+        select(BotMemory).where(
+            BotMemory.bot_id == bot_id,
+            BotMemory.key == key,
+        )
+    ).one()
+
+
+def list_bot_memories(
+    session: Session,
+    bot_id: int,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> List[BotMemory]:
+    """Bot memories ranked by importance, newest first within a level."""
+    query = (
+        select(BotMemory)
+        .where(BotMemory.bot_id == bot_id)
+        .order_by(
+            BotMemory.importance.desc(),
+            BotMemory.created_at.desc(),
+            BotMemory.id.desc(),
+        )
+        .offset(offset)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return session.exec(query).all()
+
+
+def delete_bot_memory(session: Session, bot_id: int, memory_id: int) -> bool:
+    memory = session.get(BotMemory, memory_id)
+    if not memory or memory.bot_id != bot_id:
+        return False
+
+    session.delete(memory)
+    session.commit()
+    return True
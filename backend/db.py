@@ -1,22 +1,208 @@
+from sqlalchemy import event
+from sqlalchemy.schema import CreateTable
 from sqlmodel import SQLModel, create_engine, Session
 from backend.models import User, Bot, Conversation, Message, UserMemory
+from backend.utils.search import init_search
+from backend.utils.query_stats import instrument_engine
+from backend.utils.deadline import DeadlineExceeded, TIMEOUT, current_deadline
 import os
 
-# Always resolve DB path relative to THIS file
+# Always resolve DB path relative to THIS file (benchmarks point it elsewhere)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "chatbot.db")
+DB_PATH = os.getenv("CHATBOT_DB_PATH") or os.path.join(BASE_DIR, "chatbot.db")
 
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,
-    connect_args={"check_same_thread": False},
-)
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 8))
+BUSY_TIMEOUT_S = 30
+DEADLINE_CHECK_OPS = 10_000  # SQLite VM instructions between deadline checks
+
+
+def _on_connect(engine, *pragmas):
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cur.execute(f"PRAGMA {pragma}")
+        cur.close()
+
+
+def _deadline_passed() -> int:
+    deadline = current_deadline()
+    return 1 if deadline is not None and deadline.expired else 0
+
+
+def _enforce_deadlines(engine):
+    """Interrupt statements running past the current request's Deadline."""
+    @event.listens_for(engine, "connect")
+    def _progress(dbapi_conn, _):
+        dbapi_conn.set_progress_handler(_deadline_passed, DEADLINE_CHECK_OPS)
+
+    @event.listens_for(engine, "handle_error")
+    def _interrupted(context):
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired and "interrupted" in str(context.original_exception):
+            return DeadlineExceeded(deadline.reason or TIMEOUT)
+
+
+def create_engines(path: str):
+    """
+    (writer, reader) for one SQLite file.
+
+    The writer is a single WAL-mode connection: its pool is the queue that
+    serializes mutations, so commits never fight each other for the lock.
+    The reader is a pool of read-only connections (mode=ro, query_only)
+    that, thanks to WAL, keep reading while a write is in progress.
+    """
+    writer = create_engine(
+        f"sqlite:///{path}",
+        echo=False,
+        connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT_S},
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=BUSY_TIMEOUT_S,
+    )
+    _on_connect(writer, "journal_mode=WAL", "synchronous=NORMAL")
+    _enforce_deadlines(writer)
+
+    reader = create_engine(
+        f"sqlite:///file:{path}?mode=ro&uri=true",
+        echo=False,
+        connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT_S},
+        pool_size=READ_POOL_SIZE,
+        max_overflow=READ_POOL_SIZE,
+    )
+    _on_connect(reader, "query_only=1")
+    _enforce_deadlines(reader)
+    return writer, reader
+
+
+# `engine` is the writer: migrations, CLI jobs and anything that mutates
+engine, read_engine = create_engines(DB_PATH)
+instrument_engine(engine)
+instrument_engine(read_engine)
+
+
+class RoutingSession(Session):
+    """
+    Session over both engines: statements go to the read pool until the
+    session writes (flush or INSERT/UPDATE/DELETE); from then until the
+    transaction ends everything uses the writer, so it reads its own writes.
+    """
+    _writing = False
+
+    def __init__(self, writer=None, reader=None, **kw):
+        super().__init__(**kw)
+        self.writer = writer or engine
+        self.reader = reader or read_engine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._writing or self._flushing or getattr(clause, "is_dml", False):
+            self._writing = True
+            return self.writer
+        return self.reader
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _back_to_reader(session, transaction):
+    if transaction.parent is None:
+        session._writing = False
+
+def add_missing_columns(conn, tables=None):
+    """
+    create_all() never alters existing tables, so add columns (and their
+    indexes) that were introduced after a database was first created.
+    New columns are always nullable, which SQLite can add in place.
+    """
+    for table in tables or SQLModel.metadata.sorted_tables:
+        existing = {
+            row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')
+        }
+        if not existing:
+            continue
+
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {ddl}'
+                )
+
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def ensure_autoincrement(conn, tables=None, floors=None):
+    """
+    Rebuild tables created before they were declared sqlite_autoincrement,
+    so SQLite stops handing out the ids of deleted rows again. Rows keep
+    their ids; `floors` (table name -> id) reserves ids still held
+    elsewhere, e.g. messages moved to an archive.
+    """
+    floors = floors or {}
+    tables = tables or [t for t in SQLModel.metadata.sorted_tables if t.dialect_options["sqlite"]["autoincrement"]]
+    for table in tables:
+        ddl = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar()
+        if ddl is None or "AUTOINCREMENT" in ddl.upper():
+            continue
+
+        rebuilt = f"{table.name}__autoincrement"
+        create = str(CreateTable(table).compile(dialect=conn.dialect))
+        create = create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {rebuilt} ", 1)
+        columns = ", ".join(f'"{c.name}"' for c in table.columns)
+
+        # Triggers go with the table (init_search recreates them); dropping
+        # them first also keeps delete triggers from firing on DROP TABLE.
+        # legacy_alter_table: views on the table are left as they are
+        triggers = conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (table.name,)
+        ).scalars().all()
+        for trigger in triggers:
+            conn.exec_driver_sql(f'DROP TRIGGER "{trigger}"')
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+        conn.exec_driver_sql(create)
+        conn.exec_driver_sql(f'INSERT INTO "{rebuilt}" ({columns}) SELECT {columns} FROM "{table.name}"')
+        conn.exec_driver_sql(f'DROP TABLE "{table.name}"')
+        conn.exec_driver_sql(f'ALTER TABLE "{rebuilt}" RENAME TO "{table.name}"')
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+        if floors.get(table.name):
+            raise_sequence(conn, table.name, floors[table.name])
+
+
+def raise_sequence(conn, table_name: str, floor: int):
+    """Make the next AUTOINCREMENT id of `table_name` greater than `floor`."""
+    conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ? AND seq < ?", (table_name, floor))
+    conn.exec_driver_sql(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+        (table_name, floor, table_name),
+    )
+
+
+def archived_id_floors(conn) -> dict:
+    """Highest message id held in cold storage (see utils.archive)."""
+    return {"message": conn.exec_driver_sql("SELECT max(last_message_id) FROM conversationarchive").scalar()}
+
+
+def drop_duplicate_bot_memories(conn):
+    """Keep the newest row per (bot_id, key) so its unique index can be created."""
+    conn.exec_driver_sql(
+        "DELETE FROM botmemory WHERE id NOT IN (SELECT max(id) FROM botmemory GROUP BY bot_id, key)"
+    )
+
 
 def init_db():
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        drop_duplicate_bot_memories(conn)
+        add_missing_columns(conn)
+        ensure_autoincrement(conn, floors=archived_id_floors(conn))
+        init_search(conn)
 
 def get_session():
-    with Session(engine) as session:
+    with RoutingSession() as session:
         yield session
@@ -2,17 +2,25 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+import logging
 import os
+import time
 
 # -------------------------------------------------
-# Load environment variables
+# Load environment variables + logging
 # -------------------------------------------------
 load_dotenv()
 
+from backend.utils.log import new_request_id, request_id_var, setup_logging, shutdown_logging
+from backend.utils.responses import CompressionMiddleware, FastJSONResponse
+
+setup_logging()
+logger = logging.getLogger("backend.main")
+
 # -------------------------------------------------
 # App (MUST COME BEFORE ROUTERS)
 # -------------------------------------------------
-app = FastAPI(title="AI Chatbot Management System")
+app = FastAPI(title="AI Chatbot Management System", default_response_class=FastJSONResponse)
 @app.post("/api/test-chat")
 def test_chat():
     return {
@@ -33,31 +41,129 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip (or brotli) for responses over COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
 
 # -------------------------------------------------
 # DB
 # -------------------------------------------------
 from backend.db import init_db
+from backend.utils.query_stats import SQL_DEBUG, add_query_headers, track_queries
+
+access_logger = logging.getLogger("backend.access")
+
+@app.middleware("http")
+async def request_context_middleware(request, call_next):
+    # Correlation id for every log line of this request (left set: each
+    # request runs in its own task context), plus per-request DB stats.
+    # Query headers only in debug (SQL_DEBUG=1).
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    request_id_var.set(request_id[:64])
+    start = time.perf_counter()
+    status = 500
+
+    with track_queries() as stats:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            access_logger.info(
+                "request",
+                extra={
+                    "method": request.method,
+                    "path": request.url.path,
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "db_queries": stats.count,
+                    "db_ms": round(stats.total_ms, 1),
+                },
+            )
+
+    response.headers["X-Request-ID"] = request_id_var.get()
+    if SQL_DEBUG:
+        add_query_headers(response, stats)
+    return response
+
+from backend.utils.deadline import DeadlineExceeded
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
 
 # -------------------------------------------------
 # Routers (IMPORT AFTER app IS DEFINED)
 # -------------------------------------------------
-from backend.routes import auth, bots, messages
+from backend.routes import auth, bots, messages, compare, datasets, evals, knowledge, memories, search, stats, users, admin, ws
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(bots.router, prefix="/bots", tags=["Bots"])
 app.include_router(messages.router, tags=["Messages"])
+app.include_router(compare.router, prefix="/bots", tags=["Compare"])
+app.include_router(datasets.router, prefix="/bots", tags=["Datasets"])
+app.include_router(evals.router, prefix="/bots", tags=["Evals"])
+app.include_router(knowledge.router, prefix="/bots", tags=["Knowledge"])
+app.include_router(memories.router, prefix="/bots", tags=["Bot Memory"])
+app.include_router(stats.router, prefix="/bots", tags=["Stats"])
+app.include_router(search.router, tags=["Search"])
+app.include_router(users.router, prefix="/users", tags=["Users"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
+app.include_router(ws.router, tags=["WebSocket"])
+
+from starlette.concurrency import run_in_threadpool
+from backend.utils.profiler import finish, try_start
 
-print("✅ Routers loaded")
+@app.middleware("http")
+async def profile_request_middleware(request, call_next):
+    # Admins can profile a single request with "X-Profile: 1"; the stacks
+    # are fetched from /admin/profiles/{X-Profile-Id}
+    if not request.headers.get("x-profile"):
+        return await call_next(request)
+
+    allowed = await run_in_threadpool(admin.admin_from_authorization, request.headers.get("authorization"))
+    profiler = try_start() if allowed else None
+    if profiler is None:
+        return await call_next(request)
+
+    try:
+        response = await call_next(request)
+    finally:
+        profile_id = finish(profiler)
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+logger.info("routers loaded")
 
 # -------------------------------------------------
 # Startup
 # -------------------------------------------------
 @app.on_event("startup")
 def on_startup():
-    print("🔹 Initializing database...")
+    logger.info("initializing database")
     init_db()
-    print("✅ Database ready")
+    from backend.sharding import router as shard_router
+    if shard_router.enabled:
+        shard_router.init()
+        logger.info("shards ready", extra={"shards": shard_router.count})
+    logger.info("database ready")
+
+@app.on_event("startup")
+async def start_pubsub():
+    from backend.utils.pubsub import hub
+    await hub.start()
+
+@app.on_event("shutdown")
+def flush_post_turn():
+    from backend.utils.post_turn import post_turn
+    post_turn.shutdown()
+
+@app.on_event("shutdown")
+async def stop_pubsub():
+    from backend.utils.pubsub import hub
+    await hub.stop()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    shutdown_logging()
 
 # -------------------------------------------------
 # Health
@@ -79,11 +185,14 @@ async def http_exception_handler(request, exc):
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    import traceback
-    print("[ERROR]", exc)
-    print(traceback.format_exc())
+    logger.error(
+        "unhandled error",
+        exc_info=exc,
+        extra={"method": request.method, "path": request.url.path},
+    )
     return JSONResponse(status_code=500, content={"detail": "Internal server error"})
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("backend.main:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
+    # log_config=None keeps uvicorn's loggers on our pipeline
+    uvicorn.run("backend.main:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)), log_config=None)
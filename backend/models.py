@@ -1,5 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column
+from sqlalchemy import Column, Index, UniqueConstraint
 from sqlalchemy.types import JSON
 from typing import Optional, List, Dict
 from datetime import datetime, timezone
@@ -50,10 +50,18 @@ class Bot(SQLModel, table=True):
 # CONVERSATION
 # -------------------------
 class Conversation(SQLModel, table=True):
+    # Ids are never reused (rollup high-water marks, caches and forks refer to them)
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: Optional[int] = Field(default=None, primary_key=True)
     bot_id: int = Field(foreign_key="bot.id")
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
     session_id: str = Field(index=True)
 
+    # Forks share the parent's messages up to fork_message_id (utils.branches)
+    parent_id: Optional[int] = Field(default=None, index=True)
+    fork_message_id: Optional[int] = None
+
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     metadata_json: dict = Field(default_factory=dict, sa_column=Column(JSON))
@@ -67,18 +75,107 @@ class Conversation(SQLModel, table=True):
 # MESSAGE
 # -------------------------
 class Message(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_message_conversation_created", "conversation_id", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     conversation_id: int = Field(foreign_key="conversation.id")
 
     role: str  # "user" or "bot"
     text: str
     latency_ms: Optional[int] = None
+    # Original id of a row that restore had to renumber (already counted by rollups)
+    restored_from: Optional[int] = None
 
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     conversation: Optional[Conversation] = Relationship(back_populates="messages")
 
 
+# -------------------------
+# CONVERSATION ARCHIVE (cold storage for idle sessions)
+# -------------------------
+class ConversationArchive(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    conversation_id: int = Field(foreign_key="conversation.id", index=True, unique=True)
+
+    message_count: int
+    first_message_id: Optional[int] = None
+    last_message_id: Optional[int] = None
+
+    codec: str = Field(default="gzip")  # "gzip" or "zstd"
+    raw_bytes: int = 0
+    payload: bytes  # compressed JSONL, one message per line
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ArchivedMessage(SQLModel, table=True):
+    # Stand-in for a message held in an archive: keeps its search entry
+    # (utils.search) and lets restore put it back under the same id
+    id: Optional[int] = Field(default=None, primary_key=True)
+    conversation_id: int = Field(index=True)
+    role: str
+    created_at: datetime
+
+
+# -------------------------
+# SHARD DIRECTORY (catalog only; used when SHARD_COUNT > 0)
+# -------------------------
+class ConversationShard(SQLModel, table=True):
+    # Allocates globally unique conversation ids and records where each lives
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    conversation_id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: str = Field(index=True, unique=True)
+    user_id: Optional[int] = Field(default=None, index=True)
+    bot_id: int = Field(index=True)
+    shard: int = Field(index=True)
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class MessageIdRange(SQLModel, table=True):
+    # Blocks of 2**40 message ids handed to shards; block 0 is the catalog's own
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    shard: int = Field(index=True)
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# -------------------------
+# USAGE ROLLUPS (per bot per hour, maintained incrementally)
+# -------------------------
+class BotUsageHourly(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("bot_id", "hour"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    bot_id: int = Field(index=True)
+    hour: datetime  # UTC, truncated to the hour
+
+    messages: int = 0
+    user_messages: int = 0
+    sessions: int = 0
+
+    latency_count: int = 0
+    latency_sum_ms: int = 0
+    latency_hist: Dict = Field(default_factory=dict, sa_column=Column(JSON))  # log bucket -> count
+    users_hll: Optional[bytes] = None  # HyperLogLog of active user ids
+
+
+class RollupState(SQLModel, table=True):
+    name: str = Field(primary_key=True)
+    last_message_id: int = 0
+    last_conversation_id: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 # -------------------------
 # TRAINING DATASET
 # -------------------------
@@ -93,7 +190,71 @@ class TrainingDataset(SQLModel, table=True):
         sa_column=Column(JSON)
     )
 
+
+# -------------------------
+# TRAINING EXAMPLE (one row per dataset record)
+# -------------------------
+class TrainingExample(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("dataset_id", "content_hash"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    dataset_id: int = Field(foreign_key="trainingdataset.id", index=True)
+    bot_id: int = Field(index=True)
+
+    prompt: str
+    response: Optional[str] = None
+    content_hash: str
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# -------------------------
+# EVALUATION (a bot run over a dataset's prompts)
+# -------------------------
+class EvalRun(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    bot_id: int = Field(index=True)
+    dataset_id: int = Field(foreign_key="trainingdataset.id")
+
+    status: str = "queued"  # queued | running | done | failed | cancelled
+    # Overrides (system_prompt, model, temperature) and limits (concurrency, rps, limit)
+    config: Dict = Field(default_factory=dict, sa_column=Column(JSON))
+
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    latency_hist: Dict = Field(default_factory=dict, sa_column=Column(JSON))  # log bucket -> count
+    error: Optional[str] = None
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class EvalResult(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("run_id", "example_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    run_id: int = Field(index=True)
+    example_id: int
+
+    reply: Optional[str] = None
+    error: Optional[str] = None
+    latency_ms: Optional[int] = None
+    attempts: int = 1
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class BotMemory(SQLModel, table=True):
+    __table_args__ = (
+        # An index, not a constraint, so add_missing_columns() adds it to old databases
+        Index("ux_botmemory_bot_id_key", "bot_id", "key", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
 
     bot_id: int = Field(index=True)
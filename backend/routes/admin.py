@@ -0,0 +1,113 @@
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlmodel import Session
+
+from ..db import read_engine
+from ..models import User
+from ..auth import decode_token
+from ..utils.profiler import finish, get_profile, try_start
+from ..ai import llm
+from ..utils.post_turn import post_turn
+from .bots import get_current_user
+
+router = APIRouter()
+
+# Comma separated list of emails allowed to use the admin endpoints
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+MAX_PROFILE_SECONDS = 60
+
+
+def is_admin(user: Optional[User]) -> bool:
+    return bool(user) and user.email.lower() in ADMIN_EMAILS
+
+
+def require_admin(user: User = Depends(get_current_user)) -> User:
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+
+def admin_from_authorization(authorization: Optional[str]) -> bool:
+    """Admin check for middleware, which runs outside the dependency system."""
+    if not ADMIN_EMAILS or not authorization or not authorization.lower().startswith("bearer "):
+        return False
+
+    user_id = decode_token(authorization.split(" ", 1)[1])
+    if not user_id:
+        return False
+
+    with Session(read_engine) as db:
+        return is_admin(db.get(User, int(user_id)))
+
+
+def _render(profiler, profile_id: str, fmt: str):
+    headers = {"X-Profile-Id": profile_id}
+    if fmt == "speedscope":
+        headers["Content-Disposition"] = f'attachment; filename="profile-{profile_id}.speedscope.json"'
+        return JSONResponse(profiler.speedscope(name=f"profile {profile_id}"), headers=headers)
+    return PlainTextResponse(profiler.collapsed(), headers=headers)
+
+
+# ─────────────────────────────────────────────
+# SAMPLING PROFILER
+# ─────────────────────────────────────────────
+
+@router.post("/profile")
+def run_profile(
+    seconds: float = 10,
+    interval_ms: float = 5,
+    format: str = "collapsed",
+    admin: User = Depends(require_admin),
+):
+    """
+    Sample every thread of this process for `seconds` and return the stacks
+    ("collapsed" text or a "speedscope" JSON file).
+    """
+    if format not in ("collapsed", "speedscope"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'speedscope'")
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="Invalid profile duration or interval")
+
+    profiler = try_start(interval_ms / 1000, exclude_caller=True)  # not this sleeping thread
+    if profiler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    try:
+        time.sleep(seconds)
+    finally:
+        profile_id = finish(profiler)
+
+    return _render(profiler, profile_id, format)
+
+
+@router.get("/profiles/{profile_id}")
+def download_profile(
+    profile_id: str,
+    format: str = "collapsed",
+    admin: User = Depends(require_admin),
+):
+    """Fetch a kept profile, e.g. one recorded for a request via `X-Profile: 1`."""
+    profiler = get_profile(profile_id)
+    if not profiler:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _render(profiler, profile_id, format)
+
+
+# ─────────────────────────────────────────────
+# LLM PROVIDERS
+# ─────────────────────────────────────────────
+
+@router.get("/llm")
+def llm_status(admin: User = Depends(require_admin)):
+    """Per-provider breaker state and hedge delays, and what cancelled calls saved."""
+    return llm.status()
+
+
+@router.get("/post-turn")
+def post_turn_status(admin: User = Depends(require_admin)):
+    """Background post-turn jobs: backlog, failures and worst queueing delay."""
+    return post_turn.stats()
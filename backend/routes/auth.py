@@ -2,14 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session
 
-from ..db import engine
-from ..models import User
+from ..sharding import new_session
 from ..crud import create_user, get_user_by_email
 from ..auth import (
     get_password_hash,
     verify_password,
     create_access_token,
-    decode_token,
 )
 from ..schemas import UserCreate, Token
 
@@ -17,8 +15,7 @@ router = APIRouter()
 
 
 def get_db():
-    from sqlmodel import Session
-    with Session(engine) as session:
+    with new_session() as session:
         yield session
 
 
@@ -1,25 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Form, Request, Response
 from sqlmodel import Session, select
 from uuid import uuid4
+import logging
 import time
 import os
-from datetime import datetime, date
+from datetime import date
 from sqlalchemy import func
 
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
 
-from ..db import engine
 from ..models import User, Bot, Conversation, Message
-from ..schemas import BotCreate
-from ..crud import (
-    create_bot,
-    save_user_memory,
-    load_user_memory,
-    delete_user_memory,
-)
+from ..schemas import BotCreate, ForkIn
+from ..crud import create_bot
 from ..auth import decode_token
-from ..utils.memory import extract_user_memory
+from ..utils.archive import ensure_restored
+from ..utils.branches import fork_conversation, message_scope
+from ..utils.etags import bot_list_version, check_etag, conversation_version, session_list_version, weak_etag
+from ..utils.purge import can_delete_conversation, can_read_conversation, create_purge_job, delete_conversations
+from ..tasks import enqueue_purge
+from ..utils.pubsub import publish_message
+from ..utils.session_cache import remember_session, resolve_session
+from ..sharding import bind_conversation, bind_user, for_each_shard, new_session, register_conversation
+from ..ai.chat import message_out, run_turn
+from ..utils.deadline import Deadline, request_deadline
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -33,7 +39,7 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # ─────────────────────────────────────────────
 
 def get_db():
-    with Session(engine) as session:
+    with new_session() as session:
         yield session
 
 
@@ -49,9 +55,22 @@ def get_current_user(
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
+    bind_user(db, user.id)
     return user
 
 
+def get_owned_bot(db: Session, bot_id: int, user: User) -> Bot:
+    """Load a bot the current user may modify (system bots are read-only)."""
+    bot = db.get(Bot, bot_id)
+    if not bot:
+        raise HTTPException(status_code=404, detail="Bot not found")
+
+    if bot.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return bot
+
+
 # ─────────────────────────────────────────────
 # BOTS
 # ─────────────────────────────────────────────
@@ -76,9 +95,16 @@ def create_bot_api(
 
 @router.get("/")
 def list_bots(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
+    etag = weak_etag("bots", user.id, *bot_list_version(db, user.id))
+    not_modified = check_etag(request, response, etag)
+    if not_modified:
+        return not_modified
+
     return db.exec(select(Bot).where(Bot.owner_id == user.id)).all()
 
 
@@ -92,7 +118,7 @@ def create_session(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    print(f"[DEBUG] create_session called with bot_id={bot_id}")
+    logger.debug("create_session", extra={"bot_id": bot_id})
 
     bot = db.exec(select(Bot).where(Bot.id == bot_id)).first()
     if not bot:
@@ -105,12 +131,15 @@ def create_session(
 
     conv = Conversation(
         bot_id=bot_id,
+        user_id=user.id,
         session_id=session_uuid,
     )
 
+    register_conversation(db, conv)
     db.add(conv)
     db.commit()
     db.refresh(conv)
+    remember_session(conv, bot.owner_id, db.info.get("shard"))
 
     return {
         "conversation_id": conv.id,
@@ -118,6 +147,51 @@ def create_session(
     }
 
 
+@router.post("/{bot_id}/sessions/{session_id}/fork")
+def fork_session(
+    bot_id: int,
+    session_id: str,
+    payload: ForkIn,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    New session that shares this one's history up to and including
+    `message_id` without copying it. To edit a message, fork at the one
+    before it (without message_id for the first message) and send the
+    edited text to the new session.
+    """
+    info = resolve_session(db, session_id)
+    if not info or info.bot_id != bot_id:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    bot = db.get(Bot, bot_id)
+    conv = db.get(Conversation, info.conversation_id)
+    if not bot or not conv:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if not can_delete_conversation(db, conv, user.id):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    ensure_restored(db, conv)
+    try:
+        fork = fork_conversation(db, conv, payload.message_id, user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    register_conversation(db, fork)
+    db.add(fork)
+    db.commit()
+    db.refresh(fork)
+    remember_session(fork, bot.owner_id, db.info.get("shard"))
+
+    return {
+        "conversation_id": fork.id,
+        "session_id": fork.session_id,
+        "parent_id": fork.parent_id,
+        "fork_message_id": fork.fork_message_id,
+    }
+
+
 # ─────────────────────────────────────────────
 # SEND MESSAGE (WITH 🧠 PERSISTENT MEMORY)
 # ─────────────────────────────────────────────
@@ -129,153 +203,46 @@ def send_message(
     message: str = Form(...),
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
+    deadline: Deadline = Depends(request_deadline),
 ):
-    print(f"[DEBUG] send_message: bot={bot_id}, session={session_id}, msg={message}")
+    logger.debug("send_message", extra={"bot_id": bot_id, "session_id": session_id, "text": message})
 
     if not GROQ_API_KEY:
         raise HTTPException(status_code=500, detail="GROQ_API_KEY not configured")
 
-    start_time = time.time()
-
-    # Load bot
-    bot = db.exec(select(Bot).where(Bot.id == bot_id)).first()
-    if not bot:
-        raise HTTPException(status_code=404, detail="Bot not found")
+    # Resolve session -> (conversation, bot, owner); cached for hot sessions
+    info = resolve_session(db, session_id)
+    if not info or info.bot_id != bot_id:
+        if not db.get(Bot, bot_id):
+            raise HTTPException(status_code=404, detail="Bot not found")
+        raise HTTPException(status_code=404, detail="Conversation not found")
 
-    if bot.owner_id is not None and bot.owner_id != user.id:
+    if not info.allows_posting(user.id):
         raise HTTPException(status_code=403, detail="Access denied")
 
-    # Load conversation
-    conv = db.exec(
-        select(Conversation).where(
-            Conversation.session_id == session_id,
-            Conversation.bot_id == bot_id,
-        )
-    ).first()
-
-    if not conv:
+    bot = db.get(Bot, bot_id)
+    conv = db.get(Conversation, info.conversation_id)
+    if not bot or not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    # ─────────────────────────────────────────────
-    # Save USER message
-    # ─────────────────────────────────────────────
-    db.add(
-        Message(
-            conversation_id=conv.id,
-            role="user",
-            text=message,
-        )
-    )
-    db.commit()
+    ensure_restored(db, conv)
 
-    # ─────────────────────────────────────────────
-    # 🧠 Extract memory (OVERWRITE MODE)
-    # ─────────────────────────────────────────────
-    memory_to_save, memory_to_delete = extract_user_memory(message)
-
-    # 🗑️ Delete memory
-    for key in memory_to_delete:
-        delete_user_memory(
-            db,
-            user_id=user.id,
-            bot_id=bot_id,
-            key=key,
-        )
-
-    # 💾 Save / overwrite memory
-    for key, value in memory_to_save.items():
-        save_user_memory(
-            db,
-            user_id=user.id,
-            bot_id=bot_id,
-            key=key,
-            value=value,
-        )
-
-    # ─────────────────────────────────────────────
-    # 🧠 Load persistent memory
-    # ─────────────────────────────────────────────
-    user_memory = load_user_memory(
-        db,
-        user_id=user.id,
-        bot_id=bot_id,
+    # Save user message, apply memory, build prompt, call the LLM, save reply
+    # (shared with the WebSocket channel; open sockets get both messages).
+    # Stops early, without a reply, if the client disconnects or the deadline passes
+    bot_msg = run_turn(
+        db, bot, conv, user.id, message,
+        on_user_message=lambda m: publish_message(conv.id, message_out(m)),
+        deadline=deadline,
     )
-
-    memory_prompt = ""
-    if user_memory:
-        memory_prompt = "User memory:\n"
-        for k, v in user_memory.items():
-            memory_prompt += f"- {k}: {v}\n"
-
-    system_prompt = f"""
-{bot.system_prompt}
-
-{memory_prompt}
-"""
-
-    print("🧠 MEMORY INJECTED:")
-    print(memory_prompt)
-
-    # ─────────────────────────────────────────────
-    # Conversation history (last 10)
-    # ─────────────────────────────────────────────
-    history = db.exec(
-        select(Message)
-        .where(Message.conversation_id == conv.id)
-        .order_by(Message.created_at)
-        .limit(10)
-    ).all()
-
-    chat_messages = [
-        {"role": "system", "content": system_prompt}
-    ]
-
-    for m in history:
-        chat_messages.append({
-            "role": "assistant" if m.role == "bot" else "user",
-            "content": m.text,
-        })
-
-    # ─────────────────────────────────────────────
-    # GROQ CALL
-    # ─────────────────────────────────────────────
-    try:
-        from groq import Groq
-        client = Groq(api_key=GROQ_API_KEY)
-
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=chat_messages,
-            temperature=bot.temperature,
-            max_tokens=512,
-        )
-
-        reply_text = response.choices[0].message.content
-
-    except Exception as e:
-        print("❌ Groq error:", e)
-        reply_text = "⚠️ AI is temporarily unavailable."
-
-    latency_ms = int((time.time() - start_time) * 1000)
-
-    # ─────────────────────────────────────────────
-    # Save BOT reply
-    # ─────────────────────────────────────────────
-    db.add(
-        Message(
-            conversation_id=conv.id,
-            role="bot",
-            text=reply_text,
-            latency_ms=latency_ms,
-        )
-    )
-    db.commit()
+    publish_message(conv.id, message_out(bot_msg))
 
     return {
-        "reply": reply_text,
-        "latency_ms": latency_ms,
+        "reply": bot_msg.text,
+        "latency_ms": bot_msg.latency_ms,
     }
 
+
 @router.get("/{bot_id}/history/today")
 def get_today_history(
     bot_id: int,
@@ -284,43 +251,64 @@ def get_today_history(
 ):
     today = date.today()
 
-    conversations = db.exec(
-        select(Conversation)
-        .where(
-            Conversation.bot_id == bot_id,
-            func.date(Conversation.created_at) == today
-        )
-        .order_by(Conversation.created_at.desc())
-    ).all()
-
-    result = []
-
-    for conv in conversations:
-        last_msg = db.exec(
-            select(Message)
-            .where(Message.conversation_id == conv.id)
-            .order_by(Message.created_at.desc())
-            .limit(1)
-        ).first()
-
-        result.append({
-            "conversation_id": conv.id,
-            "session_id": conv.session_id,
-            "last_message": last_msg.text if last_msg else "",
-            "time": conv.created_at.strftime("%H:%M"),
-        })
-
+    def todays_conversations(shard: Session):
+        conversations = shard.exec(
+            select(Conversation)
+            .where(
+                Conversation.bot_id == bot_id,
+                func.date(Conversation.created_at) == today
+            )
+            .order_by(Conversation.created_at.desc())
+        ).all()
+
+        result = []
+
+        for conv in conversations:
+            last_msg = shard.exec(
+                select(Message)
+                .where(message_scope(shard, conv))
+                .order_by(Message.created_at.desc())
+                .limit(1)
+            ).first()
+
+            result.append({
+                "conversation_id": conv.id,
+                "session_id": conv.session_id,
+                "last_message": last_msg.text if last_msg else "",
+                "time": conv.created_at.strftime("%H:%M"),
+            })
+        return result
+
+    # One list per shard when sharding is on; ids are allocated in creation order
+    result = for_each_shard(db, todays_conversations)
+    result.sort(key=lambda r: r["conversation_id"], reverse=True)
     return result
 
 @router.get("/conversations/{conversation_id}/messages")
 def get_conversation_messages(
     conversation_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
+    if not bind_conversation(db, conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    conv = db.get(Conversation, conversation_id)
+    if not conv:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if not can_read_conversation(db, conv, user.id):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    etag = weak_etag("conversation", conv.id, *conversation_version(db, conv))
+    not_modified = check_etag(request, response, etag)
+    if not_modified:
+        return not_modified
+    ensure_restored(db, conv)
+
     messages = db.exec(
         select(Message)
-        .where(Message.conversation_id == conversation_id)
+        .where(message_scope(db, conv))
         .order_by(Message.created_at)
     ).all()
 
@@ -339,18 +327,37 @@ def delete_conversation(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
+    if not bind_conversation(db, conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
     conv = db.get(Conversation, conversation_id)
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    db.exec(
-        select(Message).where(Message.conversation_id == conversation_id)
-    ).delete()
+    if not can_delete_conversation(db, conv, user.id):
+        raise HTTPException(status_code=403, detail="Access denied")
 
-    db.delete(conv)
-    db.commit()
+    messages = delete_conversations(db, [conv.id])
 
-    return {"status": "deleted"}
+    return {"status": "deleted", "messages_deleted": messages}
+
+
+@router.delete("/{bot_id}/sessions", status_code=202)
+def purge_bot_sessions(
+    bot_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Delete all of the user's sessions with this bot in the background.
+    Poll GET /users/me/purges/{job_id} for progress.
+    """
+    if not db.get(Bot, bot_id):
+        raise HTTPException(status_code=404, detail="Bot not found")
+
+    job = create_purge_job(user.id, bot_id=bot_id)
+    enqueue_purge(background_tasks, job["job_id"])
+    return job
 
 # ─────────────────────────────────────────────
 # GET SESSIONS FOR A BOT
@@ -359,6 +366,8 @@ def delete_conversation(
 @router.get("/{bot_id}/sessions")
 def get_sessions(
     bot_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -372,12 +381,17 @@ def get_sessions(
     if bot.owner_id is not None and bot.owner_id != user.id:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    sessions = db.exec(select(Conversation).where(Conversation.bot_id == bot_id)).all()
+    etag = weak_etag("sessions", bot_id, *session_list_version(db, bot_id))
+    not_modified = check_etag(request, response, etag)
+    if not_modified:
+        return not_modified
 
-    return [
+    # Fanned out over every shard when sharding is on
+    return for_each_shard(db, lambda shard: [
         {
             "conversation_id": session.id,
             "session_id": session.session_id,
+            "parent_id": session.parent_id,
         }
-        for session in sessions
-    ]
+        for session in shard.exec(select(Conversation).where(Conversation.bot_id == bot_id)).all()
+    ])
@@ -0,0 +1,89 @@
+from typing import Tuple
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+from ..models import Bot, Conversation, User
+from ..schemas import CompareIn
+from ..ai.chat import message_out
+from ..ai.compare import choose_branch, get_comparison, run_comparison, start_comparison
+from ..utils.archive import ensure_restored
+from ..utils.pubsub import publish_message
+from ..utils.responses import dumps
+from ..utils.session_cache import resolve_session
+from .bots import get_db, get_current_user
+
+router = APIRouter()
+
+
+def _load_session(db: Session, bot_id: int, session_id: str, user: User) -> Tuple[Bot, Conversation]:
+    info = resolve_session(db, session_id)
+    if not info or info.bot_id != bot_id:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    # Comparing (and saving the chosen answer) adds a turn
+    if not info.allows_posting(user.id):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    bot = db.get(Bot, bot_id)
+    conv = db.get(Conversation, info.conversation_id)
+    if not bot or not conv:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    ensure_restored(db, conv)
+    return bot, conv
+
+
+# ─────────────────────────────────────────────
+# COMPARE (one prompt, several models / configs)
+# ─────────────────────────────────────────────
+
+@router.post("/{bot_id}/sessions/{session_id}/compare")
+def compare(
+    bot_id: int,
+    session_id: str,
+    payload: CompareIn,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Send the message to every branch at once; streams NDJSON lines: one
+    per branch as it finishes, then a summary (wall vs serial time).
+    Nothing is saved until a branch is chosen.
+    """
+    bot, conv = _load_session(db, bot_id, session_id, user)
+    try:
+        comparison = start_comparison(db, bot, conv, user.id, payload.message, payload.branches)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def stream():
+        yield dumps({"type": "start", "compare_id": comparison.id, "branches": len(payload.branches)}) + b"\n"
+        for event in run_comparison(comparison, bot.temperature):
+            yield dumps(event) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post("/{bot_id}/sessions/{session_id}/compare/{compare_id}/choose")
+def choose_compare_branch(
+    bot_id: int,
+    session_id: str,
+    compare_id: str,
+    branch: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Save the message and the chosen branch's answer to the conversation."""
+    bot, conv = _load_session(db, bot_id, session_id, user)
+    comparison = get_comparison(compare_id)
+    if not comparison or comparison.conversation_id != conv.id or comparison.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Comparison not found")
+
+    try:
+        user_msg, bot_msg = choose_branch(db, comparison, conv, branch)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    publish_message(conv.id, message_out(user_msg))
+    publish_message(conv.id, message_out(bot_msg))
+    return message_out(bot_msg)
@@ -0,0 +1,130 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from sqlmodel import Session, select
+
+from ..models import User, TrainingDataset, TrainingExample
+from ..utils.ingest import detect_format, ingest_stream
+from .bots import get_db, get_current_user, get_owned_bot
+
+router = APIRouter()
+
+
+def _get_dataset(db: Session, bot_id: int, dataset_id: int) -> TrainingDataset:
+    dataset = db.get(TrainingDataset, dataset_id)
+    if not dataset or dataset.bot_id != bot_id:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    return dataset
+
+
+# ─────────────────────────────────────────────
+# UPLOAD (JSONL / CSV, streamed in batches)
+# ─────────────────────────────────────────────
+
+@router.post("/{bot_id}/datasets")
+def upload_dataset(
+    bot_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Create a dataset from an uploaded JSONL or CSV file.
+    The file is parsed incrementally; large datasets can also be sent
+    in several parts through the /chunks endpoint.
+    """
+    get_owned_bot(db, bot_id, user)
+
+    fmt = detect_format(file.filename, file.content_type)
+    dataset = TrainingDataset(
+        bot_id=bot_id,
+        data={"filename": file.filename, "format": fmt, "status": "pending"},
+    )
+    db.add(dataset)
+    db.commit()
+    db.refresh(dataset)
+
+    stats = ingest_stream(db, dataset, file.file, fmt, total_bytes=file.size)
+    return {"dataset_id": dataset.id, **stats}
+
+
+@router.post("/{bot_id}/datasets/{dataset_id}/chunks")
+def upload_dataset_chunk(
+    bot_id: int,
+    dataset_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Append one more part to an existing dataset.
+    Each part must contain whole records; examples already present are skipped.
+    """
+    get_owned_bot(db, bot_id, user)
+    dataset = _get_dataset(db, bot_id, dataset_id)
+
+    fmt = (dataset.data or {}).get("format") or detect_format(file.filename, file.content_type)
+    stats = ingest_stream(db, dataset, file.file, fmt, total_bytes=file.size)
+    return {"dataset_id": dataset.id, **stats}
+
+
+# ─────────────────────────────────────────────
+# PROGRESS + BROWSING
+# ─────────────────────────────────────────────
+
+@router.get("/{bot_id}/datasets")
+def list_datasets(
+    bot_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_owned_bot(db, bot_id, user)
+
+    datasets = db.exec(
+        select(TrainingDataset).where(TrainingDataset.bot_id == bot_id)
+    ).all()
+
+    return [
+        {"dataset_id": d.id, "created_at": d.created_at.isoformat(), **(d.data or {})}
+        for d in datasets
+    ]
+
+
+@router.get("/{bot_id}/datasets/{dataset_id}")
+def get_dataset(
+    bot_id: int,
+    dataset_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Dataset status; poll while an upload is running to follow progress."""
+    get_owned_bot(db, bot_id, user)
+    dataset = _get_dataset(db, bot_id, dataset_id)
+
+    return {"dataset_id": dataset.id, **(dataset.data or {})}
+
+
+@router.get("/{bot_id}/datasets/{dataset_id}/examples")
+def get_dataset_examples(
+    bot_id: int,
+    dataset_id: int,
+    after_id: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_owned_bot(db, bot_id, user)
+    _get_dataset(db, bot_id, dataset_id)
+
+    examples = db.exec(
+        select(TrainingExample)
+        .where(
+            TrainingExample.dataset_id == dataset_id,
+            TrainingExample.id > after_id,
+        )
+        .order_by(TrainingExample.id)
+        .limit(min(max(limit, 1), 1000))
+    ).all()
+
+    return [
+        {"id": e.id, "prompt": e.prompt, "response": e.response}
+        for e in examples
+    ]
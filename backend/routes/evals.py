@@ -0,0 +1,139 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlmodel import Session, select
+
+from ..models import EvalResult, EvalRun, TrainingExample, User
+from ..schemas import EvalRunIn
+from ..ai.evals import cancel_run, create_run, is_active, run_out
+from ..tasks import enqueue_eval
+from .bots import get_db, get_current_user, get_owned_bot
+from .datasets import _get_dataset
+
+router = APIRouter()
+
+
+def _get_run(db: Session, bot_id: int, run_id: int) -> EvalRun:
+    run = db.get(EvalRun, run_id)
+    if not run or run.bot_id != bot_id:
+        raise HTTPException(status_code=404, detail="Eval run not found")
+    return run
+
+
+# ─────────────────────────────────────────────
+# START / RESUME / CANCEL
+# ─────────────────────────────────────────────
+
+@router.post("/{bot_id}/evals")
+def start_eval(
+    bot_id: int,
+    payload: EvalRunIn,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Run every prompt of a dataset through the bot in the background.
+    system_prompt / model / temperature override the bot's for this run only.
+    """
+    bot = get_owned_bot(db, bot_id, user)
+    _get_dataset(db, bot_id, payload.dataset_id)
+
+    run = create_run(db, bot, payload.dataset_id, payload.model_dump(exclude={"dataset_id"}))
+    enqueue_eval(background_tasks, run.id)
+    return run_out(run)
+
+
+@router.post("/{bot_id}/evals/{run_id}/resume")
+def resume_eval(
+    bot_id: int,
+    run_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Continue a cancelled, failed or interrupted run; finished examples are skipped."""
+    get_owned_bot(db, bot_id, user)
+    run = _get_run(db, bot_id, run_id)
+    if run.status == "done":
+        raise HTTPException(status_code=409, detail="Eval run already finished")
+    if is_active(run.id):
+        raise HTTPException(status_code=409, detail="Eval run is running")
+
+    enqueue_eval(background_tasks, run.id)
+    return run_out(run)
+
+
+@router.post("/{bot_id}/evals/{run_id}/cancel")
+def cancel_eval(
+    bot_id: int,
+    run_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_owned_bot(db, bot_id, user)
+    run = _get_run(db, bot_id, run_id)
+    cancel_run(db, run)
+    return run_out(run)
+
+
+# ─────────────────────────────────────────────
+# PROGRESS + RESULTS
+# ─────────────────────────────────────────────
+
+@router.get("/{bot_id}/evals")
+def list_evals(
+    bot_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_owned_bot(db, bot_id, user)
+    runs = db.exec(
+        select(EvalRun).where(EvalRun.bot_id == bot_id).order_by(EvalRun.id.desc())
+    ).all()
+    return [run_out(r) for r in runs]
+
+
+@router.get("/{bot_id}/evals/{run_id}")
+def get_eval(
+    bot_id: int,
+    run_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Run status, counts and latency percentiles; poll while it runs."""
+    get_owned_bot(db, bot_id, user)
+    return run_out(_get_run(db, bot_id, run_id))
+
+
+@router.get("/{bot_id}/evals/{run_id}/results")
+def get_eval_results(
+    bot_id: int,
+    run_id: int,
+    after_id: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Replies next to the dataset's prompt and expected response, by example id."""
+    get_owned_bot(db, bot_id, user)
+    _get_run(db, bot_id, run_id)
+
+    rows = db.exec(
+        select(EvalResult, TrainingExample)
+        .join(TrainingExample, TrainingExample.id == EvalResult.example_id)
+        .where(EvalResult.run_id == run_id, EvalResult.example_id > after_id)
+        .order_by(EvalResult.example_id)
+        .limit(min(max(limit, 1), 1000))
+    ).all()
+
+    return [
+        {
+            "example_id": e.id,
+            "prompt": e.prompt,
+            "expected": e.response,
+            "reply": r.reply,
+            "error": r.error,
+            "latency_ms": r.latency_ms,
+            "attempts": r.attempts,
+        }
+        for r, e in rows
+    ]
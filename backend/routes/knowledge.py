@@ -0,0 +1,104 @@
+import io
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from sqlmodel import Session
+
+from ..models import User, Bot, TrainingDataset
+from ..ai.retrieval import get_index, has_index, drop_index, index_lines, index_dataset
+from .bots import get_db, get_current_user, get_owned_bot
+
+router = APIRouter()
+
+
+# ─────────────────────────────────────────────
+# BUILD / UPDATE
+# ─────────────────────────────────────────────
+
+@router.post("/{bot_id}/knowledge")
+def upload_knowledge(
+    bot_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Add a plain text / markdown document to the bot's knowledge base.
+    The file is chunked as it is read and appended to the existing index;
+    uploading a file name again replaces its earlier chunks.
+    """
+    get_owned_bot(db, bot_id, user)
+
+    text = io.TextIOWrapper(file.file, encoding="utf-8", errors="replace")
+    added = index_lines(bot_id, f"file:{file.filename}", text)
+    text.detach()
+
+    return {"added_chunks": added, **get_index(bot_id).stats()}
+
+
+@router.post("/{bot_id}/knowledge/datasets/{dataset_id}")
+def index_knowledge_dataset(
+    bot_id: int,
+    dataset_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Add every example of a training dataset to the knowledge base (again: replaces it)."""
+    get_owned_bot(db, bot_id, user)
+
+    dataset = db.get(TrainingDataset, dataset_id)
+    if not dataset or dataset.bot_id != bot_id:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    added = index_dataset(db, bot_id, dataset_id)
+    return {"added_chunks": added, **get_index(bot_id).stats()}
+
+
+@router.delete("/{bot_id}/knowledge")
+def delete_knowledge(
+    bot_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_owned_bot(db, bot_id, user)
+    drop_index(bot_id)
+    return {"status": "deleted"}
+
+
+# ─────────────────────────────────────────────
+# INSPECT / SEARCH
+# ─────────────────────────────────────────────
+
+def _check_access(db: Session, bot_id: int, user: User):
+    bot = db.get(Bot, bot_id)
+    if not bot:
+        raise HTTPException(status_code=404, detail="Bot not found")
+
+    if bot.owner_id is not None and bot.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+
+@router.get("/{bot_id}/knowledge")
+def get_knowledge_stats(
+    bot_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    _check_access(db, bot_id, user)
+    if not has_index(bot_id):
+        return {"bot_id": bot_id, "chunks": 0}
+    return get_index(bot_id).stats()
+
+
+@router.get("/{bot_id}/knowledge/search")
+def search_knowledge(
+    bot_id: int,
+    q: str,
+    k: int = 5,
+    hybrid: bool = False,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    _check_access(db, bot_id, user)
+    if not has_index(bot_id):
+        return []
+    return get_index(bot_id).search(q, k=min(max(k, 1), 50), hybrid=hybrid)
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session
+
+from ..models import User, BotMemory
+from ..schemas import BotMemoryIn, BotMemoryUpdate
+from ..crud import save_bot_memory, list_bot_memories, delete_bot_memory
+from ..utils.bot_memory import invalidate_bot_memory, select_bot_memory
+from .bots import get_db, get_current_user, get_owned_bot
+
+router = APIRouter()
+
+
+def _memory_out(m: BotMemory) -> dict:
+    return {
+        "id": m.id,
+        "key": m.key,
+        "value": m.value,
+        "importance": m.importance,
+        "created_at": m.created_at.isoformat(),
+    }
+
+
+# ─────────────────────────────────────────────
+# BOT MEMORY CRUD
+# ─────────────────────────────────────────────
+
+@router.get("/{bot_id}/memories")
+def list_memories(
+    bot_id: int,
+    limit: int = 100,
+    offset: int = 0,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_owned_bot(db, bot_id, user)
+    memories = list_bot_memories(db, bot_id, limit=min(max(limit, 1), 1000), offset=offset)
+    return [_memory_out(m) for m in memories]
+
+
+@router.post("/{bot_id}/memories")
+def upsert_memory(
+    bot_id: int,
+    payload: BotMemoryIn,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_owned_bot(db, bot_id, user)
+    memory = save_bot_memory(db, bot_id, payload.key, payload.value, payload.importance)
+    invalidate_bot_memory(bot_id)
+    return _memory_out(memory)
+
+
+@router.patch("/{bot_id}/memories/{memory_id}")
+def update_memory(
+    bot_id: int,
+    memory_id: int,
+    payload: BotMemoryUpdate,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_owned_bot(db, bot_id, user)
+
+    memory = db.get(BotMemory, memory_id)
+    if not memory or memory.bot_id != bot_id:
+        raise HTTPException(status_code=404, detail="Memory not found")
+
+    if payload.value is not None:
+        memory.value = payload.value
+    if payload.importance is not None:
+        memory.importance = payload.importance
+
+    db.add(memory)
+    db.commit()
+    db.refresh(memory)
+    invalidate_bot_memory(bot_id)
+    return _memory_out(memory)
+
+
+@router.delete("/{bot_id}/memories/{memory_id}")
+def delete_memory(
+    bot_id: int,
+    memory_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_owned_bot(db, bot_id, user)
+
+    if not delete_bot_memory(db, bot_id, memory_id):
+        raise HTTPException(status_code=404, detail="Memory not found")
+
+    invalidate_bot_memory(bot_id)
+    return {"status": "deleted"}
+
+
+@router.get("/{bot_id}/memories/preview")
+def preview_memory_injection(
+    bot_id: int,
+    token_budget: int = 300,
+    k: int = 20,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """The memory lines that would be injected into the next prompt."""
+    get_owned_bot(db, bot_id, user)
+    return select_bot_memory(db, bot_id, token_budget=token_budget, k=k)
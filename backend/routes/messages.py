@@ -1,22 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlmodel import Session, select
+import logging
 import time
 
-from ..db import engine
 from ..models import User, Bot, Conversation, Message
 from ..auth import decode_token
 from ..schemas import MessageIn
-from ..crud import save_user_memory, delete_user_memory ,load_user_memory
-from ..utils.memory import extract_user_memory
+from ..crud import load_user_memory
+from ..ai.chat import after_turn, message_out, save_bot_reply, save_user_message
+from ..utils.archive import ensure_restored
+from ..utils.branches import message_scope
+from ..utils.etags import REVALIDATE, check_etag, conversation_version, weak_etag
+from ..utils.page_cache import CachedPage, history_pages
+from ..utils.pubsub import publish_message
+from ..utils.post_turn import post_turn
+from ..utils.session_cache import SessionInfo, forget_conversation, resolve_session
+from ..utils.responses import accepts_encoding, dumps
+from ..sharding import bind_user, new_session
 
 from fastapi.security import OAuth2PasswordBearer
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
 def get_db():
-    with Session(engine) as session:
+    with new_session() as session:
         yield session
 
 
@@ -26,9 +39,33 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
+    bind_user(db, user.id)
     return user
 
 
+def resolve_authorized_session(db: Session, session_id: str, user: User, posting: bool = False) -> SessionInfo:
+    """Session lookup + access check; no queries for a cached session."""
+    info = resolve_session(db, session_id)
+    if not info:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Readable by its user and the bot's owner; only its user adds turns
+    allowed = info.allows_posting(user.id) if posting else info.allows(user.id)
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return info
+
+
+def load_conversation(db: Session, info: SessionInfo) -> Conversation:
+    conversation = db.get(Conversation, info.conversation_id)
+    if not conversation:
+        # Deleted by another worker after it was cached here
+        forget_conversation(info.conversation_id)
+        raise HTTPException(status_code=404, detail="Session not found")
+    return conversation
+
+
 # ─────────────────────────────────────────────
 # SEND MESSAGE (WITH PERSISTENT MEMORY)
 # ─────────────────────────────────────────────
@@ -40,66 +77,29 @@ def send_message(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    # Get conversation
-    conversation = db.exec(
-        select(Conversation).where(Conversation.session_id == session_id)
-    ).first()
-
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Session not found")
+    info = resolve_authorized_session(db, session_id, current_user, posting=True)
+    conversation = load_conversation(db, info)
+    bot = db.get(Bot, info.bot_id)
 
-    # Authorization - allow access to system bots (owner_id=None) or user-owned bots
-    bot = db.get(Bot, conversation.bot_id)
-    if bot.owner_id is not None and bot.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    ensure_restored(db, conversation)
 
     # ─────────────────────────────────────────────
     # Save USER message
     # ─────────────────────────────────────────────
-    user_message = Message(
-        conversation_id=conversation.id,
-        role="user",
-        text=payload.message,
-    )
-    db.add(user_message)
-    db.commit()
-
-    # ─────────────────────────────────────────────
-    # 🧠 Extract & SAVE memory
-    # ─────────────────────────────────────────────
-# 🧠 Extract memory
-    memory_to_save, memory_to_delete = extract_user_memory(payload.message)
-
-# 🗑️ Delete memory
-    for key in memory_to_delete:
-        delete_user_memory(
-            db,
-            user_id=current_user.id,
-            bot_id=conversation.bot_id,
-            key=key,
-        )
-# 💾 Save / Overwrite memory
-    for key, value in memory_to_save.items():
-        save_user_memory(
-            db,
-            user_id=current_user.id,
-            bot_id=conversation.bot_id,
-            key=key,
-            value=value,
-     )
-
+    user_message = save_user_message(db, conversation, payload.message)
+    publish_message(conversation.id, message_out(user_message))
 
     # ─────────────────────────────────────────────
-    # 🧠 LOAD memory (PERSISTENT)
+    # 🧠 LOAD memory (PERSISTENT, incl. earlier turns' pending writes)
     # ─────────────────────────────────────────────
+    post_turn.wait_idle((current_user.id, conversation.bot_id))
     user_memory = load_user_memory(
         db,
         user_id=current_user.id,
         bot_id=conversation.bot_id,
     )
 
-    # ✅ TEMP DEBUG (REMOVE LATER)
-    print("🧠 USER MEMORY FROM DB:", user_memory)
+    logger.debug("user memory loaded", extra={"memory": user_memory})
 
     # ─────────────────────────────────────────────
     # 🧩 Inject memory into system prompt
@@ -129,59 +129,93 @@ def send_message(
     # ─────────────────────────────────────────────
     # Save BOT message
     # ─────────────────────────────────────────────
-    bot_message = Message(
-        conversation_id=conversation.id,
-        role="bot",
-        text=bot_response_text,
-        latency_ms=latency,
-    )
-    db.add(bot_message)
-    db.commit()
-    db.refresh(bot_message)
+    bot_message = save_bot_reply(db, conversation, bot_response_text, latency)
+    publish_message(conversation.id, message_out(bot_message))
 
-    return {
-        "id": bot_message.id,
-        "role": bot_message.role,
-        "text": bot_message.text,
-        "created_at": bot_message.created_at.isoformat(),
-        "latency_ms": bot_message.latency_ms,
-    }
+    # Memory commands in the message: applied in the background
+    after_turn(current_user.id, conversation.bot_id, payload.message)
+
+    return message_out(bot_message)
 
 
 # ─────────────────────────────────────────────
 # GET MESSAGES
 # ─────────────────────────────────────────────
 
+MAX_PAGE_SIZE = 1000
+
+
+def _load_page(db: Session, conversation: Conversation, before_id: Optional[int], limit: int) -> CachedPage:
+    query = select(Message).where(message_scope(db, conversation))
+    if before_id is not None:
+        query = query.where(Message.id < before_id)
+    rows = db.exec(query.order_by(Message.id.desc()).limit(limit + 1)).all()
+
+    has_more = len(rows) > limit
+    rows = list(reversed(rows[:limit]))
+    next_before_id = rows[0].id if has_more and rows else None
+    return CachedPage(dumps([message_out(m) for m in rows]), next_before_id)
+
+
 @router.get("/sessions/{session_id}/messages")
 def get_messages(
     session_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = None,
+    before_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    conversation = db.exec(
-        select(Conversation).where(Conversation.session_id == session_id)
-    ).first()
-
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    bot = db.get(Bot, conversation.bot_id)
-    if bot.owner_id is not None and bot.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    messages = db.exec(
-        select(Message)
-        .where(Message.conversation_id == conversation.id)
-        .order_by(Message.created_at)
-    ).all()
-
-    return [
-        {
-            "id": msg.id,
-            "role": msg.role,
-            "text": msg.text,
-            "created_at": msg.created_at.isoformat(),
-            "latency_ms": msg.latency_ms,
-        }
-        for msg in messages
-    ]
+    """
+    Full history, or with ?limit= one page of it (newest first page,
+    older pages via ?before_id= from the X-Next-Before-Id header).
+    """
+    info = resolve_authorized_session(db, session_id, current_user)
+    # One primary-key read; also notices a delete made by another worker
+    conversation = load_conversation(db, info)
+
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+
+    # Older pages: cached bytes, validated by an ETag of their content
+    key = (info.conversation_id, before_id, limit)
+    page = None
+    if limit is not None and before_id is not None:
+        page = history_pages.get(key)
+    else:
+        etag = weak_etag("conversation", conversation.id, *conversation_version(db, conversation))
+        not_modified = check_etag(request, response, etag)
+        if not_modified:
+            return not_modified
+
+    if page is None:
+        ensure_restored(db, conversation)
+
+        if limit is None:
+            messages = db.exec(
+                select(Message)
+                .where(message_scope(db, conversation))
+                .order_by(Message.created_at)
+            ).all()
+            return [message_out(msg) for msg in messages]
+
+        page = _load_page(db, conversation, before_id, limit)
+        if before_id is not None:
+            history_pages.put(key, page)
+
+    if before_id is not None:
+        etag = page.etag
+        not_modified = check_etag(request, response, etag)
+        if not_modified:
+            return not_modified
+
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE, "Vary": "Accept-Encoding"}
+    if page.next_before_id is not None:
+        headers["X-Next-Before-Id"] = str(page.next_before_id)
+
+    # Already-encoded bodies pass through CompressionMiddleware untouched
+    if accepts_encoding(request.headers.get("accept-encoding", ""), "gzip"):
+        headers["Content-Encoding"] = "gzip"
+        return Response(page.gzip, media_type="application/json", headers=headers)
+    return Response(page.body, media_type="application/json", headers=headers)
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+from typing import Optional
+
+from ..models import User
+from ..utils.search import search_messages
+from .bots import get_db, get_current_user
+from ..sharding import bind_shard, user_shards
+
+router = APIRouter()
+
+
+# ─────────────────────────────────────────────
+# FULL-TEXT SEARCH OVER THE USER'S HISTORY
+# ─────────────────────────────────────────────
+
+@router.get("/search")
+def search_history(
+    q: str = Query(..., min_length=1),
+    bot_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Search message text across the user's conversations (archived ones
+    included), best match first.
+    Matches are wrapped in <mark></mark> in the returned snippet.
+    """
+    shards = user_shards(db, user.id, bot_id)
+    if len(shards) == 1:
+        bind_shard(db, shards[0])
+        return search_messages(db, user.id, q, bot_id=bot_id, limit=limit, offset=offset)
+
+    # Legacy rows of the user's bots sit on other shards: merge the best
+    # offset + limit hits of each
+    results, has_more = [], False
+    for shard in shards:
+        bind_shard(db, shard)
+        page = search_messages(db, user.id, q, bot_id=bot_id, limit=offset + limit)
+        results += page["results"]
+        has_more = has_more or page["has_more"]
+    results.sort(key=lambda r: r["score"], reverse=True)
+    return {
+        "results": results[offset:offset + limit],
+        "has_more": has_more or len(results) > offset + limit,
+    }
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session
+
+from ..models import User
+from ..utils.rollups import READ_REFRESH_BATCHES, bot_stats, default_range, refresh_rollups
+from .bots import get_db, get_current_user, get_owned_bot
+
+router = APIRouter()
+
+MAX_RANGE_DAYS = 366
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+# ─────────────────────────────────────────────
+# USAGE STATS
+# ─────────────────────────────────────────────
+
+@router.get("/{bot_id}/stats")
+def get_bot_stats(
+    bot_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    granularity: str = "hour",
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Messages, sessions, active users and latency percentiles per hour/day.
+    Defaults to the last 7 days.
+    """
+    get_owned_bot(db, bot_id, user)
+
+    if granularity not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="granularity must be 'hour' or 'day'")
+
+    default_since, default_until = default_range()
+    # Rollup hours are naive UTC; an offset in the query is converted, not dropped
+    since = _naive_utc(since) if since else default_since
+    until = _naive_utc(until) if until else default_until
+    if since >= until or (until - since).days > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail="Invalid time range")
+
+    refresh_rollups(db, max_batches=READ_REFRESH_BATCHES)
+    return bot_stats(db, bot_id, since, until, granularity)
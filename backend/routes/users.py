@@ -0,0 +1,86 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+from ..models import User
+from ..tasks import enqueue_purge
+from ..utils.purge import create_purge_job, get_purge_job
+from ..utils.transfer import export_records, gzip_jsonl, import_records, open_jsonl
+from .bots import get_db, get_current_user
+from ..sharding import new_session
+
+router = APIRouter()
+
+
+# ─────────────────────────────────────────────
+# DATA PURGE
+# ─────────────────────────────────────────────
+
+@router.delete("/me/data", status_code=202)
+def purge_my_data(
+    background_tasks: BackgroundTasks,
+    user: User = Depends(get_current_user),
+):
+    """Delete every conversation and stored memory of the current user."""
+    job = create_purge_job(user.id, include_memory=True)
+    enqueue_purge(background_tasks, job["job_id"])
+    return job
+
+
+@router.get("/me/purges/{job_id}")
+def get_purge_status(
+    job_id: str,
+    user: User = Depends(get_current_user),
+):
+    job = get_purge_job(job_id, user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return job
+
+
+# ─────────────────────────────────────────────
+# EXPORT / IMPORT
+# ─────────────────────────────────────────────
+
+@router.get("/me/export")
+def export_my_history(
+    bot_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user: User = Depends(get_current_user),
+):
+    """Stream the user's conversations, messages and memories as gzip JSONL."""
+    user_id = user.id
+
+    def stream():
+        # Own session: the response body outlives the request's dependencies.
+        # It only reads, so a long download never holds the writer
+        with new_session() as session:
+            yield from gzip_jsonl(export_records(session, user_id, bot_id, since, until))
+
+    filename = f"chat-history-{user_id}-{datetime.utcnow():%Y%m%d%H%M%S}.jsonl.gz"
+    return StreamingResponse(
+        stream(),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/me/import")
+def import_my_history(
+    bot_id: Optional[int] = None,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Import a file produced by /users/me/export (gzip or plain JSONL)."""
+    try:
+        stats = import_records(db, user.id, open_jsonl(file.file), bot_id=bot_id)
+    except (ValueError, OSError, EOFError):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid export file")
+
+    return {"status": "imported", **stats}
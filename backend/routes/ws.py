@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+
+from ..models import User, Bot, Conversation
+from ..auth import decode_token
+from ..ai.chat import message_out, run_turn
+from ..utils.deadline import DISCONNECT, Deadline, DeadlineExceeded
+from ..utils.archive import ensure_restored
+from ..utils.pubsub import Subscriber, conversation_channel, hub
+from ..utils.session_cache import resolve_session
+from ..sharding import bind_shard, new_session
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+HEARTBEAT_SECONDS = 20
+IDLE_TIMEOUT_SECONDS = 60   # nothing (not even a pong) from the client
+MAX_MESSAGE_CHARS = 8000
+
+# Close codes (4000-4999 are application defined)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+CLOSE_TOO_SLOW = 4408
+
+
+def _authorize(session_id: str, token: Optional[str]):
+    """
+    User, bot, conversation, its shard and whether the user may post, or a
+    close code. Readers (the bot's owner, anyone on legacy system-bot rows)
+    may watch the conversation; only its user adds turns.
+    """
+    user_id = decode_token(token) if token else None
+    if not user_id:
+        return CLOSE_UNAUTHORIZED
+
+    with new_session() as db:
+        user = db.get(User, int(user_id))
+        if not user:
+            return CLOSE_UNAUTHORIZED
+
+        info = resolve_session(db, session_id)
+        if not info:
+            return CLOSE_NOT_FOUND
+        if not info.allows(user.id):
+            return CLOSE_FORBIDDEN
+
+        conv = db.get(Conversation, info.conversation_id)
+        bot = db.get(Bot, info.bot_id)
+        if not conv or not bot:
+            return CLOSE_NOT_FOUND
+
+        ensure_restored(db, conv)
+        db.refresh(conv)
+        db.refresh(bot)
+        # Detached but fully loaded: reused for every turn on this socket
+        db.expunge_all()
+        return user.id, bot, conv, info.shard, info.allows_posting(user.id)
+
+
+def _socket_token(websocket: WebSocket) -> Optional[str]:
+    # Browsers cannot set headers on a WebSocket, so ?token= is accepted too
+    auth = websocket.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        return auth.split(" ", 1)[1]
+    return websocket.query_params.get("token")
+
+
+def _turn(user_id: int, bot: Bot, conv: Conversation, shard: Optional[int], text: str, deadline: Deadline):
+    """Runs in a worker thread; every step is pushed to the conversation."""
+    channel = conversation_channel(conv.id)
+    reply_to = {}
+
+    def on_user_message(msg):
+        reply_to["id"] = msg.id
+        hub.publish_threadsafe(channel, {"type": "message", "message": message_out(msg)})
+
+    def on_token(delta):
+        hub.publish_threadsafe(channel, {"type": "token", "reply_to": reply_to.get("id"), "delta": delta})
+
+    with new_session() as db:
+        bind_shard(db, shard)
+        try:
+            bot_msg = run_turn(
+                db, bot, conv, user_id, text,
+                on_user_message=on_user_message, on_token=on_token, deadline=deadline,
+            )
+        except DeadlineExceeded as e:
+            hub.publish_threadsafe(channel, {"type": "error", "reply_to": reply_to.get("id"), "detail": str(e)})
+            return
+        except Exception:
+            # The socket stays open: the client may retry or send another message
+            logger.exception("websocket turn failed", extra={"conversation_id": conv.id})
+            hub.publish_threadsafe(channel, {"type": "error", "reply_to": reply_to.get("id"), "detail": "Reply failed"})
+            return
+        hub.publish_threadsafe(channel, {"type": "message", "message": message_out(bot_msg)})
+
+
+def _log_turn_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.error("websocket turn failed", exc_info=task.exception())
+
+
+# ─────────────────────────────────────────────
+# SOCKET TASKS
+# ─────────────────────────────────────────────
+
+async def _send_events(websocket: WebSocket, sub: Subscriber):
+    """The only writer on the socket: drains the subscriber queue."""
+    overflow = asyncio.ensure_future(sub.overflowed.wait())
+    try:
+        while True:
+            get = asyncio.ensure_future(sub.queue.get())
+            done, _ = await asyncio.wait({get, overflow}, return_when=asyncio.FIRST_COMPLETED)
+            if overflow in done:
+                get.cancel()
+                logger.warning("websocket too slow", extra={"channel": sub.channel, "dropped": sub.dropped})
+                await websocket.close(code=CLOSE_TOO_SLOW, reason="Client too slow, refetch history")
+                return
+            await websocket.send_json(get.result())
+    finally:
+        overflow.cancel()
+
+
+async def _heartbeat(sub: Subscriber):
+    while True:
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        sub.offer({"type": "ping"})
+
+
+# ─────────────────────────────────────────────
+# CHAT SOCKET
+# ─────────────────────────────────────────────
+
+@router.websocket("/ws/sessions/{session_id}")
+async def chat_socket(websocket: WebSocket, session_id: str):
+    """
+    Authenticate once, then:
+      client → {"type": "message", "text": "..."} | {"type": "ping"} | {"type": "pong"}
+      server → {"type": "message", "message": {...}}   (user and bot messages, from any tab)
+               {"type": "token", "reply_to": id, "delta": "..."}
+               {"type": "ping"} | {"type": "pong"} | {"type": "error", "detail": "..."}
+    A turn that fails sends an error event (with reply_to once the user
+    message is saved) and leaves the socket open.
+    """
+    await websocket.accept()
+
+    auth = await run_in_threadpool(_authorize, session_id, _socket_token(websocket))
+    if isinstance(auth, int):
+        await websocket.close(code=auth)
+        return
+    user_id, bot, conv, shard, can_post = auth
+
+    sub = hub.subscribe(conversation_channel(conv.id))
+    sender = asyncio.create_task(_send_events(websocket, sub))
+    heartbeat = asyncio.create_task(_heartbeat(sub))
+    turn: Optional[asyncio.Task] = None
+    deadline: Optional[Deadline] = None
+
+    try:
+        while not sender.done():
+            receive = asyncio.ensure_future(websocket.receive_text())
+            done, _ = await asyncio.wait({receive, sender}, timeout=IDLE_TIMEOUT_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            if receive not in done:
+                receive.cancel()
+                if not sender.done():
+                    await websocket.close(code=1001, reason="Idle timeout")
+                break
+
+            try:
+                data = json.loads(receive.result())
+            except ValueError:
+                data = None
+            kind = data.get("type") if isinstance(data, dict) else None
+
+            if kind == "ping":
+                sub.offer({"type": "pong"})
+            elif kind == "message":
+                text = str(data.get("text") or "").strip()
+                if not can_post:
+                    sub.offer({"type": "error", "detail": "Read-only conversation"})
+                elif not text or len(text) > MAX_MESSAGE_CHARS:
+                    sub.offer({"type": "error", "detail": "Invalid message"})
+                elif turn is not None and not turn.done():
+                    # One turn at a time per socket
+                    sub.offer({"type": "error", "detail": "Previous message still in progress"})
+                else:
+                    deadline = Deadline()
+                    turn = asyncio.ensure_future(run_in_threadpool(_turn, user_id, bot, conv, shard, text, deadline))
+                    turn.add_done_callback(_log_turn_error)
+            elif kind != "pong":
+                sub.offer({"type": "error", "detail": "Unknown message type"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        heartbeat.cancel()
+        sender.cancel()
+        if sender.done() and not sender.cancelled() and sender.exception():
+            logger.debug("websocket send failed", extra={"error": repr(sender.exception())})
+        hub.unsubscribe(sub)
+        # A running turn finishes if other tabs (on this worker) still watch it
+        if turn is not None and not turn.done() and not hub.subscriber_count(sub.channel):
+            deadline.cancel(DISCONNECT)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, Dict
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, Dict, List
 
 # -------------------------------------------------
 # User Schemas
@@ -23,6 +23,49 @@ class BotCreate(BaseModel):
     temperature: float = 0.7
     config: Dict = {}
 
+# -------------------------------------------------
+# Bot Memory Schemas
+# -------------------------------------------------
+class BotMemoryIn(BaseModel):
+    key: str
+    value: str
+    importance: int = Field(default=1, ge=1, le=5)
+
+class BotMemoryUpdate(BaseModel):
+    value: Optional[str] = None
+    importance: Optional[int] = Field(default=None, ge=1, le=5)
+
+# -------------------------------------------------
+# Evaluation Schemas
+# -------------------------------------------------
+class EvalRunIn(BaseModel):
+    dataset_id: int
+    # Unset: the bot's current values
+    system_prompt: Optional[str] = None
+    model: Optional[str] = None
+    temperature: Optional[float] = Field(default=None, ge=0, le=2)
+    concurrency: int = Field(default=4, ge=1, le=32)
+    limit: Optional[int] = Field(default=None, ge=1)
+
+# -------------------------------------------------
+# Compare Schemas
+# -------------------------------------------------
+class CompareBranch(BaseModel):
+    label: Optional[str] = None
+    # Unset: the bot's / chat defaults; provider is a name from /admin/llm
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    system_prompt: Optional[str] = None
+    temperature: Optional[float] = Field(default=None, ge=0, le=2)
+    timeout_ms: int = Field(default=30000, ge=100, le=120000)
+
+class CompareIn(BaseModel):
+    message: str
+    branches: List[CompareBranch] = Field(min_length=1, max_length=8)
+
+class ForkIn(BaseModel):
+    message_id: Optional[int] = None   # last message the fork shares with its parent; None: none of them
+
 # -------------------------------------------------
 # Message Schemas
 # -------------------------------------------------
@@ -0,0 +1,561 @@
+"""
+Optional sharding of chat data across several SQLite files.
+
+With SHARD_COUNT=N (N > 0) conversations, messages, archives and user
+memories live in N shard files next to the main database, chosen by a
+jump consistent hash of the conversation's user_id. Users, bots and
+everything else stay in the main database, which becomes the catalog.
+Each shard writes under its own SQLite lock, so chat writes from
+different users stop queueing behind each other.
+
+    catalog (chatbot.db)            users, bots, datasets, ...,
+                                    conversationshard (id -> shard directory)
+    chatbot-shard-{i}.db            conversation, message,
+                                    conversationarchive, archivedmessage,
+                                    usermemory
+
+Shard connections ATTACH the catalog, so a query that joins shard tables
+with bots/users still runs as one statement. ShardedSession routes every
+statement to the catalog or to the session's shard by the tables it
+touches; the shard comes from bind_user() (called when the request's user
+is resolved) or from the conversation being accessed (bind_conversation,
+resolve_session). Listings across users (a bot's sessions, today's
+history) use for_each_shard().
+
+Ids are global, so rows keep them when they move between files:
+conversation ids come from the catalog directory (conversationshard) and
+message ids from a block of 2**40 ids per shard (messageidrange; the
+catalog's own messages use block 0). A shard gets a new block, above
+every block handed out before, whenever rows copied in from another
+shard carry higher ids than its own. Message ids therefore still grow
+within every conversation after it moves, which history pages, forks
+and the rollups rely on. A fork lives on its parent's shard; a tree of
+forks is placed by the user (or, for legacy rows, the bot) of its root.
+
+Per-user features (search, export/import, purges) run on the user's
+shard, plus the shards holding legacy rows of the user's bots
+(user_shards). The usage rollups keep high-water marks per shard and
+fold into the catalog's hourly rows (see utils/rollups.py).
+
+Enable on an existing database (app stopped):
+
+    SHARD_COUNT=4 python -m backend.sharding rebalance --shards 4
+
+and use the same command with a new --shards value to grow or shrink;
+jump hashing moves only ~1/N of the users when going from N-1 to N.
+"""
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Table, and_, delete, event, func, insert, or_
+from sqlalchemy.sql import visitors
+from sqlmodel import Session, SQLModel, select
+
+from .db import (
+    DB_PATH, RoutingSession, add_missing_columns, create_engines, engine, ensure_autoincrement,
+    raise_sequence, read_engine,
+)
+from .models import (
+    ArchivedMessage, Bot, Conversation, ConversationArchive, ConversationShard, Message, MessageIdRange,
+    UserMemory,
+)
+from .utils.search import add_entries, archived_entries, forget_entries, init_search, message_fts
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 0))
+SHARD_DIR = os.getenv("SHARD_DIR") or os.path.dirname(DB_PATH)
+ID_RANGE_BITS = 40
+
+logger = logging.getLogger(__name__)
+
+SHARDED_MODELS = (Conversation, Message, ConversationArchive, ArchivedMessage, UserMemory)
+SHARDED_TABLES = {m.__table__.name for m in SHARDED_MODELS} | {message_fts.name}
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Lamping & Veach jump consistent hash: key -> [0, buckets)."""
+    key &= 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_path(index: int, directory: str = SHARD_DIR, catalog_path: str = DB_PATH) -> str:
+    stem = os.path.splitext(os.path.basename(catalog_path))[0]
+    return os.path.join(directory, f"{stem}-shard-{index}.db")
+
+
+def _attach_catalog(shard_engine, catalog_path: str, read_only: bool):
+    target = f"file:{catalog_path}?mode=ro" if read_only else catalog_path
+
+    @event.listens_for(shard_engine, "connect")
+    def _attach(dbapi_conn, _):
+        dbapi_conn.execute("ATTACH DATABASE ? AS catalog", (target,))
+
+
+def ensure_id_range(catalog_writer, shard_writer, index: int) -> int:
+    """
+    Keep shard `index` allocating message ids from a block no other file
+    uses; take a new block when it has none or when copied-in rows pushed
+    its sequence past its block. Returns the block number.
+    """
+    range_t = MessageIdRange.__table__
+    with catalog_writer.connect() as cat:
+        block = cat.execute(select(func.max(range_t.c.id)).where(range_t.c.shard == index)).scalar()
+
+    with shard_writer.begin() as conn:
+        seq = conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'message'").scalar() or 0
+        if block is not None and seq < (block + 1) << ID_RANGE_BITS:
+            raise_sequence(conn, Message.__table__.name, block << ID_RANGE_BITS)
+            return block
+
+    first = block is None
+    with catalog_writer.begin() as cat:
+        block = cat.execute(insert(range_t).values(shard=index)).inserted_primary_key[0]
+    with shard_writer.begin() as conn:
+        if first:
+            _offset_message_ids(conn, block << ID_RANGE_BITS)
+        top = conn.exec_driver_sql("SELECT max(id) FROM message").scalar() or 0
+        raise_sequence(conn, Message.__table__.name, max(top, block << ID_RANGE_BITS))
+    return block
+
+
+def _offset_message_ids(conn, offset: int):
+    """
+    Shard files written before ids were global numbered their messages
+    per file (duplicates across shards): shift them into the shard's
+    first block, with everything that refers to them.
+    """
+    from .utils.archive import compress, decompress  # imports the app's caches
+
+    conn.exec_driver_sql("UPDATE message SET id = id + ?", (offset,))
+    conn.exec_driver_sql("UPDATE archivedmessage SET id = id + ?", (offset,))
+    conn.exec_driver_sql(
+        "UPDATE conversation SET fork_message_id = fork_message_id + ? WHERE fork_message_id > 0", (offset,)
+    )
+    archives = conn.exec_driver_sql("SELECT id, codec, payload FROM conversationarchive").all()
+    for archive_id, codec, payload in archives:
+        rows = [json.loads(line) for line in decompress(codec, payload).splitlines() if line]
+        for row in rows:
+            row["id"] += offset
+        raw = b"".join(json.dumps(row).encode("utf-8") + b"\n" for row in rows)
+        codec, payload = compress(raw)
+        conn.exec_driver_sql(
+            "UPDATE conversationarchive SET first_message_id = first_message_id + ?, "
+            "last_message_id = last_message_id + ?, codec = ?, raw_bytes = ?, payload = ? WHERE id = ?",
+            (offset, offset, codec, len(raw), payload, archive_id),
+        )
+
+
+def prepare_shard(catalog_writer, shard_writer, index: int):
+    """Create / migrate a shard's tables and give it its message id block."""
+    tables = [m.__table__ for m in SHARDED_MODELS]
+    SQLModel.metadata.create_all(shard_writer, tables=tables)
+    with shard_writer.begin() as conn:
+        add_missing_columns(conn, tables)
+        ensure_autoincrement(conn, tables)
+    ensure_id_range(catalog_writer, shard_writer, index)
+    with shard_writer.begin() as conn:
+        init_search(conn)
+
+
+# ─────────────────────────────────────────────
+# ROUTER
+# ─────────────────────────────────────────────
+
+class ShardRouter:
+    def __init__(self, count: int, catalog_path: str = DB_PATH, directory: str = SHARD_DIR,
+                 catalog=None):
+        self.count = count
+        self.catalog_path = catalog_path
+        self.catalog = catalog or (engine, read_engine)
+        self.engines: List[Tuple] = []
+        for i in range(count):
+            writer, reader = create_engines(shard_path(i, directory, catalog_path))
+            _attach_catalog(writer, catalog_path, read_only=False)
+            _attach_catalog(reader, catalog_path, read_only=True)
+            self.engines.append((writer, reader))
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 0
+
+    def shard_for(self, user_id: Optional[int], bot_id: Optional[int] = None) -> int:
+        # Conversations without a user (legacy rows) are placed by bot
+        key = user_id if user_id is not None else -(bot_id or 0)
+        return jump_hash(key, self.count)
+
+    def init(self):
+        """Create shard tables; refuse to start over unmigrated catalog data."""
+        for index, (writer, _) in enumerate(self.engines):
+            prepare_shard(self.catalog[0], writer, index)
+
+        with Session(self.catalog[0]) as db:
+            if db.exec(select(Conversation.id).limit(1)).first() is not None:
+                raise RuntimeError(
+                    "The catalog still holds conversations: run "
+                    f"`python -m backend.sharding rebalance --shards {self.count}` first"
+                )
+
+    def fan_out(self, fn: Callable[[Session], list]) -> list:
+        """Run `fn(session)` on every shard's read pool in parallel and concatenate."""
+        def run(reader):
+            with Session(reader) as db:
+                return fn(db)
+
+        with ThreadPoolExecutor(max_workers=self.count) as pool:
+            parts = list(pool.map(run, [reader for _, reader in self.engines]))
+        return [row for part in parts for row in part]
+
+    def dispose(self):
+        for writer, reader in self.engines:
+            writer.dispose()
+            reader.dispose()
+
+
+router = ShardRouter(SHARD_COUNT)
+
+
+# ─────────────────────────────────────────────
+# SESSION
+# ─────────────────────────────────────────────
+
+_clause_tables: Dict[tuple, frozenset] = {}
+
+
+def _scan_tables(clause) -> frozenset:
+    names = set()
+    for element in visitors.iterate(clause):
+        table = element if isinstance(element, Table) else getattr(element, "table", None)
+        if isinstance(table, Table):
+            names.add(table.name)
+    return frozenset(names)
+
+
+def _tables(mapper, clause) -> set:
+    """Names of the tables a statement reads or writes (memoized per statement shape)."""
+    names = {t.name for t in mapper.tables} if mapper is not None else set()
+    if clause is None:
+        return names
+
+    # Walking the clause is slow; its cache key is already computed for execution
+    cache_key = clause._generate_cache_key() if hasattr(clause, "_generate_cache_key") else None
+    if cache_key is None:
+        return names | _scan_tables(clause)
+    found = _clause_tables.get(cache_key.key)
+    if found is None:
+        if len(_clause_tables) > 10_000:
+            _clause_tables.clear()
+        found = _clause_tables[cache_key.key] = _scan_tables(clause)
+    return names | found
+
+
+class ShardedSession(RoutingSession):
+    """RoutingSession that sends statements on chat tables to the bound shard."""
+
+    def __init__(self, shard_router: ShardRouter, **kw):
+        super().__init__(**kw)
+        self.router = shard_router
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not _tables(mapper, clause) & SHARDED_TABLES:
+            return super().get_bind(mapper, clause=clause, **kw)
+
+        shard = self.info.get("shard")
+        if shard is None:
+            raise RuntimeError("Chat tables used before bind_user() / bind_conversation()")
+
+        writer, reader = self.router.engines[shard]
+        if self._writing or self._flushing or getattr(clause, "is_dml", False):
+            self._writing = True
+            return writer
+        return reader
+
+
+def new_session() -> Session:
+    return ShardedSession(router) if router.enabled else RoutingSession()
+
+
+def _router_of(db: Session) -> Optional[ShardRouter]:
+    return db.router if isinstance(db, ShardedSession) else None
+
+
+def bind_shard(db: Session, shard: Optional[int]):
+    if shard is not None and _router_of(db):
+        db.info["shard"] = shard
+
+
+def bind_user(db: Session, user_id: int):
+    """Point chat-table statements at this user's shard."""
+    shard_router = _router_of(db)
+    if shard_router:
+        db.info["shard"] = shard_router.shard_for(user_id)
+
+
+def conversation_shard(db: Session, conversation_id: int) -> Optional[int]:
+    return db.exec(
+        select(ConversationShard.shard).where(ConversationShard.conversation_id == conversation_id)
+    ).first()
+
+
+def bind_conversation(db: Session, conversation_id: int) -> bool:
+    """Point the session at the shard holding this conversation; False if unknown."""
+    if not _router_of(db):
+        return True
+    shard = conversation_shard(db, conversation_id)
+    bind_shard(db, shard)
+    return shard is not None
+
+
+def register_conversation(db: Session, conv: Conversation):
+    """Give a new conversation its global id and shard (before db.add)."""
+    shard_router = _router_of(db)
+    if not shard_router:
+        return
+    # A fork reads its parent's rows, so it lives next to them
+    shard = conversation_shard(db, conv.parent_id) if conv.parent_id is not None else None
+    entry = ConversationShard(
+        session_id=conv.session_id,
+        user_id=conv.user_id,
+        bot_id=conv.bot_id,
+        shard=shard if shard is not None else shard_router.shard_for(conv.user_id, conv.bot_id),
+    )
+    db.add(entry)
+    db.flush()
+    conv.id = entry.conversation_id
+    bind_shard(db, entry.shard)
+
+
+def register_rows(db: Session, rows: List[Dict]):
+    """register_conversation() for conversation rows about to be bulk inserted: sets their "id"."""
+    shard_router = _router_of(db)
+    if not shard_router or not rows:
+        return
+    table = ConversationShard.__table__
+    ids = db.execute(insert(table).returning(table.c.conversation_id, sort_by_parameter_order=True), [
+        {
+            "session_id": row["session_id"],
+            "user_id": row["user_id"],
+            "bot_id": row["bot_id"],
+            "shard": shard_router.shard_for(row["user_id"], row["bot_id"]),
+            "created_at": row["created_at"],
+        }
+        for row in rows
+    ]).scalars().all()
+    for row, conversation_id in zip(rows, ids):
+        row["id"] = conversation_id
+
+
+def user_shards(db: Session, user_id: int, bot_id: Optional[int] = None) -> List[Optional[int]]:
+    """
+    Shards holding a user's chat rows: their own, plus any holding their
+    forks of legacy rows or the legacy rows of their bots (both placed by
+    bot). [None] without sharding, for bind_shard().
+    """
+    shard_router = _router_of(db)
+    if not shard_router:
+        return [None]
+    owned_bots = select(Bot.id).where(Bot.owner_id == user_id)
+    query = select(ConversationShard.shard).distinct().where(or_(
+        ConversationShard.user_id == user_id,
+        and_(ConversationShard.user_id.is_(None), ConversationShard.bot_id.in_(owned_bots)),
+    ))
+    if bot_id is not None:
+        query = query.where(ConversationShard.bot_id == bot_id)
+    return sorted({shard_router.shard_for(user_id), *db.exec(query).all()})
+
+
+def all_shards(db: Session) -> List[Optional[int]]:
+    """Every shard of the session's router; [None] without sharding, for bind_shard()."""
+    shard_router = _router_of(db)
+    return list(range(shard_router.count)) if shard_router else [None]
+
+
+def for_each_shard(db: Session, fn: Callable[[Session], list]) -> list:
+    """`fn(db)` without sharding; otherwise fn on every shard, concatenated."""
+    shard_router = _router_of(db)
+    if not shard_router:
+        return fn(db)
+    return shard_router.fan_out(fn)
+
+
+# ─────────────────────────────────────────────
+# REBALANCE
+# ─────────────────────────────────────────────
+
+def _rows(conn, table, *where):
+    return [dict(r) for r in conn.execute(table.select().where(*where)).mappings()]
+
+
+def _move_conversation(conversation_id: int, source, target, catalog_writer, target_shard: int) -> int:
+    """Copy one conversation to `target`, repoint the directory, delete it from `source`."""
+    conv_t, msg_t, arc_t = Conversation.__table__, Message.__table__, ConversationArchive.__table__
+    stub_t = ArchivedMessage.__table__
+
+    with source.connect() as src:
+        conv_rows = _rows(src, conv_t, conv_t.c.id == conversation_id)
+        if not conv_rows:
+            return 0
+        messages = _rows(src, msg_t, msg_t.c.conversation_id == conversation_id)
+        archives = _rows(src, arc_t, arc_t.c.conversation_id == conversation_id)
+        stubs = _rows(src, stub_t, stub_t.c.conversation_id == conversation_id)
+    messages.sort(key=lambda r: r["id"])
+
+    # Message ids are global and kept (forks, cached pages and archives refer
+    # to them); archive rows are only referenced by conversation_id.
+    # Hot messages are (un)indexed by the triggers, archived ones here.
+    # Idempotent: a partial copy from an interrupted run is replaced.
+    in_conversation = f"c.id = {int(conversation_id)}"
+    with target.begin() as dst:
+        forget_entries(dst, archived_entries(dst, in_conversation))
+        dst.execute(delete(msg_t).where(msg_t.c.conversation_id == conversation_id))
+        dst.execute(delete(arc_t).where(arc_t.c.conversation_id == conversation_id))
+        dst.execute(delete(stub_t).where(stub_t.c.conversation_id == conversation_id))
+        dst.execute(delete(conv_t).where(conv_t.c.id == conversation_id))
+        dst.execute(insert(conv_t), conv_rows)
+        if messages:
+            dst.execute(insert(msg_t), messages)
+        if archives:
+            dst.execute(insert(arc_t), [{k: v for k, v in r.items() if k != "id"} for r in archives])
+        if stubs:
+            dst.execute(insert(stub_t), stubs)
+        add_entries(dst, archived_entries(dst, in_conversation))
+
+    conv = conv_rows[0]
+    dir_t = ConversationShard.__table__
+    with catalog_writer.begin() as cat:
+        cat.execute(delete(dir_t).where(dir_t.c.conversation_id == conversation_id))
+        cat.execute(insert(dir_t), [{
+            "conversation_id": conversation_id,
+            "session_id": conv["session_id"],
+            "user_id": conv["user_id"],
+            "bot_id": conv["bot_id"],
+            "shard": target_shard,
+            "created_at": conv["created_at"],
+        }])
+
+    with source.begin() as src:
+        forget_entries(src, archived_entries(src, in_conversation))
+        src.execute(delete(msg_t).where(msg_t.c.conversation_id == conversation_id))
+        src.execute(delete(arc_t).where(arc_t.c.conversation_id == conversation_id))
+        src.execute(delete(stub_t).where(stub_t.c.conversation_id == conversation_id))
+        src.execute(delete(conv_t).where(conv_t.c.id == conversation_id))
+    return len(messages)
+
+
+def _move_memories(user_id: int, source, target):
+    mem_t = UserMemory.__table__
+    with source.connect() as src:
+        rows = _rows(src, mem_t, mem_t.c.user_id == user_id)
+    if not rows:
+        return 0
+    with target.begin() as dst:
+        dst.execute(delete(mem_t).where(mem_t.c.user_id == user_id))
+        dst.execute(insert(mem_t), [{k: v for k, v in r.items() if k != "id"} for r in rows])
+    with source.begin() as src:
+        src.execute(delete(mem_t).where(mem_t.c.user_id == user_id))
+    return len(rows)
+
+
+def rebalance(source: ShardRouter, target: ShardRouter) -> Dict[str, int]:
+    """
+    Move chat rows to where `target` places them: from the catalog's own
+    tables (first migration) and from every shard of `source`.
+    Run with the app stopped.
+    """
+    from .utils.rollups import refresh_rollups, skip_to_latest
+
+    catalog_writer = target.catalog[0]
+    for shard_router in (source, target):
+        for index, (writer, _) in enumerate(shard_router.engines):
+            prepare_shard(catalog_writer, writer, index)
+    stats = {"conversations": 0, "messages": 0, "user_memories": 0}
+
+    # Usage rollups count rows where they are now, before any of them moves
+    with RoutingSession(*target.catalog) as db:
+        refresh_rollups(db)
+    with ShardedSession(source, writer=target.catalog[0], reader=target.catalog[1]) as db:
+        refresh_rollups(db)
+
+    # (engine, index) for every place chat rows can be; index None = catalog
+    sources = [(catalog_writer, None)] + [(w, i) for i, (w, _) in enumerate(source.engines)]
+    found = {}
+    for src_engine, index in sources:
+        with src_engine.connect() as conn:
+            found[index] = conn.execute(
+                select(Conversation.id, Conversation.user_id, Conversation.bot_id, Conversation.parent_id)
+            ).all()
+
+    # A tree of forks goes where its root goes
+    convs = {c.id: c for rows in found.values() for c in rows}
+
+    def placement(conversation_id: int) -> int:
+        seen = set()
+        conv = convs[conversation_id]
+        while conv.parent_id in convs and conv.parent_id not in seen:
+            seen.add(conv.id)
+            conv = convs[conv.parent_id]
+        return target.shard_for(conv.user_id, conv.bot_id)
+
+    for src_engine, index in sources:
+        with src_engine.connect() as conn:
+            users = conn.execute(select(UserMemory.user_id).distinct()).scalars().all()
+
+        for conversation_id, *_ in found[index]:
+            dest = placement(conversation_id)
+            if dest == index:
+                continue
+            stats["messages"] += _move_conversation(
+                conversation_id, src_engine, target.engines[dest][0], catalog_writer, dest
+            )
+            stats["conversations"] += 1
+
+        for user_id in users:
+            dest = target.shard_for(user_id)
+            if dest == index:
+                continue
+            stats["user_memories"] += _move_memories(user_id, src_engine, target.engines[dest][0])
+
+        logger.info("rebalance: source checked", extra={
+            "source": "catalog" if index is None else f"shard {index}", "conversations": len(found[index]),
+        })
+
+    # Rows copied in with higher ids than a shard's own: give it a new block
+    for index, (writer, _) in enumerate(target.engines):
+        ensure_id_range(catalog_writer, writer, index)
+    # ...and the rows copied in were counted on their old shard
+    with ShardedSession(target, writer=target.catalog[0], reader=target.catalog[1]) as db:
+        for index in range(target.count):
+            bind_shard(db, index)
+            skip_to_latest(db, index)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebalance", help="move chat rows to their shard for --shards N")
+    rb.add_argument("--shards", type=int, required=True, help="target shard count")
+    rb.add_argument("--from-shards", type=int, default=SHARD_COUNT, help="current shard count (default SHARD_COUNT)")
+    args = parser.parse_args()
+
+    from .db import init_db
+    from .utils.log import setup_logging
+    setup_logging()
+    init_db()
+
+    source = ShardRouter(args.from_shards)
+    target = ShardRouter(args.shards)
+    stats = rebalance(source, target)
+    print(f"Moved {stats['conversations']} conversations ({stats['messages']} messages), "
+          f"{stats['user_memories']} user memories; now set SHARD_COUNT={args.shards}")
+
+
+if __name__ == "__main__":
+    main()
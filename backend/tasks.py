@@ -1,10 +1,24 @@
 from fastapi import BackgroundTasks
+import logging
 import time
 
+logger = logging.getLogger(__name__)
+
 def fake_train_model(bot_id: int):
     # placeholder: call Rasa training or persist dataset to storage
     time.sleep(3)  # simulate
-    print("Training complete for bot", bot_id)
+    logger.info("training complete", extra={"bot_id": bot_id})
 
 def enqueue_training(background_tasks: BackgroundTasks, bot_id: int):
     background_tasks.add_task(fake_train_model, bot_id)
+
+def enqueue_purge(background_tasks: BackgroundTasks, job_id: str):
+    from .sharding import new_session
+    from .utils.purge import run_purge_job
+
+    background_tasks.add_task(run_purge_job, job_id, new_session)
+
+def enqueue_eval(background_tasks: BackgroundTasks, run_id: int):
+    from .ai.evals import run_eval
+
+    background_tasks.add_task(run_eval, run_id)
@@ -0,0 +1,71 @@
+"""
+Test helpers for guarding endpoint query counts.
+
+    from backend.testing import assert_max_queries
+
+    def test_today_history_is_not_n_plus_one(client, engine, auth):
+        with assert_max_queries(engine, 4):
+            client.get("/bots/1/history/today", headers=auth)
+
+Or load it as a pytest plugin (pytest_plugins = ["backend.testing"] in
+conftest.py) and use the `max_queries` fixture, which watches both
+application engines (writer and read pool) from backend.db.
+"""
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+
+
+class QueryLog:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(engine) -> Iterator[QueryLog]:
+    """Record every statement executed on `engine` (or a tuple of engines), from any thread."""
+    engines = engine if isinstance(engine, (list, tuple)) else (engine,)
+    log = QueryLog()
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        log.statements.append(" ".join(statement.split()))
+
+    for e in engines:
+        event.listen(e, "before_cursor_execute", _record)
+    try:
+        yield log
+    finally:
+        for e in engines:
+            event.remove(e, "before_cursor_execute", _record)
+
+
+@contextmanager
+def assert_max_queries(engine, limit: int) -> Iterator[QueryLog]:
+    with count_queries(engine) as log:
+        yield log
+
+    if log.count > limit:
+        listing = "\n".join(f"  {i + 1}. {s}" for i, s in enumerate(log.statements))
+        raise AssertionError(f"Expected at most {limit} queries, got {log.count}:\n{listing}")
+
+
+try:
+    import pytest
+except ImportError:  # only needed when used as a pytest plugin
+    pytest = None
+
+if pytest is not None:
+    @pytest.fixture
+    def max_queries():
+        """`with max_queries(3): client.get(...)` against the app engine."""
+        from .db import engine, read_engine
+
+        def _assert(limit: int):
+            return assert_max_queries((engine, read_engine), limit)
+
+        return _assert
@@ -0,0 +1,168 @@
+"""
+The suite runs against its own database and knowledge directory:
+CHATBOT_DB_PATH and KNOWLEDGE_DIR must be set before anything imports
+backend.db or backend.ai.retrieval.
+
+    python -m pytest backend/tests      (needs pytest and httpx)
+"""
+import os
+import tempfile
+import uuid
+
+_TMP = tempfile.mkdtemp(prefix="chatbot-tests-")
+os.environ["CHATBOT_DB_PATH"] = os.path.join(_TMP, "chatbot.db")
+os.environ["KNOWLEDGE_DIR"] = os.path.join(_TMP, "knowledge")
+os.environ["SHARD_COUNT"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel
+
+# pytest_plugins is only honoured in the rootdir conftest; import the fixture
+from backend.testing import max_queries  # noqa: F401
+
+
+@pytest.fixture(scope="session")
+def client():
+    from backend.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+def writer_session() -> Session:
+    # The writer pool has one connection: never hold it across a request
+    from backend.db import engine
+
+    return Session(engine, expire_on_commit=False)
+
+
+@pytest.fixture
+def make_user(client):
+    """Register a fresh user: (user_id, auth headers)."""
+    from backend.auth import decode_token
+
+    def _make():
+        r = client.post("/auth/register", json={"email": f"{uuid.uuid4().hex}@example.com", "password": "secret123"})
+        assert r.status_code == 200, r.text
+        token = r.json()["access_token"]
+        return int(decode_token(token)), {"Authorization": f"Bearer {token}"}
+
+    return _make
+
+
+@pytest.fixture
+def make_bot(client):
+    def _make(headers):
+        r = client.post("/bots/", json={"name": "test bot", "model": "test-model"}, headers=headers)
+        assert r.status_code == 200, r.text
+        return r.json()["id"]
+
+    return _make
+
+
+@pytest.fixture
+def start_session(client):
+    """New session with a bot: (conversation_id, session_id)."""
+    def _start(bot_id, headers):
+        r = client.post(f"/bots/{bot_id}/sessions", headers=headers)
+        assert r.status_code == 200, r.text
+        return r.json()["conversation_id"], r.json()["session_id"]
+
+    return _start
+
+
+@pytest.fixture
+def add_turns():
+    """Write `n` user / bot exchanges straight to the database (no LLM): their message ids."""
+    from backend.models import Message
+
+    def _add(conversation_id, n, text="hello"):
+        ids = []
+        with writer_session() as db:
+            for i in range(n):
+                for role, body in (("user", f"{text} {i}"), ("bot", f"reply {i}")):
+                    msg = Message(
+                        conversation_id=conversation_id, role=role, text=body,
+                        latency_ms=120 if role == "bot" else None,
+                    )
+                    db.add(msg)
+                    db.commit()
+                    ids.append(msg.id)
+        return ids
+
+    return _add
+
+
+@pytest.fixture
+def archive():
+    """Archive a conversation as the compaction job would."""
+    from backend.models import Conversation
+    from backend.utils.archive import archive_conversation
+
+    def _archive(conversation_id):
+        with writer_session() as db:
+            assert archive_conversation(db, db.get(Conversation, conversation_id))
+
+    return _archive
+
+
+@pytest.fixture
+def system_bot():
+    """A bot without an owner, usable by everyone."""
+    from backend.models import Bot
+
+    with writer_session() as db:
+        bot = Bot(name="system bot", model="test-model")
+        db.add(bot)
+        db.commit()
+        return bot.id
+
+
+@pytest.fixture
+def legacy_conversation():
+    """A conversation stored before user_id was recorded: (conversation_id, session_id)."""
+    from backend.models import Conversation
+
+    def _create(bot_id):
+        with writer_session() as db:
+            conv = Conversation(bot_id=bot_id, user_id=None, session_id=str(uuid.uuid4()))
+            db.add(conv)
+            db.commit()
+            return conv.id, conv.session_id
+
+    return _create
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """A catalog database of its own, so moving its rows leaves the app's alone."""
+    from backend.db import create_engines
+    from backend.utils.branches import invalidate_chains
+    from backend.utils.search import init_search
+
+    path = str(tmp_path / "catalog.db")
+    writer, reader = create_engines(path)
+    SQLModel.metadata.create_all(writer)
+    with writer.begin() as conn:
+        init_search(conn)
+    invalidate_chains()
+    yield path, writer, reader
+    invalidate_chains()
+    writer.dispose()
+    reader.dispose()
+
+
+@pytest.fixture
+def upload_dataset(client):
+    """Upload JSONL records as a new dataset of the bot: the upload's stats."""
+    import json
+
+    def _upload(bot_id, headers, records):
+        body = "\n".join(json.dumps(r) for r in records).encode()
+        r = client.post(f"/bots/{bot_id}/datasets", files={"file": ("data.jsonl", body, "application/jsonl")},
+                        headers=headers)
+        assert r.status_code == 200, r.text
+        return r.json()
+
+    return _upload
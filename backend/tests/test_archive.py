@@ -0,0 +1,36 @@
+def test_search_finds_archived_messages(client, make_user, make_bot, start_session, add_turns, archive, max_queries):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    conversation_id, session_id = start_session(bot_id, headers)
+    ids = add_turns(conversation_id, 2, text="the migrating walrus")
+
+    archive(conversation_id)
+    # user, owned bots, FTS hits, their rows, the archive for the snippets
+    with max_queries(5):
+        r = client.get("/search", params={"q": "walrus"}, headers=headers)
+    assert r.status_code == 200
+    hits = r.json()["results"]
+    assert [h["message_id"] for h in hits] and {h["message_id"] for h in hits} <= set(ids)
+    assert all(h["archived"] and "<mark>walrus</mark>" in h["snippet"] for h in hits)
+
+    # Restoring brings the rows back under the same ids, still indexed once
+    assert client.get(f"/sessions/{session_id}/messages", headers=headers).status_code == 200
+    r = client.get("/search", params={"q": "walrus"}, headers=headers)
+    assert sorted(h["message_id"] for h in r.json()["results"]) == sorted(h["message_id"] for h in hits)
+    assert not any(h["archived"] for h in r.json()["results"])
+
+
+def test_fork_after_restore(client, make_user, make_bot, start_session, add_turns, archive):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    conversation_id, session_id = start_session(bot_id, headers)
+    ids = add_turns(conversation_id, 3)
+
+    # The client forks at an id it saw before the conversation went cold
+    archive(conversation_id)
+    r = client.post(f"/bots/{bot_id}/sessions/{session_id}/fork", json={"message_id": ids[1]}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["fork_message_id"] == ids[1]
+
+    history = client.get(f"/sessions/{r.json()['session_id']}/messages", headers=headers).json()
+    assert [m["id"] for m in history] == ids[:2]
@@ -0,0 +1,29 @@
+def test_legacy_rows_of_a_system_bot_are_read_only(client, make_user, system_bot, legacy_conversation, add_turns):
+    _, headers = make_user()
+    conversation_id, session_id = legacy_conversation(system_bot)
+    ids = add_turns(conversation_id, 1)
+
+    r = client.get(f"/bots/conversations/{conversation_id}/messages", headers=headers)
+    assert r.status_code == 200 and len(r.json()) == 2
+
+    r = client.post(f"/bots/{system_bot}/sessions/{session_id}/fork", json={"message_id": ids[0]}, headers=headers)
+    assert r.status_code == 403
+    assert client.delete(f"/bots/conversations/{conversation_id}", headers=headers).status_code == 403
+    assert client.get(f"/bots/conversations/{conversation_id}/messages", headers=headers).status_code == 200
+
+
+def test_legacy_rows_of_an_owned_bot_belong_to_its_owner(
+    client, make_user, make_bot, legacy_conversation, add_turns
+):
+    _, owner = make_user()
+    _, stranger = make_user()
+    bot_id = make_bot(owner)
+    conversation_id, _ = legacy_conversation(bot_id)
+    add_turns(conversation_id, 1)
+
+    assert client.get(f"/bots/conversations/{conversation_id}/messages", headers=stranger).status_code == 403
+    assert client.delete(f"/bots/conversations/{conversation_id}", headers=stranger).status_code == 403
+
+    assert client.get(f"/bots/conversations/{conversation_id}/messages", headers=owner).status_code == 200
+    assert client.delete(f"/bots/conversations/{conversation_id}", headers=owner).status_code == 200
+    assert client.get(f"/bots/conversations/{conversation_id}/messages", headers=owner).status_code == 404
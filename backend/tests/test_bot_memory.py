@@ -0,0 +1,67 @@
+from backend.utils import bot_memory
+from backend.utils.bot_memory import BotMemoryIndex, _Entry, get_bot_memory_index, invalidate_bot_memory
+
+
+def _memories(client, bot_id, headers):
+    r = client.get(f"/bots/{bot_id}/memories", headers=headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_preview_ranks_by_importance_within_the_token_budget(client, make_user, make_bot):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    for key, value, importance in [
+        ("hours", "9am-5pm", 3),
+        ("policy", "x" * 400, 5),   # ~100 tokens: does not fit a budget of 20
+        ("city", "chennai", 5),
+        ("tone", "friendly", 1),
+    ]:
+        r = client.post(f"/bots/{bot_id}/memories", json={"key": key, "value": value, "importance": importance},
+                        headers=headers)
+        assert r.status_code == 200
+
+    r = client.get(f"/bots/{bot_id}/memories/preview", params={"token_budget": 20, "k": 2}, headers=headers)
+    assert r.json() == ["- city: chennai", "- hours: 9am-5pm"]
+
+
+def test_saving_a_key_twice_updates_one_row(client, make_user, make_bot):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    first = client.post(f"/bots/{bot_id}/memories", json={"key": "hours", "value": "9-5"}, headers=headers).json()
+    # The preview is cached now; the second save must invalidate it
+    assert client.get(f"/bots/{bot_id}/memories/preview", headers=headers).json() == ["- hours: 9-5"]
+
+    second = client.post(f"/bots/{bot_id}/memories", json={"key": "hours", "value": "10-6", "importance": 4},
+                         headers=headers).json()
+    assert second["id"] == first["id"] and second["importance"] == 4
+    assert [m["value"] for m in _memories(client, bot_id, headers)] == ["10-6"]
+    assert client.get(f"/bots/{bot_id}/memories/preview", headers=headers).json() == ["- hours: 10-6"]
+
+
+def test_a_load_that_races_an_invalidation_is_not_cached(monkeypatch):
+    bot_id = 10_000_001
+    stale = BotMemoryIndex([_Entry(1, "- hours: 9-5")])
+
+    def load_during_a_write(session, bot_id):
+        invalidate_bot_memory(bot_id)   # a save lands while the rows are read
+        return stale
+
+    monkeypatch.setattr(bot_memory, "load_index", load_during_a_write)
+    assert get_bot_memory_index(None, bot_id) is stale
+    assert bot_id not in bot_memory._cache
+
+
+def test_cached_index_expires(monkeypatch):
+    bot_id = 10_000_002
+    loads = []
+    monkeypatch.setattr(bot_memory, "load_index", lambda session, bot_id: loads.append(bot_id) or BotMemoryIndex([]))
+
+    get_bot_memory_index(None, bot_id)
+    get_bot_memory_index(None, bot_id)
+    assert len(loads) == 1
+
+    # Another worker's writes are picked up once the entry is older than the TTL
+    monkeypatch.setattr(bot_memory, "CACHE_TTL_SECONDS", 0)
+    get_bot_memory_index(None, bot_id)
+    assert len(loads) == 2
@@ -0,0 +1,109 @@
+from sqlmodel import select
+
+from backend.db import RoutingSession
+from backend.models import Conversation, Message
+from backend.sharding import ShardedSession, ShardRouter, bind_conversation, rebalance
+from backend.utils.branches import fork_conversation, invalidate_chains, message_scope
+
+
+def _fork(client, bot_id, session_id, headers, message_id=None):
+    r = client.post(f"/bots/{bot_id}/sessions/{session_id}/fork", json={"message_id": message_id}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _history(client, session_id, headers):
+    r = client.get(f"/sessions/{session_id}/messages", headers=headers)
+    assert r.status_code == 200, r.text
+    return [m["id"] for m in r.json()]
+
+
+def test_fork_before_the_first_message(client, make_user, make_bot, start_session, add_turns):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    conversation_id, session_id = start_session(bot_id, headers)
+    ids = add_turns(conversation_id, 2)
+
+    fork = _fork(client, bot_id, session_id, headers)
+    assert fork["parent_id"] == conversation_id and fork["fork_message_id"] == 0
+    assert _history(client, fork["session_id"], headers) == []
+
+    edited = add_turns(fork["conversation_id"], 1, text="edited")
+    assert _history(client, fork["session_id"], headers) == edited
+    assert _history(client, session_id, headers) == ids
+
+    # An empty fork of a fork shares nothing with either
+    nested = _fork(client, bot_id, fork["session_id"], headers)
+    assert nested["parent_id"] == conversation_id
+    assert _history(client, nested["session_id"], headers) == []
+
+
+def test_fork_resolves_after_its_own_restore(client, make_user, make_bot, start_session, add_turns, archive):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    conversation_id, session_id = start_session(bot_id, headers)
+    ids = add_turns(conversation_id, 2)
+    fork = _fork(client, bot_id, session_id, headers, message_id=ids[1])
+    own = add_turns(fork["conversation_id"], 1)
+
+    archive(fork["conversation_id"])
+    assert _history(client, fork["session_id"], headers) == ids[:2] + own
+    assert add_turns(fork["conversation_id"], 1)[0] > own[-1]
+
+
+# ─────────────────────────────────────────────
+# REBALANCE
+# ─────────────────────────────────────────────
+
+def _shard_history(shard_router, writer, reader, conversation_id):
+    with ShardedSession(shard_router, writer=writer, reader=reader) as db:
+        assert bind_conversation(db, conversation_id)
+        conv = db.get(Conversation, conversation_id)
+        return db.exec(select(Message.id).where(message_scope(db, conv)).order_by(Message.id)).all()
+
+
+def test_forks_resolve_after_rebalance(catalog, tmp_path):
+    path, writer, reader = catalog
+    with RoutingSession(writer, reader) as db:
+        roots = []
+        for user_id in range(1, 7):
+            conv = Conversation(bot_id=1, user_id=user_id, session_id=f"root-{user_id}")
+            db.add(conv)
+            db.commit()
+            for i in range(3):
+                db.add(Message(conversation_id=conv.id, role="user", text=f"message {i}"))
+                db.commit()
+            roots.append(conv.id)
+
+        # Forks by other users, one of them empty: they follow their parent
+        parent = db.get(Conversation, roots[0])
+        prefix = db.exec(select(Message.id).where(Message.conversation_id == parent.id).order_by(Message.id)).all()
+        forks = [
+            fork_conversation(db, parent, prefix[1], user_id=6),
+            fork_conversation(db, parent, None, user_id=5),
+        ]
+        db.add_all(forks)
+        db.commit()
+        expected = {fork.id: prefix[:2] for fork in forks}
+        expected[forks[1].id] = []
+
+    # Out of the catalog, then onto one more shard
+    for before, after in ((0, 2), (2, 3)):
+        source = ShardRouter(before, path, str(tmp_path), catalog=(writer, reader))
+        target = ShardRouter(after, path, str(tmp_path), catalog=(writer, reader))
+        rebalance(source, target)
+        source.dispose()
+        invalidate_chains()
+        for fork_id, history in expected.items():
+            assert _shard_history(target, writer, reader, fork_id) == history
+        assert _shard_history(target, writer, reader, roots[0]) == prefix
+
+    # New messages still sort after the prefix they inherit
+    with ShardedSession(target, writer=writer, reader=reader) as db:
+        bind_conversation(db, forks[0].id)
+        msg = Message(conversation_id=forks[0].id, role="user", text="after the move")
+        db.add(msg)
+        db.commit()
+        assert msg.id > prefix[-1]
+    assert _shard_history(target, writer, reader, forks[0].id) == prefix[:2] + [msg.id]
+    target.dispose()
@@ -0,0 +1,53 @@
+import json
+import time
+
+import pytest
+
+from backend.ai import llm
+
+
+@pytest.fixture
+def fake_complete(monkeypatch):
+    """Answers with the model name, after a delay given by the model name ("slow" / "fast")."""
+    def complete(chat_messages, model, temperature, max_tokens, pool=None, deadline=None):
+        time.sleep(0.3 if model == "slow" else 0.0)
+        return f"answer from {model}"
+
+    monkeypatch.setattr(llm, "complete", complete)
+
+
+def test_compare_streams_branches_as_they_finish(client, make_user, make_bot, start_session, fake_complete):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    _, session_id = start_session(bot_id, headers)
+
+    payload = {"message": "which is faster?", "branches": [{"model": "slow"}, {"model": "fast"}]}
+    with client.stream("POST", f"/bots/{bot_id}/sessions/{session_id}/compare", json=payload, headers=headers) as r:
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in r.iter_lines() if line]
+
+    assert [e["type"] for e in events] == ["start", "branch", "branch", "summary"]
+    assert [e["model"] for e in events[1:3]] == ["fast", "slow"]
+    summary = events[-1]
+    assert summary["fastest"] == 1 and summary["serial_ms"] >= 300
+
+    # Nothing is saved until a branch is chosen
+    assert client.get(f"/sessions/{session_id}/messages", headers=headers).json() == []
+    r = client.post(
+        f"/bots/{bot_id}/sessions/{session_id}/compare/{summary['compare_id']}/choose",
+        params={"branch": 0}, headers=headers,
+    )
+    assert r.status_code == 200
+    texts = [m["text"] for m in client.get(f"/sessions/{session_id}/messages", headers=headers).json()]
+    assert texts == ["which is faster?", "answer from slow"]
+
+
+def test_compare_needs_the_conversations_user(client, make_user, system_bot, start_session, fake_complete):
+    _, alice = make_user()
+    _, bob = make_user()
+    _, session_id = start_session(system_bot, alice)
+
+    payload = {"message": "hi", "branches": [{"model": "fast"}]}
+    r = client.post(f"/bots/{system_bot}/sessions/{session_id}/compare", json=payload, headers=bob)
+    assert r.status_code == 403
@@ -0,0 +1,44 @@
+import json
+
+
+def test_chunks_append_and_skip_duplicates(client, make_user, make_bot, upload_dataset):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    first = upload_dataset(bot_id, headers, [
+        {"prompt": "hi", "response": "hello"},
+        {"prompt": "hi ", "response": " hello"},   # same example up to whitespace
+        {"input": "bye", "output": "see you"},
+        {"nothing": "here"},
+    ])
+    assert (first["rows_read"], first["rows_inserted"], first["duplicates"], first["invalid"]) == (4, 2, 1, 1)
+
+    # A second part in chat format, overlapping the first
+    body = "\n".join(json.dumps(r) for r in [
+        {"messages": [{"role": "user", "content": "bye"}, {"role": "assistant", "content": "see you"}]},
+        {"messages": [{"role": "user", "content": "thanks"}, {"role": "assistant", "content": "any time"}]},
+        "not json {",
+    ])
+    r = client.post(f"/bots/{bot_id}/datasets/{first['dataset_id']}/chunks",
+                    files={"file": ("part2.jsonl", body.encode(), "application/jsonl")}, headers=headers)
+    assert r.status_code == 200
+    stats = r.json()
+    # Counters accumulate over the parts
+    assert (stats["rows_read"], stats["rows_inserted"], stats["duplicates"], stats["invalid"]) == (7, 3, 2, 2)
+    assert stats["status"] == "ready" and stats["examples"] == 3
+
+    examples = client.get(f"/bots/{bot_id}/datasets/{first['dataset_id']}/examples",
+                          params={"limit": 2}, headers=headers).json()
+    assert [e["prompt"] for e in examples] == ["hi", "bye"]
+    rest = client.get(f"/bots/{bot_id}/datasets/{first['dataset_id']}/examples",
+                      params={"after_id": examples[-1]["id"]}, headers=headers).json()
+    assert [(e["prompt"], e["response"]) for e in rest] == [("thanks", "any time")]
+
+
+def test_csv_duplicates_are_skipped_across_batches(client, make_user, make_bot):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    rows = "prompt,response\n" + "".join(f"q{i},a{i}\n" for i in range(2500)) + "q0,a0\n"
+    r = client.post(f"/bots/{bot_id}/datasets", files={"file": ("data.csv", rows.encode(), "text/csv")},
+                    headers=headers)
+    assert r.status_code == 200
+    assert (r.json()["format"], r.json()["rows_inserted"], r.json()["duplicates"]) == ("csv", 2500, 1)
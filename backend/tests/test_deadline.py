@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+
+from backend.ai import llm
+from backend.db import read_engine
+from backend.routes import bots as bots_routes
+from backend.utils.deadline import DISCONNECT, TIMEOUT, Deadline, DeadlineExceeded, deadline_scope
+
+
+class SlowCompletions:
+    def __init__(self):
+        self.cancelled = threading.Event()
+
+    async def create(self, **kwargs):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+@pytest.fixture
+def slow_llm(monkeypatch):
+    """Every provider takes longer than any test waits; its call records the cancellation."""
+    completions = SlowCompletions()
+    provider = llm.Provider("slow", "key", hedge_delay_ms=0, breaker=llm.CircuitBreaker())
+    provider._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(llm, "providers", [provider])
+    monkeypatch.setattr(bots_routes, "GROQ_API_KEY", "test-key")
+    return completions
+
+
+def test_status_codes():
+    assert DeadlineExceeded(TIMEOUT).status_code == 504
+    assert DeadlineExceeded(DISCONNECT).status_code == 499
+
+
+def test_the_client_timeout_takes_precedence_over_the_bot_default():
+    sent = Deadline(200)
+    sent.apply_default(60_000)
+    assert sent.remaining() <= 0.2
+
+    default = Deadline()
+    default.apply_default(200)
+    assert default.remaining() <= 0.2
+
+
+def test_a_turn_past_its_deadline_is_a_504(client, make_user, make_bot, start_session, slow_llm):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    _, session_id = start_session(bot_id, headers)
+    before = llm.cancellations.snapshot()["cancelled"]["timeout"]
+
+    start = time.perf_counter()
+    r = client.post(f"/bots/{bot_id}/sessions/{session_id}/message", data={"message": "hi"},
+                    headers={**headers, "X-Request-Timeout-Ms": "100"})
+    assert r.status_code == 504 and r.json() == {"detail": "Deadline exceeded"}
+    assert time.perf_counter() - start < 2
+    assert slow_llm.cancelled.wait(1)
+    assert llm.cancellations.snapshot()["cancelled"]["timeout"] == before + 1
+
+    # The user message stays, no reply is saved
+    messages = client.get(f"/sessions/{session_id}/messages", headers=headers).json()
+    assert [(m["role"], m["text"]) for m in messages] == [("user", "hi")]
+
+
+def test_a_disconnect_cancels_the_llm_call(slow_llm):
+    deadline = Deadline(10_000)
+    threading.Timer(0.05, deadline.cancel).start()
+    with pytest.raises(DeadlineExceeded) as raised:
+        llm.complete([{"role": "user", "content": "hi"}], "model", 0.5, 10, deadline=deadline)
+    assert raised.value.reason == DISCONNECT and raised.value.status_code == 499
+    assert slow_llm.cancelled.wait(1)
+
+
+def test_queries_are_interrupted_once_the_deadline_passes():
+    endless = text("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n")
+    deadline = Deadline(50)
+    start = time.perf_counter()
+    with Session(read_engine) as db, deadline_scope(deadline), pytest.raises(DeadlineExceeded):
+        db.execute(endless)
+    assert time.perf_counter() - start < 2
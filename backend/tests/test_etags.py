@@ -0,0 +1,73 @@
+import pytest
+from sqlmodel import Session, func, select
+
+from backend.db import read_engine
+from backend.models import Message
+from backend.utils.etags import etag_matches
+
+
+def _revalidate(client, url, headers, etag):
+    return client.get(url, headers={**headers, "If-None-Match": etag})
+
+
+@pytest.mark.parametrize("header, matches", [
+    ('W/"abc"', True),
+    ('"abc"', True),               # weak comparison ignores W/
+    ('"xyz", W/"abc"', True),
+    ("*", True),
+    ('W/"xyz"', False),
+    (None, False),
+])
+def test_if_none_match_uses_weak_comparison(header, matches):
+    assert etag_matches(header, 'W/"abc"') is matches
+
+
+def test_history_revalidates_until_a_message_is_added(client, make_user, make_bot, start_session, add_turns):
+    _, headers = make_user()
+    conversation_id, session_id = start_session(make_bot(headers), headers)
+    add_turns(conversation_id, 1)
+    url = f"/sessions/{session_id}/messages"
+
+    r = client.get(url, headers=headers)
+    etag = r.headers["ETag"]
+    assert etag.startswith('W/"') and r.headers["Cache-Control"] == "private, no-cache"
+    not_modified = _revalidate(client, url, headers, etag)
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+
+    add_turns(conversation_id, 1)
+    r = _revalidate(client, url, headers, etag)
+    assert r.status_code == 200 and len(r.json()) == 4 and r.headers["ETag"] != etag
+
+
+def test_archiving_keeps_the_version(client, make_user, make_bot, start_session, add_turns, archive):
+    _, headers = make_user()
+    conversation_id, _ = start_session(make_bot(headers), headers)
+    add_turns(conversation_id, 2)
+    url = f"/bots/conversations/{conversation_id}/messages"
+    etag = client.get(url, headers=headers).headers["ETag"]
+
+    archive(conversation_id)
+    # Answered from the archive's counters, without restoring the rows
+    assert _revalidate(client, url, headers, etag).status_code == 304
+    with Session(read_engine) as db:
+        hot = db.exec(select(func.count(Message.id)).where(Message.conversation_id == conversation_id)).one()
+    assert hot == 0
+    assert client.get(url, headers=headers).headers["ETag"] == etag
+
+
+def test_lists_change_their_tag_when_rows_are_added(client, make_user, make_bot, start_session):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+
+    bots_etag = client.get("/bots/", headers=headers).headers["ETag"]
+    assert _revalidate(client, "/bots/", headers, bots_etag).status_code == 304
+    make_bot(headers)
+    assert _revalidate(client, "/bots/", headers, bots_etag).status_code == 200
+
+    url = f"/bots/{bot_id}/sessions"
+    sessions_etag = client.get(url, headers=headers).headers["ETag"]
+    assert _revalidate(client, url, headers, sessions_etag).status_code == 304
+    start_session(bot_id, headers)
+    r = _revalidate(client, url, headers, sessions_etag)
+    assert r.status_code == 200 and len(r.json()) == 1
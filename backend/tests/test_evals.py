@@ -0,0 +1,41 @@
+from backend.ai import evals
+from backend.models import Bot
+from backend.sharding import new_session
+
+
+def test_a_cancelled_run_resumes_where_it_stopped(client, make_user, make_bot, upload_dataset, monkeypatch):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    prompts = [f"question {i}" for i in range(6)]
+    dataset_id = upload_dataset(bot_id, headers, [{"prompt": p} for p in prompts])["dataset_id"]
+
+    calls = []
+
+    def evaluate_example(bot, model, prompt):
+        calls.append(prompt)
+        return {"reply": f"re: {prompt}", "error": None, "attempts": 1, "latency_ms": 10}
+
+    monkeypatch.setattr(evals, "evaluate_example", evaluate_example)
+    monkeypatch.setattr(evals, "CHECKPOINT_EVERY", 2)
+
+    with new_session() as db:
+        run_id = evals.create_run(db, db.get(Bot, bot_id), dataset_id, {"concurrency": 1}).id
+
+    def cancel_after_first_checkpoint(run):
+        with new_session() as db:
+            evals.cancel_run(db, db.get(evals.EvalRun, run.id))
+
+    run = evals.run_eval(run_id, on_progress=cancel_after_first_checkpoint)
+    assert run.status == "cancelled"
+    results = client.get(f"/bots/{bot_id}/evals/{run_id}/results", headers=headers).json()
+    done = {r["prompt"] for r in results}
+    assert len(done) == run.completed and 2 <= len(done) < len(prompts)
+
+    calls.clear()
+    run = evals.run_eval(run_id)
+    assert run.status == "done"
+    assert (run.completed, run.failed, run.total) == (len(prompts), 0, len(prompts))
+    # Only the examples without a checkpointed result are sent again
+    assert sorted(calls) == sorted(set(prompts) - done)
+    results = client.get(f"/bots/{bot_id}/evals/{run_id}/results", headers=headers).json()
+    assert [r["reply"] for r in results] == [f"re: {p}" for p in prompts]
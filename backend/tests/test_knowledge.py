@@ -0,0 +1,69 @@
+from backend.ai.retrieval import KnowledgeIndex
+
+
+def test_bm25_ranks_rarer_terms_higher(tmp_path):
+    index = KnowledgeIndex(1, root=str(tmp_path))
+    index.add_documents([
+        ("faq", "shipping takes three days"),
+        ("faq", "returns are free within thirty days"),
+        ("faq", "shipping to europe takes a week"),
+    ])
+
+    hits = index.search("europe shipping", k=3)
+    assert [h["text"] for h in hits[:2]] == ["shipping to europe takes a week", "shipping takes three days"]
+    assert hits[0]["score"] > hits[1]["score"]
+
+
+def test_reindexing_a_source_replaces_it(tmp_path):
+    index = KnowledgeIndex(1, root=str(tmp_path))
+    index.add_documents([("file:faq.md", "opening hours are nine to five")] + [("file:other.md", f"filler {i}") for i in range(4)])
+
+    assert index.remove_source("file:faq.md") == 1
+    index.add_documents([("file:faq.md", "opening hours are ten to six")])
+
+    assert [h["text"] for h in index.search("opening hours", k=5)] == ["opening hours are ten to six"]
+    assert [h["text"] for h in index.search("opening hours", k=5, hybrid=True)][0] == "opening hours are ten to six"
+    assert index.source_counts() == {"file:other.md": 4, "file:faq.md": 1}
+
+    # Reopened from disk: the removal is persisted
+    reopened = KnowledgeIndex(1, root=str(tmp_path))
+    assert [h["text"] for h in reopened.search("opening hours", k=5)] == ["opening hours are ten to six"]
+
+
+def test_mostly_deleted_index_is_rebuilt(tmp_path):
+    index = KnowledgeIndex(1, root=str(tmp_path))
+    index.add_documents([("old", f"old chunk {i}") for i in range(3)] + [("kept", "kept chunk")])
+
+    index.remove_source("old")
+    stats = index.stats()
+    assert (stats["chunks"], stats["deleted_chunks"]) == (1, 0)
+    assert [h["chunk_id"] for h in index.search("kept")] == [0]
+
+
+def test_chunk_ids_stay_unique_across_processes(tmp_path):
+    # Two workers with their own loaded copy of the same index
+    first = KnowledgeIndex(1, root=str(tmp_path))
+    second = KnowledgeIndex(1, root=str(tmp_path))
+
+    first.add_documents([("a", "apples are red")])
+    second.add_documents([("b", "cherries are red")])
+
+    texts = {h["chunk_id"]: h["text"] for h in first.search("red", k=5)}
+    assert texts == {0: "apples are red", 1: "cherries are red"}
+
+
+def test_uploading_a_file_again_replaces_its_chunks(client, make_user, make_bot):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+
+    def upload(text):
+        r = client.post(f"/bots/{bot_id}/knowledge", files={"file": ("hours.md", text.encode())}, headers=headers)
+        assert r.status_code == 200, r.text
+        return r.json()
+
+    upload("We open at nine.")
+    stats = upload("We open at ten.")
+    assert stats["added_chunks"] == 1 and stats["chunks"] == 1
+
+    hits = client.get(f"/bots/{bot_id}/knowledge/search", params={"q": "open"}, headers=headers).json()
+    assert [h["text"] for h in hits] == ["We open at ten."]
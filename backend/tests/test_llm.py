@@ -0,0 +1,112 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.ai import llm
+from backend.ai.llm import CircuitBreaker, Provider, ProviderUnavailable
+
+
+class FakeCompletions:
+    """Answers after `delay` seconds, or raises `error`; remembers cancellations."""
+
+    def __init__(self, name, delay=0.0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        message = SimpleNamespace(content=f"from {self.name}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def _provider(name, hedge_delay_ms=50, failures=2, **fake):
+    provider = Provider(name, "key", hedge_delay_ms=hedge_delay_ms, breaker=CircuitBreaker(failures, reset_s=60))
+    provider._client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(name, **fake)))
+    return provider
+
+
+def _complete(pool):
+    return llm.complete([{"role": "user", "content": "hi"}], "model", 0.5, 10, pool=pool)
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def test_breaker_opens_probes_once_and_closes():
+    now = [0.0]
+    breaker = CircuitBreaker(failures=2, reset_s=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    now[0] = 10
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()   # one probe at a time
+    breaker.record_failure()     # a failed probe opens it again
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_a_slow_primary_is_hedged_and_cancelled():
+    primary, backup = _provider("primary", delay=5), _provider("backup")
+    start = time.perf_counter()
+    assert _complete([primary, backup]) == "from backup"
+    assert time.perf_counter() - start < 1
+
+    fake = primary.client.chat.completions
+    for _ in range(100):   # the cancellation lands on the LLM loop
+        if fake.cancelled:
+            break
+        time.sleep(0.01)
+    assert (fake.calls, fake.cancelled) == (1, 1)
+    # Losing a race is not a failure
+    assert primary.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_a_failure_hedges_at_once_and_trips_the_breaker():
+    primary = _provider("primary", hedge_delay_ms=10_000, error=RuntimeError("boom"))
+    backup = _provider("backup")
+    start = time.perf_counter()
+    assert _complete([primary, backup]) == "from backup"
+    assert time.perf_counter() - start < 1
+
+    assert _complete([primary, backup]) == "from backup"
+    assert primary.breaker.state == CircuitBreaker.OPEN
+    # Skipped while open
+    assert _complete([primary, backup]) == "from backup"
+    assert primary.client.chat.completions.calls == 2
+
+
+def test_no_provider_left_raises():
+    only = _provider("primary", error=RuntimeError("down"))
+    with pytest.raises(ProviderUnavailable):
+        _complete([only])
+    assert only.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(ProviderUnavailable, match="open circuit"):
+        _complete([only])
+
+
+def test_rate_limits_do_not_open_the_breaker():
+    limited = _provider("primary", failures=1, error=RateLimited("slow down"))
+    with pytest.raises(ProviderUnavailable) as raised:
+        _complete([limited])
+    assert isinstance(raised.value.__cause__, RateLimited)
+    assert limited.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,50 @@
+import asyncio
+
+import httpx
+
+from backend.benchmarks.common import make_engine
+from backend.benchmarks.load import load_fixtures, run_scenario
+from backend.benchmarks.seed import seed_dataset
+from backend.benchmarks.stub_llm import StubConfig, start_stub
+
+
+def test_seeded_sessions_become_fixtures(tmp_path):
+    path = str(tmp_path / "load.db")
+    engine = make_engine(path)
+    seed_dataset(engine, users=3, sessions_per_user=2, messages_per_session=4)
+    engine.dispose()
+
+    fixtures = load_fixtures(path)
+    assert len(fixtures) == 6
+    assert {f["email"] for f in fixtures} == {f"bench{i}@example.com" for i in range(1, 4)}
+
+
+def test_run_scenario_counts_statuses_and_queries():
+    queries = {"n": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        queries["n"] += 1   # the probe counts itself, like the real endpoint
+        if request.url.path == "/__bench__/queries":
+            return httpx.Response(200, json={"queries": queries["n"]})
+        queries["n"] += 2
+        return httpx.Response(500 if request.url.params["i"] == "3" else 200)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://bench") as client:
+            return await run_scenario(client, lambda i: client.get("/work", params={"i": i}), total=10, concurrency=3)
+
+    result = asyncio.run(run())
+    assert result["status"] == {"200": 9, "500": 1}
+    assert result["error_rate"] == 0.1
+    assert result["db_queries_per_request"] == 3.0
+
+
+def test_stub_llm_answers_in_the_openai_format():
+    server = start_stub(0, StubConfig(latency_ms=0, jitter_ms=0, tokens_per_s=10_000, reply_tokens=5))
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/openai/v1/chat/completions"
+        r = httpx.post(url, json={"model": "stub", "messages": [{"role": "user", "content": "hi"}]})
+        assert r.status_code == 200
+        assert len(r.json()["choices"][0]["message"]["content"].split()) == 5
+    finally:
+        server.shutdown()
@@ -0,0 +1,65 @@
+import json
+import logging
+import queue
+
+from backend.utils import log
+
+
+def _pipeline(sample_rate=1.0):
+    """The handler setup_logging() installs, writing to a queue we can read."""
+    records = queue.SimpleQueue()
+    handler = log._QueueHandler(records)
+    handler.addFilter(log.DebugSamplingFilter(sample_rate))
+    handler.addFilter(log.ContextFilter())
+    handler.addFilter(log.RedactionFilter())
+    logger = logging.getLogger(f"test.log.{id(records)}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger, records
+
+
+def _lines(records):
+    lines = []
+    while not records.empty():
+        lines.append(json.loads(log.JsonFormatter().format(records.get())))
+    return lines
+
+
+def test_user_content_is_redacted_before_it_is_queued():
+    logger, records = _pipeline()
+    token = log.request_id_var.set("req-1")
+    try:
+        logger.info("message saved %s", 7, extra={"conversation_id": 7, "text": "my secret", "Password": "hunter2"})
+    finally:
+        log.request_id_var.reset(token)
+
+    [line] = _lines(records)
+    assert line["msg"] == "message saved 7"
+    assert (line["level"], line["request_id"], line["conversation_id"]) == ("INFO", "req-1", 7)
+    assert line["text"] == "[redacted len=9]" and line["Password"] == "[redacted len=7]"
+
+
+def test_exceptions_are_kept_as_text():
+    logger, records = _pipeline()
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception("failed")
+    [line] = _lines(records)
+    assert "ZeroDivisionError" in line["exc"]
+
+
+def test_debug_records_are_sampled():
+    logger, records = _pipeline(sample_rate=0.0)
+    logger.debug("dropped")
+    logger.debug("kept", extra={"sample_rate": 1})
+    logger.info("always kept")
+    assert [line["msg"] for line in _lines(records)] == ["kept", "always kept"]
+
+
+def test_requests_carry_a_request_id(client):
+    r = client.get("/bots/", headers={"X-Request-ID": "abc123"})
+    assert r.headers["X-Request-ID"] == "abc123"
+    generated = client.get("/bots/").headers["X-Request-ID"]
+    assert generated and generated != "abc123"
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from backend.utils.post_turn import PostTurnExecutor
+
+
+def test_jobs_of_a_key_run_in_order_and_wait_idle_waits_for_them():
+    executor = PostTurnExecutor(workers=4)
+    ran = []
+    release = threading.Event()
+
+    def job(name, block=False):
+        def run():
+            if block:
+                release.wait(5)
+            ran.append(name)
+        return run
+
+    executor.submit(("user", 1), "first", job("first", block=True))
+    executor.submit(("user", 1), "second", job("second"))
+    executor.submit(("user", 2), "other", job("other"))
+
+    # The other key is not held up by the blocked one
+    assert executor.wait_idle(("user", 2), timeout=2)
+    assert ran == ["other"]
+    assert not executor.wait_idle(("user", 1), timeout=0.05)
+
+    release.set()
+    assert executor.wait_idle(("user", 1), timeout=2)
+    assert ran == ["other", "first", "second"]
+    executor.shutdown()
+
+
+def test_failed_jobs_do_not_stop_the_queue():
+    executor = PostTurnExecutor(workers=1)
+    ran = []
+    executor.submit("key", "boom", lambda: 1 / 0)
+    executor.submit("key", "after", lambda: ran.append(time.monotonic()))
+
+    assert executor.flush(timeout=2)
+    assert ran and executor.stats()["failed"] == 1
+    executor.shutdown()
+
+
+def test_memory_commands_apply_in_message_order(client, make_user, make_bot, start_session):
+    from backend.crud import load_user_memory
+    from backend.db import RoutingSession
+    from backend.utils.post_turn import post_turn
+
+    user_id, headers = make_user()
+    bot_id = make_bot(headers)
+    _, session_id = start_session(bot_id, headers)
+
+    for text in ("my name is Asha", "forget my name", "my name is Ravi"):
+        r = client.post(f"/sessions/{session_id}/messages", json={"message": text}, headers=headers)
+        assert r.status_code == 200, r.text
+
+    assert post_turn.wait_idle((user_id, bot_id))
+    with RoutingSession() as db:
+        assert load_user_memory(db, user_id=user_id, bot_id=bot_id) == {"name": "Ravi"}
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from sqlmodel import Session
+
+from backend.db import read_engine
+from backend.models import User
+from backend.routes import admin
+from backend.utils import profiler as profiling
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_samples_the_busy_thread_and_skips_idle_ones():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    idle = threading.Thread(target=threading.Event().wait, args=(1,), name="idle", daemon=True)
+    worker.start()
+    idle.start()
+    try:
+        p = profiling.SamplingProfiler(interval_s=0.001).start()
+        time.sleep(0.1)
+        p.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert p.sample_count > 0
+    assert "busy" in p.samples and "idle" not in p.samples
+    assert any(line.startswith("busy;") and "busy_loop (test_profiler.py:" in line
+               for line in p.collapsed().splitlines())
+
+    doc = p.speedscope()
+    profile = next(x for x in doc["profiles"] if x["name"] == "busy")
+    names = {doc["shared"]["frames"][i]["name"] for stack in profile["samples"] for i in stack}
+    assert "busy_loop" in names
+    assert profile["endValue"] == sum(profile["weights"])
+
+
+def test_one_profile_at_a_time():
+    first = profiling.try_start(0.01)
+    assert first is not None
+    try:
+        assert profiling.try_start(0.01) is None
+    finally:
+        profile_id = profiling.finish(first)
+    assert profiling.get_profile(profile_id) is first
+    second = profiling.try_start(0.01)
+    assert second is not None
+    profiling.finish(second)
+
+
+def test_admins_profile_a_request_by_header(client, make_user, monkeypatch):
+    user_id, headers = make_user()
+    _, other = make_user()
+    with Session(read_engine) as db:
+        monkeypatch.setattr(admin, "ADMIN_EMAILS", {db.get(User, user_id).email})
+
+    # Ignored for everyone else
+    assert "X-Profile-Id" not in client.get("/bots/", headers={**other, "X-Profile": "1"}).headers
+    assert client.post("/admin/profile", params={"seconds": 0.05}, headers=other).status_code == 403
+
+    r = client.get("/bots/", headers={**headers, "X-Profile": "1"})
+    assert r.status_code == 200
+    profile_id = r.headers["X-Profile-Id"]
+    r = client.get(f"/admin/profiles/{profile_id}", params={"format": "speedscope"}, headers=headers)
+    assert r.status_code == 200 and r.json()["name"] == f"profile {profile_id}"
+    assert client.get("/admin/profiles/nope", headers=headers).status_code == 404
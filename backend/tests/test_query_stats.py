@@ -0,0 +1,39 @@
+import logging
+
+from sqlalchemy import text
+from starlette.responses import Response
+
+from backend.utils.query_stats import add_query_headers, instrument_engine, track_queries
+
+
+def test_queries_are_counted_per_context(catalog):
+    _, writer, _ = catalog
+    instrument_engine(writer)
+    with writer.connect() as conn:
+        with track_queries() as outer:
+            conn.execute(text("SELECT 1"))
+            with track_queries() as inner:
+                conn.execute(text("SELECT 2"))
+                conn.execute(text("SELECT 3"))
+            conn.execute(text("SELECT 4"))
+        conn.execute(text("SELECT 5"))   # outside any request
+
+    assert (outer.count, inner.count) == (2, 2)
+    assert outer.slowest_ms <= outer.total_ms
+
+    response = Response()
+    add_query_headers(response, inner)
+    assert response.headers["X-DB-Queries"] == "2"
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+
+def test_slow_queries_are_logged_with_their_plan(catalog, caplog):
+    _, writer, _ = catalog
+    instrument_engine(writer, slow_query_ms=0)
+    with caplog.at_level(logging.WARNING, logger="backend.sql"), writer.connect() as conn:
+        conn.execute(text("SELECT name FROM bot WHERE owner_id = :owner"), {"owner": 7})
+
+    [record] = [r for r in caplog.records if r.name == "backend.sql"]
+    assert record.getMessage() == "slow query"
+    assert record.statement == "SELECT name FROM bot WHERE owner_id = ?"
+    assert "bot" in record.plan
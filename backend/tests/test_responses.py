@@ -0,0 +1,69 @@
+import pytest
+
+from backend.utils.responses import accepts_encoding
+
+
+@pytest.fixture
+def long_history(make_user, make_bot, start_session, add_turns):
+    """A session whose history is well over COMPRESS_MIN_BYTES: (session_id, headers)."""
+    _, headers = make_user()
+    conversation_id, session_id = start_session(make_bot(headers), headers)
+    add_turns(conversation_id, 20, "a fairly long message that repeats")
+    return session_id, headers
+
+
+def _get(client, session_id, headers, accept, **params):
+    return client.get(f"/sessions/{session_id}/messages", params=params,
+                      headers={**headers, "Accept-Encoding": accept})
+
+
+@pytest.mark.parametrize("header, coding, accepted", [
+    ("gzip, deflate", "gzip", True),
+    ("gzip;q=0, *", "gzip", False),
+    ("*;q=0.5", "gzip", True),
+    ("identity", "gzip", False),
+    ("br;q=1.0, gzip;q=0.8", "br", True),
+    ("br;q=nope", "br", False),
+])
+def test_accept_encoding_q_values(header, coding, accepted):
+    assert accepts_encoding(header, coding) is accepted
+
+
+@pytest.mark.parametrize("params", [{}, {"limit": 10}])
+def test_history_is_gzipped_only_when_accepted(client, long_history, params):
+    session_id, headers = long_history
+    plain = _get(client, session_id, headers, "identity", **params)
+    assert "content-encoding" not in plain.headers
+
+    zipped = _get(client, session_id, headers, "gzip", **params)
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert zipped.json() == plain.json()
+    assert int(zipped.headers["content-length"]) < len(plain.content)
+
+    assert "content-encoding" not in _get(client, session_id, headers, "gzip;q=0", **params).headers
+
+
+def test_cached_pages_are_served_pre_encoded(client, long_history):
+    session_id, headers = long_history
+    first = _get(client, session_id, headers, "gzip", limit=10)
+    before_id = first.headers["X-Next-Before-Id"]
+
+    for _ in range(2):   # cold, then from the page cache
+        r = client.get(f"/sessions/{session_id}/messages", params={"limit": 10, "before_id": before_id},
+                       headers={**headers, "Accept-Encoding": "gzip"})
+        assert r.headers["content-encoding"] == "gzip" and "Accept-Encoding" in r.headers["vary"]
+        assert len(r.json()) == 10
+
+
+def test_small_bodies_are_not_compressed(client, make_user):
+    _, headers = make_user()
+    r = client.get("/bots/", headers={**headers, "Accept-Encoding": "gzip"})
+    assert r.status_code == 200 and "content-encoding" not in r.headers
+
+
+def test_brotli_is_preferred_when_installed(client, long_history):
+    pytest.importorskip("brotli")
+    session_id, headers = long_history
+    r = _get(client, session_id, headers, "br, gzip")
+    assert r.headers["content-encoding"] == "br"
+    assert len(r.json()) == 40
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.db import RoutingSession
+from backend.models import Conversation, Message
+from backend.sharding import ShardedSession, ShardRouter, bind_conversation, rebalance
+from backend.utils.rollups import bot_stats, refresh_rollups
+
+
+def _totals(client, bot_id, headers):
+    r = client.get(f"/bots/{bot_id}/stats", headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()["totals"]
+
+
+def test_traffic_after_a_delete_is_counted(client, make_user, make_bot, start_session, add_turns):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+
+    first, _ = start_session(bot_id, headers)
+    add_turns(first, 2)
+    second, _ = start_session(bot_id, headers)
+    add_turns(second, 3)
+    totals = _totals(client, bot_id, headers)
+    assert (totals["messages"], totals["sessions"]) == (10, 2)
+
+    assert client.delete(f"/bots/conversations/{second}", headers=headers).status_code == 200
+
+    # Ids of the deleted rows are not handed out again, so the marks see these
+    third, _ = start_session(bot_id, headers)
+    assert third > second
+    add_turns(third, 3)
+    totals = _totals(client, bot_id, headers)
+    assert (totals["messages"], totals["sessions"]) == (16, 3)
+
+
+def test_restored_messages_are_not_counted_twice(client, make_user, make_bot, start_session, add_turns, archive):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    conversation_id, session_id = start_session(bot_id, headers)
+    add_turns(conversation_id, 2)
+    assert _totals(client, bot_id, headers)["messages"] == 4
+
+    archive(conversation_id)
+    r = client.get(f"/sessions/{session_id}/messages", headers=headers)
+    assert r.status_code == 200 and len(r.json()) == 4
+
+    assert _totals(client, bot_id, headers)["messages"] == 4
+
+
+def test_since_with_an_offset_is_converted_to_utc(client, make_user, make_bot, start_session, add_turns):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    conversation_id, _ = start_session(bot_id, headers)
+    add_turns(conversation_id, 1)
+
+    # An hour ago, written in UTC+05:30; dropping the offset would start 4.5h ahead
+    since = (datetime.now(timezone.utc) - timedelta(hours=1)).astimezone(timezone(timedelta(hours=5, minutes=30)))
+    r = client.get(f"/bots/{bot_id}/stats", params={"since": since.isoformat()}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["totals"]["messages"] == 2
+
+
+def test_rollups_count_every_shard_once_across_rebalances(catalog, tmp_path):
+    path, writer, reader = catalog
+    with RoutingSession(writer, reader) as db:
+        for user_id in range(1, 5):
+            conv = Conversation(bot_id=1, user_id=user_id, session_id=f"user-{user_id}")
+            db.add(conv)
+            db.commit()
+            db.add(Message(conversation_id=conv.id, role="user", text="hello"))
+            db.commit()
+        refresh_rollups(db)
+
+    def totals(shard_router):
+        with ShardedSession(shard_router, writer=writer, reader=reader) as db:
+            refresh_rollups(db)
+            stats = bot_stats(db, 1, datetime.utcnow() - timedelta(days=1), datetime.utcnow() + timedelta(days=1))
+            return stats["totals"]["messages"], stats["totals"]["sessions"]
+
+    two = ShardRouter(2, path, str(tmp_path), catalog=(writer, reader))
+    rebalance(ShardRouter(0, path, str(tmp_path), catalog=(writer, reader)), two)
+    assert totals(two) == (4, 4)
+
+    # Written on a shard, not yet rolled up when the next rebalance moves it
+    # (user 3 goes from shard 0 to the new shard 2)
+    with ShardedSession(two, writer=writer, reader=reader) as db:
+        bind_conversation(db, 3)
+        db.add(Message(conversation_id=3, role="user", text="on a shard"))
+        db.commit()
+
+    three = ShardRouter(3, path, str(tmp_path), catalog=(writer, reader))
+    rebalance(two, three)
+    two.dispose()
+    assert totals(three) == (5, 4)
+    three.dispose()
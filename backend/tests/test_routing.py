@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import select
+
+from backend.db import RoutingSession
+from backend.models import Bot
+from backend.testing import count_queries
+
+
+def test_reads_use_the_pool_until_the_session_writes(catalog):
+    _, writer, reader = catalog
+    with RoutingSession(writer, reader) as db, count_queries(writer) as writes, count_queries(reader) as reads:
+        db.exec(select(Bot)).all()
+        assert (reads.count, writes.count) == (1, 0)
+
+        db.add(Bot(name="routed", model="m"))
+        db.flush()
+        # Same transaction: reads its own write through the writer
+        assert db.exec(select(Bot.name)).all() == ["routed"]
+        assert reads.count == 1
+        db.commit()
+
+        before = writes.count
+        assert db.exec(select(Bot.name)).all() == ["routed"]
+        assert writes.count == before and reads.count == 2
+
+
+def test_dml_statements_go_to_the_writer(catalog):
+    _, writer, reader = catalog
+    with RoutingSession(writer, reader) as db, count_queries(reader) as reads:
+        db.execute(insert(Bot.__table__).values(name="core", model="m"))
+        db.commit()
+        assert reads.count == 0
+
+
+def test_the_pool_is_read_only_and_not_blocked_by_a_write(catalog):
+    _, writer, reader = catalog
+    with reader.connect() as conn, pytest.raises(OperationalError):
+        conn.execute(text("INSERT INTO bot (name, model) VALUES ('no', 'm')"))
+
+    with RoutingSession(writer, reader) as db:
+        db.add(Bot(name="pending", model="m"))
+        db.flush()   # write transaction open on the writer
+        with RoutingSession(writer, reader) as other:
+            assert other.exec(select(Bot.name)).all() == []
+        db.commit()
@@ -0,0 +1,51 @@
+def _search(client, headers, q, **params):
+    r = client.get("/search", params={"q": q, **params}, headers=headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_search_only_sees_the_users_conversations(client, make_user, make_bot, system_bot, start_session, add_turns):
+    _, alice = make_user()
+    _, bob = make_user()
+    alice_bot = make_bot(alice)
+    first, _ = start_session(alice_bot, alice)
+    second, _ = start_session(system_bot, alice)
+    add_turns(first, 1, "narwhal tusks")
+    add_turns(second, 1, "narwhal songs")
+    bobs, _ = start_session(system_bot, bob)
+    add_turns(bobs, 1, "narwhal facts")
+
+    hits = _search(client, alice, "narwhal")["results"]
+    assert {h["conversation_id"] for h in hits} == {first, second}
+    assert "<mark>narwhal</mark>" in hits[0]["snippet"]
+
+    # One bot, and the last word as a prefix
+    hits = _search(client, alice, "narwhal so", bot_id=system_bot)["results"]
+    assert [h["conversation_id"] for h in hits] == [second]
+    assert [h["conversation_id"] for h in _search(client, bob, "narwhal")["results"]] == [bobs]
+
+
+def test_legacy_rows_belong_to_the_bot_owner(client, make_user, make_bot, legacy_conversation, add_turns):
+    _, owner = make_user()
+    _, stranger = make_user()
+    bot_id = make_bot(owner)
+    conversation_id, _ = legacy_conversation(bot_id)
+    add_turns(conversation_id, 1, "okapi stripes")
+
+    assert [h["conversation_id"] for h in _search(client, owner, "okapi")["results"]] == [conversation_id]
+    assert _search(client, stranger, "okapi")["results"] == []
+
+
+def test_search_pages_and_ignores_query_syntax(client, make_user, make_bot, start_session, add_turns):
+    _, headers = make_user()
+    conversation_id, _ = start_session(make_bot(headers), headers)
+    add_turns(conversation_id, 3, "axolotl")
+
+    page = _search(client, headers, "axolotl", limit=2)
+    assert len(page["results"]) == 2 and page["has_more"]
+    rest = _search(client, headers, "axolotl", limit=2, offset=2)
+    assert len(rest["results"]) == 1 and not rest["has_more"]
+
+    # FTS operators in the input are just words
+    assert _search(client, headers, 'axolotl" OR scope:u*')["results"] == []
+    assert _search(client, headers, "***")["results"] == []
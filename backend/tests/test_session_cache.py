@@ -0,0 +1,62 @@
+import pytest
+
+from backend.routes import bots as bots_routes
+from backend.utils.session_cache import sessions
+
+
+@pytest.fixture
+def groq_key(monkeypatch):
+    # Access is checked before the LLM is called; the key only has to be set
+    monkeypatch.setattr(bots_routes, "GROQ_API_KEY", "test-key")
+
+
+def test_sessions_on_a_system_bot_are_private(client, make_user, system_bot, start_session, add_turns, groq_key):
+    _, alice = make_user()
+    _, bob = make_user()
+    conversation_id, session_id = start_session(system_bot, alice)
+    add_turns(conversation_id, 1)
+
+    # Cached by create_session: the checks below must not trust the bot alone
+    assert sessions.get(session_id) is not None
+
+    assert client.get(f"/sessions/{session_id}/messages", headers=alice).status_code == 200
+    assert client.get(f"/sessions/{session_id}/messages", headers=bob).status_code == 403
+    r = client.post(f"/sessions/{session_id}/messages", json={"message": "hi"}, headers=bob)
+    assert r.status_code == 403
+    r = client.post(f"/bots/{system_bot}/sessions/{session_id}/message", data={"message": "hi"}, headers=bob)
+    assert r.status_code == 403
+
+
+def test_legacy_sessions_follow_the_conversation_rules(
+    client, make_user, make_bot, system_bot, legacy_conversation, groq_key
+):
+    _, owner = make_user()
+    _, stranger = make_user()
+    bot_id = make_bot(owner)
+
+    # Legacy rows of a system bot: readable by everyone, nobody adds turns
+    _, session_id = legacy_conversation(system_bot)
+    assert client.get(f"/sessions/{session_id}/messages", headers=stranger).status_code == 200
+    r = client.post(f"/sessions/{session_id}/messages", json={"message": "hi"}, headers=stranger)
+    assert r.status_code == 403
+    r = client.post(f"/bots/{system_bot}/sessions/{session_id}/message", data={"message": "hi"}, headers=stranger)
+    assert r.status_code == 403
+
+    # Legacy rows of an owned bot belong to its owner
+    _, session_id = legacy_conversation(bot_id)
+    assert client.get(f"/sessions/{session_id}/messages", headers=stranger).status_code == 403
+    assert client.get(f"/sessions/{session_id}/messages", headers=owner).status_code == 200
+    r = client.post(f"/sessions/{session_id}/messages", json={"message": "hi"}, headers=owner)
+    assert r.status_code == 200
+
+
+def test_deleting_a_conversation_drops_its_cached_session(client, make_user, make_bot, start_session):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    conversation_id, session_id = start_session(bot_id, headers)
+    assert client.get(f"/sessions/{session_id}/messages", headers=headers).status_code == 200
+    assert sessions.get(session_id) is not None
+
+    assert client.delete(f"/bots/conversations/{conversation_id}", headers=headers).status_code == 200
+    assert sessions.get(session_id) is None
+    assert client.get(f"/sessions/{session_id}/messages", headers=headers).status_code == 404
@@ -0,0 +1,70 @@
+import io
+
+from backend.utils.transfer import open_jsonl
+
+
+def _export(client, headers, **params):
+    r = client.get("/users/me/export", params=params, headers=headers)
+    assert r.status_code == 200
+    return list(open_jsonl(io.BytesIO(r.content)))
+
+
+def _import(client, headers, body, **params):
+    return client.post("/users/me/import", params=params, files={"file": ("history.jsonl.gz", body)},
+                       headers=headers)
+
+
+def _by_type(records, kind):
+    return [r for r in records if r["type"] == kind]
+
+
+def test_history_round_trips_to_another_user(
+    client, make_user, make_bot, system_bot, start_session, add_turns, archive
+):
+    _, alice = make_user()
+    _, bob = make_user()
+    hot, hot_session = start_session(system_bot, alice)
+    add_turns(hot, 2, "kept hot")
+    cold, _ = start_session(system_bot, alice)
+    add_turns(cold, 1, "archived")
+    archive(cold)
+    private, _ = start_session(make_bot(alice), alice)   # bob cannot use alice's bot
+    add_turns(private, 1)
+
+    r = client.get("/users/me/export", headers=alice)
+    exported = list(open_jsonl(io.BytesIO(r.content)))
+    assert {c["id"] for c in _by_type(exported, "conversation")} == {hot, cold, private}
+    assert len(_by_type(exported, "message")) == 8
+
+    r = _import(client, bob, r.content)
+    assert r.status_code == 200
+    assert {k: r.json()[k] for k in ("conversations", "messages", "skipped")} == {
+        "conversations": 2, "messages": 6, "skipped": 3,
+    }
+
+    imported = _export(client, bob)
+    conversations = _by_type(imported, "conversation")
+    # Fresh ids and session ids; messages stay with their conversation
+    assert not {c["id"] for c in conversations} & {hot, cold, private}
+    assert hot_session not in {c["session_id"] for c in conversations}
+    texts = {}
+    for m in _by_type(imported, "message"):
+        texts.setdefault(m["conversation_id"], []).append(m["text"])
+    assert sorted(texts.values()) == [
+        ["archived 0", "reply 0"],
+        ["kept hot 0", "reply 0", "kept hot 1", "reply 1"],
+    ]
+
+
+def test_import_can_retarget_a_bot_and_rejects_garbage(client, make_user, make_bot, system_bot, start_session, add_turns):
+    _, headers = make_user()
+    conversation_id, _ = start_session(system_bot, headers)
+    add_turns(conversation_id, 1)
+    body = client.get("/users/me/export", params={"bot_id": system_bot}, headers=headers).content
+
+    bot_id = make_bot(headers)
+    assert _import(client, headers, body, bot_id=bot_id).json()["conversations"] == 1
+    copied = _by_type(_export(client, headers, bot_id=bot_id), "conversation")
+    assert [c["bot_id"] for c in copied] == [bot_id]
+
+    assert _import(client, headers, b"\x1f\x8bnot gzip").status_code == 400
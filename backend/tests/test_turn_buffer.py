@@ -0,0 +1,76 @@
+from sqlmodel import Session
+
+from backend.db import read_engine
+from backend.models import Message
+from backend.utils.turn_buffer import Turn, TurnBuffers
+
+
+def _texts(turns):
+    return [t.text for t in turns]
+
+
+def test_a_hit_costs_one_query_and_sees_local_writes(make_user, make_bot, start_session, add_turns, max_queries):
+    _, headers = make_user()
+    conversation_id, _ = start_session(make_bot(headers), headers)
+    add_turns(conversation_id, 6)
+    buffers = TurnBuffers(turns=4)
+
+    with Session(read_engine) as db:
+        assert _texts(buffers.recent(db, conversation_id)) == ["hello 4", "reply 4", "hello 5", "reply 5"]
+
+        # A write made by this worker goes into the ring
+        user_id, bot_id = add_turns(conversation_id, 1, "local")
+        buffers.append(conversation_id, Message(id=user_id, conversation_id=conversation_id, role="user", text="local 0"))
+        buffers.append(conversation_id, Message(id=bot_id, conversation_id=conversation_id, role="bot", text="reply 0"))
+        with max_queries(1):
+            turns = buffers.recent(db, conversation_id)
+    assert _texts(turns) == ["hello 5", "reply 5", "local 0", "reply 0"]
+
+
+def test_a_write_from_another_worker_rebuilds_the_ring(make_user, make_bot, start_session, add_turns):
+    _, headers = make_user()
+    conversation_id, _ = start_session(make_bot(headers), headers)
+    add_turns(conversation_id, 1)
+    buffers = TurnBuffers(turns=4)
+
+    with Session(read_engine) as db:
+        buffers.recent(db, conversation_id)
+        add_turns(conversation_id, 1, "elsewhere")   # never appended here
+        assert _texts(buffers.recent(db, conversation_id)) == ["hello 0", "reply 0", "elsewhere 0", "reply 0"]
+    assert len(buffers) == 1
+
+
+def test_a_write_during_a_rebuild_is_not_cached(make_user, make_bot, start_session, add_turns):
+    _, headers = make_user()
+    conversation_id, _ = start_session(make_bot(headers), headers)
+    add_turns(conversation_id, 1)
+    buffers = TurnBuffers(turns=4)
+
+    class RacingSession(Session):
+        def exec(self, statement, *args, **kwargs):
+            result = super().exec(statement, *args, **kwargs)
+            buffers.append(conversation_id, Message(id=10**9, conversation_id=conversation_id, role="user", text="x"))
+            return result
+
+    with RacingSession(read_engine) as db:
+        buffers.recent(db, conversation_id)
+    assert len(buffers) == 0
+
+
+def test_least_recently_used_rings_go_first(make_user, make_bot, start_session, add_turns):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    conversations = [start_session(bot_id, headers)[0] for _ in range(3)]
+    for conversation_id in conversations:
+        add_turns(conversation_id, 1)
+    ring_bytes = sum(Turn(0, "user", text).size for text in ("hello 0", "reply 0"))
+    buffers = TurnBuffers(max_bytes=2 * ring_bytes, turns=2)
+
+    with Session(read_engine) as db:
+        first, second, third = conversations
+        buffers.recent(db, first)
+        buffers.recent(db, second)
+        buffers.recent(db, first)   # touched: now the newest
+        buffers.recent(db, third)
+    assert list(buffers._rings) == [first, third]
+    assert buffers.bytes == 2 * ring_bytes
@@ -0,0 +1,68 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from backend.routes import ws
+from backend.utils.pubsub import Subscriber
+
+
+def _socket(client, session_id, headers):
+    return client.websocket_connect(f"/ws/sessions/{session_id}", headers=headers)
+
+
+def test_socket_on_someone_elses_session_is_closed(client, make_user, system_bot, start_session):
+    _, alice = make_user()
+    _, bob = make_user()
+    _, session_id = start_session(system_bot, alice)
+
+    with _socket(client, session_id, bob) as socket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            socket.receive_json()
+    assert closed.value.code == ws.CLOSE_FORBIDDEN
+
+
+def test_readers_cannot_post_on_the_socket(client, make_user, system_bot, legacy_conversation):
+    _, headers = make_user()
+    _, session_id = legacy_conversation(system_bot)
+
+    with _socket(client, session_id, headers) as socket:
+        socket.send_json({"type": "message", "text": "hi"})
+        assert socket.receive_json() == {"type": "error", "detail": "Read-only conversation"}
+
+
+def test_messages_reach_every_socket_on_the_session(client, make_user, make_bot, start_session):
+    _, headers = make_user()
+    bot_id = make_bot(headers)
+    _, session_id = start_session(bot_id, headers)
+
+    with _socket(client, session_id, headers) as first, _socket(client, session_id, headers) as second:
+        # Both subscribed once a ping round-trips
+        for socket in (first, second):
+            socket.send_json({"type": "ping"})
+            assert socket.receive_json() == {"type": "pong"}
+
+        r = client.post(f"/sessions/{session_id}/messages", json={"message": "hi"}, headers=headers)
+        assert r.status_code == 200
+        for socket in (first, second):
+            user_event, bot_event = socket.receive_json(), socket.receive_json()
+            assert (user_event["message"]["role"], user_event["message"]["text"]) == ("user", "hi")
+            assert bot_event["message"]["role"] == "bot"
+
+
+def test_heartbeat_pings_the_client(client, make_user, make_bot, start_session, monkeypatch):
+    monkeypatch.setattr(ws, "HEARTBEAT_SECONDS", 0.01)
+    _, headers = make_user()
+    _, session_id = start_session(make_bot(headers), headers)
+
+    with _socket(client, session_id, headers) as socket:
+        assert socket.receive_json() == {"type": "ping"}
+
+
+def test_full_queue_drops_tokens_then_overflows_on_a_message():
+    sub = Subscriber("chat:test", maxsize=1)
+    sub.offer({"type": "message"})
+
+    sub.offer({"type": "token", "delta": "x"})
+    assert sub.dropped == 1 and not sub.overflowed.is_set()
+
+    sub.offer({"type": "message"})
+    assert sub.dropped == 2 and sub.overflowed.is_set()
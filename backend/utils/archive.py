@@ -0,0 +1,424 @@
+"""
+Archival tier for idle conversations.
+
+A conversation whose newest message is older than ARCHIVE_IDLE_DAYS is
+summarised into Conversation.metadata_json["summary"], its messages are
+written as one compressed JSONL blob into ConversationArchive and removed
+from the hot `message` table. Reading the conversation again restores the
+rows transparently (see ensure_restored).
+
+Each archived message leaves an ArchivedMessage stub behind. It keeps the
+message's full-text entry in place, so archived history stays searchable,
+and marks the id as held so restore can bring the row back unchanged
+(message ids are AUTOINCREMENT and never handed out again).
+
+Run the compaction job from cron / a scheduler:
+
+    python -m backend.utils.archive --idle-days 30
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+
+from ..models import ArchivedMessage, Conversation, ConversationArchive, Message
+from ..ai.retrieval import tokenize
+from .branches import invalidate_chains
+from .page_cache import invalidate_conversation
+from .search import add_entries, conversation_scopes, forget_entries
+from .turn_buffer import invalidate_turns
+
+try:
+    import zstandard
+except ImportError:  # gzip is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_IDLE_DAYS = int(os.getenv("ARCHIVE_IDLE_DAYS", 30))
+ARCHIVE_BATCH = 100
+SUMMARY_KEYWORDS = 8
+
+
+# ─────────────────────────────────────────────
+# CODECS
+# ─────────────────────────────────────────────
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "gzip", gzip.compress(data, compresslevel=6)
+
+
+def decompress(codec: str, payload: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to restore this archive")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return gzip.decompress(payload)
+
+
+def archived_rows(archive: ConversationArchive) -> List[Dict]:
+    return [
+        json.loads(line)
+        for line in decompress(archive.codec, archive.payload).splitlines()
+        if line
+    ]
+
+
+# ─────────────────────────────────────────────
+# SUMMARY
+# ─────────────────────────────────────────────
+
+def _clip(text: str, limit: int = 160) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def summarize_messages(messages: List[Message]) -> Dict:
+    """
+    Cheap extractive summary kept on the hot row after archival:
+    the opening question, the last exchange, counts and top keywords.
+    """
+    user_msgs = [m for m in messages if m.role == "user"]
+    keywords = Counter(t for m in user_msgs for t in tokenize(m.text) if len(t) > 2)
+
+    return {
+        "title": _clip(user_msgs[0].text, 80) if user_msgs else "",
+        "last_user_message": _clip(user_msgs[-1].text) if user_msgs else "",
+        "last_reply": _clip(messages[-1].text) if messages and messages[-1].role == "bot" else "",
+        "keywords": [k for k, _ in keywords.most_common(SUMMARY_KEYWORDS)],
+        "message_count": len(messages),
+        "first_at": messages[0].created_at.isoformat() if messages else None,
+        "last_at": messages[-1].created_at.isoformat() if messages else None,
+    }
+
+
+# ─────────────────────────────────────────────
+# ARCHIVE / RESTORE
+# ─────────────────────────────────────────────
+
+def archive_conversation(session: Session, conv: Conversation, commit: bool = True) -> Optional[Dict]:
+    """Move one conversation's messages into cold storage."""
+    messages = session.exec(
+        select(Message)
+        .where(Message.conversation_id == conv.id)
+        .order_by(Message.created_at, Message.id)
+    ).all()
+    if not messages:
+        return None
+
+    raw = b"".join(
+        json.dumps({
+            "id": m.id,
+            "role": m.role,
+            "text": m.text,
+            "latency_ms": m.latency_ms,
+            "restored_from": m.restored_from,
+            "created_at": m.created_at.isoformat(),
+        }).encode("utf-8") + b"\n"
+        for m in messages
+    )
+    codec, payload = compress(raw)
+
+    session.add(ConversationArchive(
+        conversation_id=conv.id,
+        message_count=len(messages),
+        first_message_id=messages[0].id,
+        last_message_id=messages[-1].id,
+        codec=codec,
+        raw_bytes=len(raw),
+        payload=payload,
+    ))
+
+    meta = dict(conv.metadata_json or {})
+    meta["summary"] = summarize_messages(messages)
+    meta["archived"] = {
+        "at": datetime.utcnow().isoformat(),
+        "messages": len(messages),
+        "codec": codec,
+        "raw_bytes": len(raw),
+        "stored_bytes": len(payload),
+    }
+    conv.metadata_json = meta
+    session.add(conv)
+
+    # Stubs first: with them in place the delete leaves the search entries alone
+    session.execute(insert(ArchivedMessage.__table__), [
+        {"id": m.id, "conversation_id": conv.id, "role": m.role, "created_at": m.created_at}
+        for m in messages
+    ])
+    session.execute(delete(Message).where(Message.conversation_id == conv.id))
+    invalidate_conversation(conv.id)
+    invalidate_turns(conv.id)
+    if commit:
+        session.commit()
+    return meta["archived"]
+
+
+def restore_conversation(session: Session, conv: Conversation) -> int:
+    """Bring archived messages back into the hot table. Commits."""
+    archive = session.exec(
+        select(ConversationArchive).where(ConversationArchive.conversation_id == conv.id)
+    ).first()
+
+    if archive is None:
+        restored = 0
+    else:
+        rows = archived_rows(archive)
+        for row in rows:
+            row["conversation_id"] = conv.id
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+            row.setdefault("restored_from", None)
+
+        # Rows come back under their own ids; the stubs keep the insert
+        # trigger from indexing them a second time
+        if rows and _ids_taken(session, rows):
+            _restore_renumbered(session, conv, rows)
+        elif rows:
+            session.execute(insert(Message.__table__), rows)
+        session.execute(delete(ArchivedMessage).where(ArchivedMessage.conversation_id == conv.id))
+        session.delete(archive)
+        restored = len(rows)
+
+    invalidate_conversation(conv.id)
+    invalidate_turns(conv.id)
+    meta = dict(conv.metadata_json or {})
+    meta.pop("archived", None)
+    conv.metadata_json = meta
+    session.add(conv)
+    session.commit()
+    return restored
+
+
+def _ids_taken(session: Session, rows: List[Dict]) -> bool:
+    return bool(session.exec(
+        select(func.count()).select_from(Message).where(Message.id.in_([r["id"] for r in rows]))
+    ).one())
+
+
+def _restore_renumbered(session: Session, conv: Conversation, rows: List[Dict]):
+    """
+    Only archives written before ids were reserved can collide with newer
+    messages. Renumber the whole conversation (keeping its order), move
+    its search entries to the new ids and repoint forks at the new ids.
+    """
+    logger.warning("Restoring conversation %s under new message ids", conv.id)
+    stubbed = set(session.exec(
+        select(ArchivedMessage.id).where(ArchivedMessage.conversation_id == conv.id)
+    ).all())
+    scope = conversation_scopes(session, [conv.id]).get(conv.id)
+    forget_entries(session, [(r["id"], r["text"], scope) for r in rows if r["id"] in stubbed])
+
+    old_ids = []
+    for row in rows:
+        old_ids.append(row.pop("id"))
+        row["restored_from"] = row["restored_from"] or old_ids[-1]
+    new_ids = session.execute(
+        insert(Message.__table__).returning(Message.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    renumbered = dict(zip(old_ids, new_ids))
+
+    for fork in session.exec(select(Conversation).where(Conversation.parent_id == conv.id)).all():
+        if fork.fork_message_id in renumbered:
+            fork.fork_message_id = renumbered[fork.fork_message_id]
+            session.add(fork)
+            invalidate_conversation(fork.id)
+    invalidate_chains()
+
+
+def archived_texts(session: Session, ids_by_conversation: Dict[int, List[int]]) -> Dict[int, str]:
+    """Text of archived messages (message id -> text), for search snippets."""
+    wanted = {i for ids in ids_by_conversation.values() for i in ids}
+    texts = {}
+    for archive in session.exec(
+        select(ConversationArchive)
+        .where(ConversationArchive.conversation_id.in_(list(ids_by_conversation)))
+    ):
+        for row in archived_rows(archive):
+            if row["id"] in wanted:
+                texts[row["id"]] = row["text"]
+    return texts
+
+
+def forget_archives(session: Session, conversation_ids: List[int]):
+    """Drop the search entries and stubs of archived messages. Call before deleting the archives."""
+    archives = session.exec(
+        select(ConversationArchive).where(ConversationArchive.conversation_id.in_(conversation_ids))
+    ).all()
+    if not archives:
+        return
+
+    stubbed = set(session.exec(
+        select(ArchivedMessage.id).where(ArchivedMessage.conversation_id.in_(conversation_ids))
+    ).all())
+    scopes = conversation_scopes(session, [a.conversation_id for a in archives])
+    for archive in archives:
+        scope = scopes.get(archive.conversation_id)
+        forget_entries(session, [
+            (r["id"], r["text"], scope) for r in archived_rows(archive) if r["id"] in stubbed
+        ])
+    session.execute(
+        delete(ArchivedMessage)
+        .where(ArchivedMessage.conversation_id.in_(conversation_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def index_archives(session: Session, batch: int = ARCHIVE_BATCH) -> int:
+    """
+    Give archives written before ArchivedMessage existed their stubs and
+    search entries. One whose ids newer messages have taken is restored
+    and archived again instead, which renumbers it. Commits per batch.
+    """
+    has_stubs = (
+        select(ArchivedMessage.id)
+        .where(ArchivedMessage.conversation_id == ConversationArchive.conversation_id)
+        .exists()
+    )
+    indexed, after_id = 0, 0
+    while True:
+        archives = session.exec(
+            select(ConversationArchive)
+            .where(ConversationArchive.id > after_id, ConversationArchive.message_count > 0, ~has_stubs)
+            .order_by(ConversationArchive.id)
+            .limit(batch)
+        ).all()
+        if not archives:
+            break
+        after_id = archives[-1].id
+        scopes = conversation_scopes(session, [a.conversation_id for a in archives])
+
+        for archive in archives:
+            rows = archived_rows(archive)
+            if _ids_taken(session, rows):
+                conv = session.get(Conversation, archive.conversation_id)
+                restore_conversation(session, conv)
+                archive_conversation(session, conv)
+            else:
+                session.execute(insert(ArchivedMessage.__table__), [
+                    {
+                        "id": r["id"],
+                        "conversation_id": archive.conversation_id,
+                        "role": r["role"],
+                        "created_at": datetime.fromisoformat(r["created_at"]),
+                    }
+                    for r in rows
+                ])
+                scope = scopes.get(archive.conversation_id)
+                add_entries(session, [(r["id"], r["text"], scope) for r in rows])
+            indexed += 1
+        session.commit()
+        session.expunge_all()
+
+    return indexed
+
+
+def is_archived(conv: Conversation) -> bool:
+    return bool((conv.metadata_json or {}).get("archived"))
+
+
+def ensure_restored(session: Session, conv: Conversation) -> Conversation:
+    """Call before reading a conversation's messages."""
+    if is_archived(conv):
+        restore_conversation(session, conv)
+    return conv
+
+
+# ─────────────────────────────────────────────
+# COMPACTION JOB
+# ─────────────────────────────────────────────
+
+def find_idle_conversations(
+    session: Session,
+    idle_days: int,
+    limit: int,
+    after_id: int = 0,
+) -> List[int]:
+    """
+    Next `limit` conversation ids (after `after_id`) whose newest hot message
+    is older than the cutoff. Walks conversations by primary key and probes
+    max(created_at) through the (conversation_id, created_at) index, so
+    each batch costs O(batch), not a scan of the message table.
+    Conversations with forks are skipped: the forks read their rows.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=idle_days)
+    last_message_at = (
+        select(func.max(Message.created_at))
+        .where(Message.conversation_id == Conversation.id)
+        .scalar_subquery()
+    )
+    fork = aliased(Conversation)
+    has_forks = select(fork.id).where(fork.parent_id == Conversation.id).exists()
+    return session.exec(
+        select(Conversation.id)
+        .where(Conversation.id > after_id, last_message_at < cutoff, ~has_forks)
+        .order_by(Conversation.id)
+        .limit(limit)
+    ).all()
+
+
+def compact_idle_conversations(
+    session: Session,
+    idle_days: int = ARCHIVE_IDLE_DAYS,
+    batch: int = ARCHIVE_BATCH,
+    max_conversations: Optional[int] = None,
+) -> Dict:
+    """Archive every conversation idle for `idle_days`, committing once per batch."""
+    stats = {"conversations": 0, "messages": 0, "raw_bytes": 0, "stored_bytes": 0}
+    after_id = 0
+
+    while max_conversations is None or stats["conversations"] < max_conversations:
+        ids = find_idle_conversations(session, idle_days, batch, after_id)
+        if not ids:
+            break
+        after_id = ids[-1]
+
+        for conv_id in ids:
+            if max_conversations is not None and stats["conversations"] >= max_conversations:
+                break
+            conv = session.get(Conversation, conv_id)
+            info = archive_conversation(session, conv, commit=False) if conv else None
+            if info:
+                stats["conversations"] += 1
+                stats["messages"] += info["messages"]
+                stats["raw_bytes"] += info["raw_bytes"]
+                stats["stored_bytes"] += info["stored_bytes"]
+        session.commit()
+        session.expunge_all()
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive idle conversations")
+    parser.add_argument("--idle-days", type=int, default=ARCHIVE_IDLE_DAYS)
+    parser.add_argument("--max", type=int, default=None, help="stop after N conversations")
+    args = parser.parse_args()
+
+    from ..db import engine, init_db
+    from ..sharding import router
+
+    init_db()
+    # Every shard in turn when sharding is on
+    for target in [writer for writer, _ in router.engines] or [engine]:
+        with Session(target) as session:
+            indexed = index_archives(session)
+            if indexed:
+                print(f"✅ Indexed {indexed} archives written before archived messages were searchable")
+            stats = compact_idle_conversations(
+                session, idle_days=args.idle_days, max_conversations=args.max
+            )
+        print(f"✅ Archived {stats['conversations']} conversations ({stats['messages']} messages)")
+
+
+if __name__ == "__main__":
+    main()
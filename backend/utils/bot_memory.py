@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from sqlmodel import Session
+
+from ..crud import list_bot_memories
+
+MAX_CACHED_BOTS = 256
+MAX_MEMORIES_PER_BOT = 2048   # only the best-ranked memories are ever kept
+DEFAULT_TOKEN_BUDGET = 300
+DEFAULT_TOP_K = 20
+# Writes only invalidate this worker's cache; other workers reload after this long
+CACHE_TTL_SECONDS = 30
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 chars per token), good enough for budgeting."""
+    return max(1, len(text) // 4)
+
+
+class _Entry:
+    __slots__ = ("id", "line", "tokens")
+
+    def __init__(self, memory_id: int, line: str):
+        self.id = memory_id
+        self.line = line
+        self.tokens = estimate_tokens(line)
+
+
+class BotMemoryIndex:
+    """
+    Pre-rendered memory lines for one bot, already sorted by
+    (importance desc, recency desc) and capped at MAX_MEMORIES_PER_BOT.
+    """
+
+    def __init__(self, entries: List[_Entry]):
+        self.entries = entries
+        self.min_tokens = min((e.tokens for e in entries), default=0)
+
+    def select(self, token_budget: int = DEFAULT_TOKEN_BUDGET, k: int = DEFAULT_TOP_K) -> List[str]:
+        """Greedy top-k in rank order, skipping lines that would overflow the budget."""
+        picked = []
+        remaining = token_budget
+
+        for entry in self.entries:
+            if len(picked) >= k or remaining < self.min_tokens:
+                break
+            if entry.tokens <= remaining:
+                picked.append(entry.line)
+                remaining -= entry.tokens
+
+        return picked
+
+
+# ─────────────────────────────────────────────
+# CACHE (LRU over bots, invalidated on writes, expires after a TTL)
+# ─────────────────────────────────────────────
+
+_cache: "OrderedDict[int, Tuple[float, BotMemoryIndex]]" = OrderedDict()
+# Bumped by every invalidation: a load that raced with a write is not cached
+_generations: Dict[int, int] = {}
+_lock = threading.Lock()
+
+
+def load_index(session: Session, bot_id: int) -> BotMemoryIndex:
+    memories = list_bot_memories(session, bot_id, limit=MAX_MEMORIES_PER_BOT)
+    return BotMemoryIndex([_Entry(m.id, f"- {m.key}: {m.value}") for m in memories])
+
+
+def get_bot_memory_index(session: Session, bot_id: int) -> BotMemoryIndex:
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(bot_id)
+        if cached is not None and now - cached[0] < CACHE_TTL_SECONDS:
+            _cache.move_to_end(bot_id)
+            return cached[1]
+        generation = _generations.get(bot_id, 0)
+
+    index = load_index(session, bot_id)
+
+    with _lock:
+        if _generations.get(bot_id, 0) == generation:
+            _cache[bot_id] = (now, index)
+            _cache.move_to_end(bot_id)
+            while len(_cache) > MAX_CACHED_BOTS:
+                _cache.popitem(last=False)
+
+    return index
+
+
+def invalidate_bot_memory(bot_id: int):
+    with _lock:
+        _cache.pop(bot_id, None)
+        _generations[bot_id] = _generations.get(bot_id, 0) + 1
+
+
+def select_bot_memory(
+    session: Session,
+    bot_id: int,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    k: int = DEFAULT_TOP_K,
+) -> List[str]:
+    """Memory lines to inject into this turn's system prompt."""
+    return get_bot_memory_index(session, bot_id).select(token_budget, k)
@@ -0,0 +1,194 @@
+"""
+Copy-on-write conversation forks.
+
+A fork is a Conversation with a parent_id and a fork_message_id. Its
+history is the parent's messages up to and including fork_message_id
+(plus whatever prefix the parent itself inherits), followed by its own
+messages. A fork_message_id of 0 shares nothing: a fork made before the
+first message, e.g. to edit it. Nothing is copied, so storage grows only with the messages
+written after the fork.
+
+conversation_chain() resolves the ancestors with one recursive CTE and
+caches the result; visible_messages() turns a chain into the WHERE clause
+used by history assembly, get_messages and ETags. For a conversation that
+is not a fork that clause is the plain `conversation_id = ?` and no extra
+query is made. A fork's own messages are written after its fork point,
+so ordering by id gives the merged history.
+
+A chain only changes when an ancestor is deleted: hand_over_prefixes()
+first moves the shared prefix to the fork with the latest fork point
+(keeping message ids, so cached pages and ETags stay valid) and makes
+the other forks children of it. With several workers, the other workers'
+cached chains are stale after such a delete until evicted; run with one
+worker per shard or restart them after deleting forked conversations.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import and_, literal, null, or_, update
+from sqlmodel import Session, select
+
+from ..models import Conversation, Message
+
+MAX_FORK_DEPTH = 32
+MAX_CACHED_CHAINS = 10_000
+
+# (conversation_id, last visible message id or None for all of them), child first
+Chain = List[Tuple[int, Optional[int]]]
+
+_chains: "OrderedDict[int, Chain]" = OrderedDict()
+_lock = threading.Lock()
+
+
+# ─────────────────────────────────────────────
+# CHAIN RESOLUTION
+# ─────────────────────────────────────────────
+
+def conversation_chain(db: Session, conv: Conversation) -> Chain:
+    """The conversation followed by its ancestors and their fork points."""
+    if conv.parent_id is None:
+        return [(conv.id, None)]
+
+    with _lock:
+        chain = _chains.get(conv.id)
+        if chain is not None:
+            _chains.move_to_end(conv.id)
+            return chain
+
+    table = Conversation.__table__
+    parent = table.alias("parent")
+    base = (
+        select(table.c.id, table.c.parent_id, table.c.fork_message_id,
+               null().label("upto"), literal(0).label("depth"))
+        .where(table.c.id == conv.id)
+        .cte("chain", recursive=True)
+    )
+    chain_query = base.union_all(
+        select(parent.c.id, parent.c.parent_id, parent.c.fork_message_id,
+               base.c.fork_message_id, base.c.depth + 1)
+        .where(parent.c.id == base.c.parent_id, base.c.depth < MAX_FORK_DEPTH)
+    )
+    chain = [
+        (conversation_id, upto)
+        for conversation_id, upto in db.exec(
+            select(chain_query.c.id, chain_query.c.upto).order_by(chain_query.c.depth)
+        ).all()
+    ]
+
+    with _lock:
+        _chains[conv.id] = chain
+        while len(_chains) > MAX_CACHED_CHAINS:
+            _chains.popitem(last=False)
+    return chain
+
+
+def visible_messages(chain: Chain):
+    """WHERE clause selecting the messages a conversation shows."""
+    clauses = [
+        Message.conversation_id == conversation_id if upto is None
+        else and_(Message.conversation_id == conversation_id, Message.id <= upto)
+        for conversation_id, upto in chain
+    ]
+    return clauses[0] if len(clauses) == 1 else or_(*clauses)
+
+
+def message_scope(db: Session, conv: Conversation):
+    return visible_messages(conversation_chain(db, conv))
+
+
+def invalidate_chains():
+    with _lock:
+        _chains.clear()
+
+
+# ─────────────────────────────────────────────
+# FORK
+# ─────────────────────────────────────────────
+
+def fork_conversation(db: Session, conv: Conversation, message_id: Optional[int], user_id: int) -> Conversation:
+    """
+    New conversation whose history is `conv` up to and including
+    `message_id`, or empty with message_id None (a fork before the first
+    message). The parent is the conversation that owns the message (the
+    root of the chain for an empty fork), so forking a fork inside its
+    inherited prefix does not deepen the chain. Raises ValueError if the
+    message is not in the history. Unsaved: the caller registers and
+    commits it.
+    """
+    chain = conversation_chain(db, conv)
+    if message_id is None:
+        # fork_message_id 0 sits below every message id
+        return Conversation(
+            bot_id=conv.bot_id,
+            user_id=user_id,
+            session_id=str(uuid4()),
+            parent_id=chain[-1][0],
+            fork_message_id=0,
+        )
+
+    msg = db.get(Message, message_id)
+    if not msg or not any(
+        msg.conversation_id == conversation_id and (upto is None or msg.id <= upto)
+        for conversation_id, upto in chain
+    ):
+        raise ValueError("Message is not in this conversation")
+
+    depth = next(i for i, (conversation_id, _) in enumerate(chain) if conversation_id == msg.conversation_id)
+    if len(chain) - depth >= MAX_FORK_DEPTH:
+        raise ValueError("Too many nested forks")
+
+    return Conversation(
+        bot_id=conv.bot_id,
+        user_id=user_id,
+        session_id=str(uuid4()),
+        parent_id=msg.conversation_id,
+        fork_message_id=msg.id,
+    )
+
+
+def hand_over_prefixes(session: Session, conversation_ids: List[int]):
+    """
+    Before deleting `conversation_ids`, give their surviving forks the
+    rows they share. Per deleted parent the fork with the latest fork
+    point inherits the prefix rows and the parent's own fork point; the
+    other forks become its children. Repeats while a fork still points
+    into the deleted set (nested deletes). Commits.
+    """
+    deleted = set(conversation_ids)
+    moved = False
+    while True:
+        children = session.exec(
+            select(Conversation)
+            .where(Conversation.parent_id.in_(deleted), Conversation.id.not_in(deleted))
+            .order_by(Conversation.id)
+        ).all()
+        if not children:
+            break
+
+        by_parent: Dict[int, List[Conversation]] = {}
+        for child in children:
+            by_parent.setdefault(child.parent_id, []).append(child)
+
+        for parent_id, forks in by_parent.items():
+            parent = session.get(Conversation, parent_id)
+            heir = max(forks, key=lambda c: c.fork_message_id)
+            session.execute(
+                update(Message)
+                .where(Message.conversation_id == parent_id, Message.id <= heir.fork_message_id)
+                .values(conversation_id=heir.id)
+                .execution_options(synchronize_session=False)
+            )
+            for fork in forks:
+                if fork is not heir:
+                    fork.parent_id = heir.id
+                    session.add(fork)
+            heir.parent_id = parent.parent_id
+            heir.fork_message_id = parent.fork_message_id
+            session.add(heir)
+        session.commit()
+        moved = True
+
+    if moved:
+        invalidate_chains()
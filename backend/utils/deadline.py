@@ -0,0 +1,147 @@
+"""
+Per-request deadlines and cancellation of chat turns.
+
+A chat turn gets a Deadline from the X-Request-Timeout-Ms header, else
+the bot's `request_timeout_ms` setting, else REQUEST_TIMEOUT_MS. It is
+cancelled early when the client goes away (HTTP disconnect, or the last
+WebSocket on the conversation closing). The deadline is passed to the
+LLM call, which is then cancelled upstream, and is held in a contextvar
+so SQLite statements on the request's thread are interrupted once it has
+passed (see db.py).
+
+Partial replies: a reply is saved only if a client could have seen it.
+  - non-streaming (HTTP) turns: nothing is saved, the user message stays
+  - streamed turns (WebSocket): the tokens already sent are saved, ending
+    in PARTIAL_SUFFIX
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+
+from fastapi import Request
+
+REQUEST_TIMEOUT_MS = int(os.getenv("REQUEST_TIMEOUT_MS", 60_000))
+MAX_REQUEST_TIMEOUT_MS = 5 * 60_000
+TIMEOUT_HEADER = "x-request-timeout-ms"
+PARTIAL_SUFFIX = " …"
+
+TIMEOUT = "timeout"
+DISCONNECT = "disconnect"
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, reason: str = TIMEOUT):
+        super().__init__("Client closed request" if reason == DISCONNECT else "Deadline exceeded")
+        self.reason = reason
+
+    @property
+    def status_code(self) -> int:
+        # 499 as in nginx: nobody reads it, but it shows up in the access log
+        return 499 if self.reason == DISCONNECT else 504
+
+
+class Deadline:
+    def __init__(self, timeout_ms: Optional[float] = None):
+        self.explicit = timeout_ms is not None
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + _clamp(timeout_ms or REQUEST_TIMEOUT_MS) / 1000
+        self.reason: Optional[str] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def apply_default(self, timeout_ms: Optional[float]):
+        """Per-bot default; a timeout sent by the client takes precedence."""
+        if timeout_ms and not self.explicit:
+            self.expires_at = self.started_at + _clamp(float(timeout_ms)) / 1000
+
+    def remaining(self) -> float:
+        return 0.0 if self.reason else max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.reason is not None or time.monotonic() >= self.expires_at
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceeded(self.reason or TIMEOUT)
+
+    def cancel(self, reason: str = DISCONNECT):
+        with self._lock:
+            if self.reason:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]) -> Iterator[None]:
+        """Run `callback` if the deadline is cancelled while inside the block."""
+        with self._lock:
+            fire_now = self.reason is not None
+            if not fire_now:
+                self._callbacks.append(callback)
+        if fire_now:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+
+def _clamp(timeout_ms: float) -> float:
+    return min(max(timeout_ms, 1.0), MAX_REQUEST_TIMEOUT_MS)
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[None]:
+    """Set (or with None, lift) the deadline for DB calls in this context."""
+    token = _current.set(deadline)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+# ─────────────────────────────────────────────
+# REQUEST DEPENDENCY
+# ─────────────────────────────────────────────
+
+def _header_timeout(request: Request) -> Optional[float]:
+    try:
+        return float(request.headers[TIMEOUT_HEADER])
+    except (KeyError, ValueError):
+        return None
+
+
+async def _watch_disconnect(request: Request, deadline: Deadline):
+    # The body has been read by the time dependencies run, so the next
+    # ASGI message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            deadline.cancel(DISCONNECT)
+            return
+
+
+async def request_deadline(request: Request) -> AsyncIterator[Deadline]:
+    """Dependency: this request's Deadline, cancelled if the client disconnects."""
+    deadline = Deadline(_header_timeout(request))
+    watcher = asyncio.ensure_future(_watch_disconnect(request, deadline))
+    try:
+        yield deadline
+    finally:
+        watcher.cancel()
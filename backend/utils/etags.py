@@ -0,0 +1,94 @@
+"""
+Weak ETags and conditional GETs.
+
+Each cacheable resource has a cheap version computed with one aggregate
+query instead of loading its rows:
+
+    conversation messages   (message count, last message id; a fork counts its inherited prefix)
+    bot list / session list (row count, max id, newest created_at)
+
+Messages are append-only and ids only grow, so the pair changes whenever
+the history does. A client that sends back the ETag in If-None-Match gets
+304 Not Modified with no body.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from ..models import Bot, Conversation, ConversationArchive, Message
+from .branches import message_scope
+from ..sharding import for_each_shard
+
+# The browser may store responses but must revalidate them
+REVALIDATE = "private, no-cache"
+
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison (RFC 9110 13.1.2) against an If-None-Match header."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def check_etag(request: Request, response: Response, etag: str, cache_control: str = REVALIDATE) -> Optional[Response]:
+    """
+    Return a 304 response if the client already has this version;
+    otherwise put the validators on `response` and return None.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+# ─────────────────────────────────────────────
+# VERSIONS
+# ─────────────────────────────────────────────
+
+def conversation_version(db: Session, conv: Conversation) -> tuple:
+    count, last_id = db.exec(
+        select(func.count(Message.id), func.max(Message.id)).where(message_scope(db, conv))
+    ).one()
+
+    # Archived: same version as when the rows were hot, without restoring them
+    if not count and (conv.metadata_json or {}).get("archived"):
+        archived = db.exec(
+            select(ConversationArchive.message_count, ConversationArchive.last_message_id)
+            .where(ConversationArchive.conversation_id == conv.id)
+        ).first()
+        if archived:
+            return tuple(archived)
+
+    return count, last_id
+
+
+def bot_list_version(db: Session, owner_id: int) -> tuple:
+    return tuple(db.exec(
+        select(func.count(Bot.id), func.max(Bot.id), func.max(Bot.created_at)).where(Bot.owner_id == owner_id)
+    ).one())
+
+
+def session_list_version(db: Session, bot_id: int) -> tuple:
+    # max(created_at) catches a deleted newest row being replaced by one with the same id
+    # (summed over shards when sharding is on)
+    parts = for_each_shard(db, lambda shard: shard.exec(
+        select(func.count(Conversation.id), func.max(Conversation.id), func.max(Conversation.created_at))
+        .where(Conversation.bot_id == bot_id)
+    ).all())
+    return (
+        sum(count for count, _, _ in parts),
+        max((last for _, last, _ in parts if last is not None), default=None),
+        max((created for _, _, created in parts if created is not None), default=None),
+    )
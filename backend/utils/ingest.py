@@ -0,0 +1,205 @@
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime
+from typing import IO, Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from ..models import TrainingDataset, TrainingExample
+
+BATCH_SIZE = 1000
+
+PROMPT_KEYS = ("prompt", "input", "question", "instruction", "user")
+RESPONSE_KEYS = ("response", "output", "answer", "completion", "bot")
+
+
+# ─────────────────────────────────────────────
+# PARSING (incremental, one record at a time)
+# ─────────────────────────────────────────────
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    """Return "csv" or "jsonl" based on the upload name / content type."""
+    name = (filename or "").lower()
+    if name.endswith(".csv") or (content_type or "").startswith("text/csv"):
+        return "csv"
+    return "jsonl"
+
+
+def _pick(record: Dict, keys) -> Optional[str]:
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def normalize_record(record) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Map a raw record to (prompt, response).
+    Supports flat {"prompt": .., "response": ..} style rows and
+    chat style {"messages": [{"role": "user", ...}, {"role": "assistant", ...}]}.
+    """
+    if not isinstance(record, dict):
+        return None
+
+    messages = record.get("messages")
+    if isinstance(messages, list):
+        prompt = response = None
+        for m in messages:
+            if not isinstance(m, dict):
+                continue
+            if m.get("role") == "user" and prompt is None:
+                prompt = m.get("content")
+            elif m.get("role") in ("assistant", "bot") and prompt is not None:
+                response = m.get("content")
+                break
+        return (str(prompt), response and str(response)) if prompt else None
+
+    prompt = _pick(record, PROMPT_KEYS)
+    if not prompt:
+        return None
+    return prompt, _pick(record, RESPONSE_KEYS)
+
+
+def iter_records(stream: IO[bytes], fmt: str) -> Iterator[Optional[Dict]]:
+    """
+    Yield parsed records from a binary stream without reading it all.
+    Unparseable rows are yielded as None so callers can count them.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline="")
+    try:
+        if fmt == "csv":
+            for row in csv.DictReader(text):
+                yield row
+        else:
+            for line in text:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    finally:
+        # Leave the underlying upload file open for the caller
+        text.detach()
+
+
+def content_hash(prompt: str, response: Optional[str]) -> str:
+    """Whitespace-insensitive hash used to dedup examples inside a dataset."""
+    key = " ".join(prompt.split()) + "\x1f" + " ".join((response or "").split())
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# ─────────────────────────────────────────────
+# INGESTION
+# ─────────────────────────────────────────────
+
+def _insert_batch(session: Session, rows) -> int:
+    stmt = sqlite_insert(TrainingExample.__table__).on_conflict_do_nothing(
+        index_elements=["dataset_id", "content_hash"]
+    )
+    result = session.execute(stmt, rows)
+    return max(result.rowcount, 0)
+
+
+def _tell(stream) -> Optional[int]:
+    try:
+        return stream.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def ingest_stream(
+    session: Session,
+    dataset: TrainingDataset,
+    stream: IO[bytes],
+    fmt: str,
+    total_bytes: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Dict:
+    """
+    Parse `stream` incrementally and insert its examples into `dataset`.
+
+    Rows are written in batches of `batch_size` (duplicates are skipped by the
+    (dataset_id, content_hash) unique constraint), and progress is committed
+    to `dataset.data` after every batch so it can be polled while running.
+    Memory use is bounded by the batch size, not by the upload size.
+    """
+    stats = dict(dataset.data or {})
+    stats.update({
+        "format": fmt,
+        "status": "ingesting",
+        "total_bytes": (stats.get("total_bytes") or 0) + (total_bytes or 0) or None,
+    })
+    for key in ("rows_read", "rows_inserted", "duplicates", "invalid", "bytes_read"):
+        stats.setdefault(key, 0)
+
+    start_offset = _tell(stream) or 0
+    bytes_base = stats["bytes_read"]
+    batch = []
+
+    def flush():
+        now = datetime.utcnow()
+        for row in batch:
+            row["created_at"] = now
+        inserted = _insert_batch(session, batch)
+        stats["rows_inserted"] += inserted
+        stats["duplicates"] += len(batch) - inserted
+        position = _tell(stream)
+        if position is not None:
+            stats["bytes_read"] = bytes_base + position - start_offset
+        batch.clear()
+        dataset.data = dict(stats)
+        session.add(dataset)
+        session.commit()
+
+    try:
+        for record in iter_records(stream, fmt):
+            stats["rows_read"] += 1
+            pair = normalize_record(record)
+            if pair is None:
+                stats["invalid"] += 1
+                continue
+
+            prompt, response = pair
+            batch.append({
+                "dataset_id": dataset.id,
+                "bot_id": dataset.bot_id,
+                "prompt": prompt,
+                "response": response,
+                "content_hash": content_hash(prompt, response),
+            })
+            if len(batch) >= batch_size:
+                flush()
+
+        if batch:
+            flush()
+    except Exception:
+        session.rollback()
+        stats["status"] = "failed"
+        dataset.data = dict(stats)
+        session.add(dataset)
+        session.commit()
+        raise
+
+    if total_bytes:
+        stats["bytes_read"] = bytes_base + total_bytes
+    stats["status"] = "ready"
+    stats["examples"] = count_examples(session, dataset.id)
+    dataset.data = dict(stats)
+    session.add(dataset)
+    session.commit()
+    return stats
+
+
+def count_examples(session: Session, dataset_id: int) -> int:
+    return session.exec(
+        select(func.count()).select_from(TrainingExample).where(
+            TrainingExample.dataset_id == dataset_id
+        )
+    ).one()
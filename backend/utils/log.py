@@ -0,0 +1,191 @@
+"""
+Structured, non-blocking logging.
+
+Request threads only build a LogRecord and put it on a queue; a
+QueueListener thread formats it (JSON by default) and writes to stdout.
+Records get the current request id, message text / memory values are
+redacted before they leave the request thread, and high-volume DEBUG
+events can be sampled.
+
+Configuration (environment):
+    LOG_LEVEL=INFO                     root level
+    LOG_LEVELS=backend.sql=DEBUG,...   per-module levels
+    LOG_FORMAT=json|text
+    LOG_DEBUG_SAMPLE=1.0               fraction of DEBUG records kept
+    LOG_REDACT=1                       set to 0 to log raw values locally
+
+Usage:
+    logger = logging.getLogger(__name__)
+    logger.info("message saved", extra={"conversation_id": conv.id, "text": text})
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Fields whose values are user content / secrets
+REDACT_KEYS = {
+    "text", "message", "reply", "prompt", "memory", "value", "values",
+    "password", "token", "authorization", "params",
+}
+
+# Chatty third-party loggers (groq logs full request bodies at DEBUG);
+# LOG_LEVELS can still override these
+DEFAULT_MODULE_LEVELS = {
+    "groq": "INFO",
+    "httpx": "WARNING",
+    "httpcore": "WARNING",
+    "passlib": "INFO",
+    "asyncio": "INFO",
+}
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and not k.startswith("_")}
+
+
+def redact(value) -> str:
+    size = len(value) if isinstance(value, (str, bytes, list, dict, tuple)) else None
+    return "[redacted]" if size is None else f"[redacted len={size}]"
+
+
+# ─────────────────────────────────────────────
+# FILTERS (run on the calling thread)
+# ─────────────────────────────────────────────
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RedactionFilter(logging.Filter):
+    def filter(self, record):
+        for key in _extra_fields(record):
+            if key.lower() in REDACT_KEYS:
+                setattr(record, key, redact(getattr(record, key)))
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG records; `extra={"sample_rate": x}` overrides."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = getattr(record, "sample_rate", self.rate)
+        return rate >= 1 or random.random() < rate
+
+
+# ─────────────────────────────────────────────
+# FORMATTERS (run on the listener thread)
+# ─────────────────────────────────────────────
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in _extra_fields(record).items():
+            if key != "sample_rate" and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extra = {k: v for k, v in _extra_fields(record).items() if k not in ("request_id", "sample_rate")}
+        return f"{line} {json.dumps(extra, default=str)}" if extra else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Freeze the message and traceback text here, but leave formatting
+        # (the expensive part) to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ─────────────────────────────────────────────
+# SETUP
+# ─────────────────────────────────────────────
+
+def setup_logging(stream=None):
+    """Install the queue-based pipeline on the root logger (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if os.getenv("LOG_FORMAT") == "text" else JsonFormatter())
+
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(DebugSamplingFilter(float(os.getenv("LOG_DEBUG_SAMPLE", 1.0))))
+    handler.addFilter(ContextFilter())
+    if os.getenv("LOG_REDACT", "1") != "0":
+        handler.addFilter(RedactionFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    levels = dict(DEFAULT_MODULE_LEVELS)
+    for item in filter(None, os.getenv("LOG_LEVELS", "").split(",")):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    # uvicorn's own loggers go through the same pipeline
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
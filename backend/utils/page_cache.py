@@ -0,0 +1,83 @@
+"""
+Cache of pre-serialized message history pages.
+
+A page that ends before a given message id (?before_id=) rarely changes,
+so its JSON body is rendered once and served as bytes afterwards,
+together with its gzip encoding and an ETag of its content (clients
+revalidate; a page whose content changed gets a new tag).
+Everything that rewrites a conversation's messages (delete, archive,
+restore) calls invalidate_conversation().
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from .responses import gzip_bytes
+
+MAX_CACHE_BYTES = 32 * 1024 * 1024
+
+PageKey = Tuple[int, int, int]  # (conversation_id, before_id, limit)
+
+
+class CachedPage:
+    __slots__ = ("body", "gzip", "etag", "next_before_id")
+
+    def __init__(self, body: bytes, next_before_id: Optional[int]):
+        self.body = body
+        self.gzip = gzip_bytes(body)
+        self.etag = f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+        self.next_before_id = next_before_id
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip)
+
+
+class PageCache:
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._pages: "OrderedDict[PageKey, CachedPage]" = OrderedDict()
+        self._by_conversation: Dict[int, Set[PageKey]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: PageKey) -> Optional[CachedPage]:
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def put(self, key: PageKey, page: CachedPage) -> CachedPage:
+        with self._lock:
+            self._drop(key)
+            self._pages[key] = page
+            self._by_conversation.setdefault(key[0], set()).add(key)
+            self.bytes += page.size
+            while self.bytes > self.max_bytes and self._pages:
+                self._drop(next(iter(self._pages)))
+        return page
+
+    def invalidate_conversation(self, conversation_id: int):
+        with self._lock:
+            for key in list(self._by_conversation.get(conversation_id, ())):
+                self._drop(key)
+
+    def _drop(self, key: PageKey):
+        page = self._pages.pop(key, None)
+        if page is None:
+            return
+        self.bytes -= page.size
+        keys = self._by_conversation.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_conversation[key[0]]
+
+
+history_pages = PageCache()
+
+
+def invalidate_conversation(conversation_id: int):
+    history_pages.invalidate_conversation(conversation_id)
@@ -0,0 +1,152 @@
+"""
+Background pipeline for work that follows a chat turn.
+
+Only what the reply depends on runs inline (saving the messages, the
+prompt, the LLM call). The rest, such as applying memory commands found
+in the user's message, is submitted here and runs on a small thread pool
+after the response has gone out.
+
+Jobs with the same key, a (user_id, bot_id) pair, run one at a time in
+submission order, and the next turn for that pair waits for them
+(wait_idle) before it reads memory. So a turn still sees everything the
+previous turns wrote, just not what its own message asks to remember:
+that message is in the history anyway.
+
+The queue is bounded: when POST_TURN_QUEUE_SIZE jobs are pending,
+submit() blocks until there is room. On shutdown, flush() runs what is
+left. With POST_TURN_WORKERS=0 jobs run inline, as before.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Hashable, Tuple
+
+POST_TURN_WORKERS = int(os.getenv("POST_TURN_WORKERS", 2))
+POST_TURN_QUEUE_SIZE = int(os.getenv("POST_TURN_QUEUE_SIZE", 1000))
+WAIT_IDLE_SECONDS = 2.0
+FLUSH_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+Job = Tuple[str, Callable[[], None], float]
+
+
+class PostTurnExecutor:
+    def __init__(self, workers: int = POST_TURN_WORKERS, max_pending: int = POST_TURN_QUEUE_SIZE):
+        self.workers = workers
+        self.max_pending = max(1, max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="post-turn") if workers else None
+        self._queues: Dict[Hashable, Deque[Job]] = {}
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.completed = 0
+        self.failed = 0
+        self.max_lag_ms = 0.0
+
+    # Keys with a queue are being drained by exactly one worker; the worker
+    # removes the queue once it is empty, under the same lock as submit()
+
+    def submit(self, key: Hashable, name: str, fn: Callable[[], None]):
+        """Run `fn` after the earlier jobs for `key`."""
+        if self._pool is None or self._closed:
+            self._run(name, fn, time.monotonic())
+            return
+
+        with self._cond:
+            while self._pending >= self.max_pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                inline = True
+            else:
+                inline = False
+                self._pending += 1
+                queue = self._queues.get(key)
+                start = queue is None
+                if start:
+                    queue = self._queues[key] = deque()
+                queue.append((name, fn, time.monotonic()))
+        if inline:
+            self._run(name, fn, time.monotonic())
+        elif start:
+            self._pool.submit(self._drain, key)
+
+    def _drain(self, key: Hashable):
+        while True:
+            with self._cond:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    self._cond.notify_all()
+                    return
+                name, fn, queued_at = queue[0]
+            self._run(name, fn, queued_at)
+            with self._cond:
+                queue.popleft()
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def _run(self, name: str, fn: Callable[[], None], queued_at: float):
+        lag_ms = (time.monotonic() - queued_at) * 1000
+        ok = True
+        try:
+            fn()
+        except Exception as e:
+            ok = False
+            logger.warning("post-turn job failed", extra={"job": name, "error": f"{type(e).__name__}: {e}"})
+        with self._cond:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def wait_idle(self, key: Hashable, timeout: float = WAIT_IDLE_SECONDS) -> bool:
+        """Wait for the pending jobs of `key`; False if they are still running after `timeout`."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while key in self._queues:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    logger.warning("post-turn jobs still pending", extra={"key": repr(key)})
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def flush(self, timeout: float = FLUSH_SECONDS) -> bool:
+        """Wait until every submitted job has run."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def shutdown(self, timeout: float = FLUSH_SECONDS):
+        """Run the pending jobs, then run later submissions inline."""
+        if not self.flush(timeout):
+            logger.warning("post-turn jobs dropped at shutdown", extra={"pending": self._pending})
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "active_keys": len(self._queues),
+                "completed": self.completed,
+                "failed": self.failed,
+                "max_lag_ms": round(self.max_lag_ms, 1),
+            }
+
+
+post_turn = PostTurnExecutor()
@@ -0,0 +1,183 @@
+"""
+On-demand sampling profiler for a live process.
+
+A daemon thread snapshots every thread's Python stack with
+sys._current_frames() at a fixed interval. Nothing is installed while no
+profile is running, so the cost when it is off is zero. Output is either
+collapsed stacks (flamegraph.pl / speedscope "collapsed" import) or a
+speedscope JSON document.
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_INTERVAL_S = 0.005
+MAX_STACK_DEPTH = 128
+MAX_KEPT_PROFILES = 20
+
+# Leaf frames of threads that are parked waiting for work
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("_asyncio.py", "run"),   # anyio worker thread waiting on its queue
+    ("thread.py", "_worker"),
+}
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+
+class SamplingProfiler:
+    def __init__(
+        self,
+        interval_s: float = DEFAULT_INTERVAL_S,
+        include_idle: bool = False,
+        exclude_threads=(),
+    ):
+        self.interval_s = interval_s
+        self.include_idle = include_idle
+        self.exclude_threads = set(exclude_threads)
+        self.samples: Dict[str, Counter] = {}  # thread name -> Counter(stack tuple)
+        self.sample_count = 0
+        self.started_at: Optional[float] = None
+        self.elapsed_s = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ── sampling ──
+
+    def _stack(self, frame) -> Tuple[Frame, ...]:
+        stack: List[Frame] = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _is_idle(self, stack: Tuple[Frame, ...]) -> bool:
+        name, filename, _ = stack[-1]
+        return (os.path.basename(filename), name) in IDLE_LEAVES
+
+    def _run(self):
+        skip = self.exclude_threads | {threading.get_ident()}
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident in skip:
+                    continue
+                stack = self._stack(frame)
+                if not stack or (not self.include_idle and self._is_idle(stack)):
+                    continue
+                thread = names.get(ident, str(ident))
+                self.samples.setdefault(thread, Counter())[stack] += 1
+            self.sample_count += 1
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.elapsed_s = time.perf_counter() - (self.started_at or time.perf_counter())
+        return self
+
+    # ── output ──
+
+    @staticmethod
+    def _label(frame: Frame) -> str:
+        name, filename, line = frame
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    def collapsed(self) -> str:
+        lines = []
+        for thread, stacks in self.samples.items():
+            for stack, count in stacks.most_common():
+                path = ";".join([thread] + [self._label(f).replace(";", ":") for f in stack])
+                lines.append(f"{path} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str = "profile") -> Dict:
+        frames: List[Dict] = []
+        index: Dict[Frame, int] = {}
+        interval_ms = self.interval_s * 1000
+        profiles = []
+
+        for thread, stacks in self.samples.items():
+            samples, weights = [], []
+            for stack, count in stacks.items():
+                ids = []
+                for frame in stack:
+                    if frame not in index:
+                        index[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    ids.append(index[frame])
+                samples.append(ids)
+                weights.append(count * interval_ms)
+            profiles.append({
+                "type": "sampled",
+                "name": thread,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "chatbot-sampling-profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+# ─────────────────────────────────────────────
+# ONE PROFILE AT A TIME + RECENT RESULTS
+# ─────────────────────────────────────────────
+
+_active_lock = threading.Lock()
+_profiles: "OrderedDict[str, SamplingProfiler]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def try_start(interval_s: float = DEFAULT_INTERVAL_S, exclude_caller: bool = False) -> Optional[SamplingProfiler]:
+    """Start a profile, or None if one is already running."""
+    if not _active_lock.acquire(blocking=False):
+        return None
+    try:
+        exclude = [threading.get_ident()] if exclude_caller else []
+        return SamplingProfiler(interval_s, exclude_threads=exclude).start()
+    except Exception:
+        _active_lock.release()
+        raise
+
+
+def finish(profiler: SamplingProfiler) -> str:
+    """Stop a profile started with try_start() and keep it; returns its id."""
+    try:
+        profiler.stop()
+    finally:
+        _active_lock.release()
+
+    profile_id = uuid.uuid4().hex
+    with _profiles_lock:
+        _profiles[profile_id] = profiler
+        while len(_profiles) > MAX_KEPT_PROFILES:
+            _profiles.popitem(last=False)
+    return profile_id
+
+
+def get_profile(profile_id: str) -> Optional[SamplingProfiler]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
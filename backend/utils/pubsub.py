@@ -0,0 +1,173 @@
+"""
+In-process pub/sub hub for pushing chat events to WebSocket clients.
+
+Every open socket subscribes to its conversation's channel with a bounded
+queue. Publishing never blocks: when a subscriber's queue is full, token
+events for it are dropped (the final message carries the full text
+anyway) and if even a message event does not fit, the subscriber is
+marked overflowed and its socket is closed so the client refetches.
+
+With several workers, set PUBSUB_URL=redis://host:6379/0 (needs the
+`redis` package) so events published in one worker reach sockets held by
+the others. Without it everything stays in this process.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Callable, Dict, Optional, Set
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+PUBSUB_URL = os.getenv("PUBSUB_URL")
+SUBSCRIBER_QUEUE_SIZE = 256
+CHANNEL_PREFIX = "chat:"
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_channel(conversation_id: int) -> str:
+    return f"{CHANNEL_PREFIX}conversation:{conversation_id}"
+
+
+class Subscriber:
+    def __init__(self, channel: str, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.channel = channel
+        self.queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = asyncio.Event()
+        self.dropped = 0
+
+    def offer(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if event.get("type") != "token":
+                self.overflowed.set()
+
+
+# ─────────────────────────────────────────────
+# BACKENDS
+# ─────────────────────────────────────────────
+
+class LocalBackend:
+    """Single process: publishing is delivering."""
+
+    async def start(self, deliver: Callable[[str, dict], None]):
+        self._deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, event: dict):
+        self._deliver(channel, event)
+
+
+class RedisBackend:
+    """Fan out through Redis PUBLISH so every worker sees every event."""
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("PUBSUB_URL needs the `redis` package")
+        self.url = url
+        self._origin = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self._publish_lock = asyncio.Lock()  # keep per-process publish order
+
+    async def start(self, deliver: Callable[[str, dict], None]):
+        self._deliver = deliver
+        self._redis = aioredis.from_url(self.url)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(CHANNEL_PREFIX + "*")
+        self._task = asyncio.create_task(self._reader())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        await self._pubsub.aclose()
+        await self._redis.aclose()
+
+    async def publish(self, channel: str, event: dict):
+        # Local subscribers get it right away, other workers via Redis
+        self._deliver(channel, event)
+        async with self._publish_lock:
+            await self._redis.publish(channel, json.dumps({"origin": self._origin, "event": event}))
+
+    async def _reader(self):
+        async for item in self._pubsub.listen():
+            if item.get("type") != "pmessage":
+                continue
+            try:
+                data = json.loads(item["data"])
+            except ValueError:
+                logger.warning("ignoring malformed pubsub payload", extra={"channel": item.get("channel")})
+                continue
+            if data.get("origin") != self._origin:
+                channel = item["channel"]
+                self._deliver(channel.decode() if isinstance(channel, bytes) else channel, data["event"])
+
+
+# ─────────────────────────────────────────────
+# HUB
+# ─────────────────────────────────────────────
+
+class Hub:
+    def __init__(self, backend=None):
+        self.backend = backend or LocalBackend()
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.backend.start(self._deliver)
+
+    async def stop(self):
+        await self.backend.stop()
+        self._loop = None
+
+    def subscribe(self, channel: str) -> Subscriber:
+        sub = Subscriber(channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            subs = self._subscribers.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.channel]
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._subscribers.get(channel, ()))
+
+    def _deliver(self, channel: str, event: dict):
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            sub.offer(event)
+
+    async def publish(self, channel: str, event: dict):
+        await self.backend.publish(channel, event)
+
+    def publish_threadsafe(self, channel: str, event: dict):
+        """Publish from sync code (threadpool endpoints); no-op before startup."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.publish(channel, event), loop)
+
+
+hub = Hub(RedisBackend(PUBSUB_URL) if PUBSUB_URL else None)
+
+
+def publish_message(conversation_id: int, message: dict):
+    """Push a saved message to every socket open on its conversation."""
+    hub.publish_threadsafe(conversation_channel(conversation_id), {"type": "message", "message": message})
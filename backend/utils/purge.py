@@ -0,0 +1,253 @@
+"""
+Set-based deletion of chat history.
+
+Small deletes (one conversation) run inline. Large purges (every session
+of a bot, or all of a user's data) run as background jobs that delete in
+short batches and commit between them, so the SQLite writer lock is never
+held for more than a few milliseconds at a time.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, func, or_
+from sqlmodel import Session, select
+
+from ..models import Bot, Conversation, ConversationArchive, ConversationShard, Message, UserMemory
+from ..sharding import bind_shard, bind_user, user_shards
+from .archive import forget_archives
+from .branches import hand_over_prefixes
+from .page_cache import invalidate_conversation
+from .post_turn import post_turn
+from .session_cache import forget_conversation
+from .turn_buffer import invalidate_turns
+
+PURGE_CONVERSATION_BATCH = 200
+PURGE_MESSAGE_BATCH = 2000
+PURGE_PAUSE_S = 0.005
+MAX_TRACKED_JOBS = 1000
+
+
+# ─────────────────────────────────────────────
+# OWNERSHIP
+# ─────────────────────────────────────────────
+
+def owned_conversations(user_id: int, bot_id: Optional[int] = None):
+    """
+    SELECT of the conversation ids that belong to a user. Conversations
+    created before user_id was recorded belong to the owner of their bot.
+    """
+    query = (
+        select(Conversation.id)
+        .outerjoin(Bot, Bot.id == Conversation.bot_id)
+        .where(or_(
+            Conversation.user_id == user_id,
+            and_(Conversation.user_id.is_(None), Bot.owner_id == user_id),
+        ))
+    )
+    if bot_id is not None:
+        query = query.where(Conversation.bot_id == bot_id)
+    return query
+
+
+def can_read_conversation(session: Session, conv: Conversation, user_id: int) -> bool:
+    """Its user and the bot's owner; legacy rows of system bots are readable by everyone."""
+    if conv.user_id is not None and conv.user_id == user_id:
+        return True
+    bot = session.get(Bot, conv.bot_id)
+    if bot is None:
+        return False
+    if bot.owner_id is not None:
+        return bot.owner_id == user_id
+    return conv.user_id is None
+
+
+def can_delete_conversation(session: Session, conv: Conversation, user_id: int) -> bool:
+    """May `user_id` delete (or fork) this conversation?"""
+    if conv.user_id is not None:
+        return conv.user_id == user_id
+
+    # Legacy rows belong to the bot's owner, as in owned_conversations().
+    # On system bots (no owner) everyone can read them, but nobody owns them
+    bot = session.get(Bot, conv.bot_id)
+    return bot is not None and bot.owner_id is not None and bot.owner_id == user_id
+
+
+# ─────────────────────────────────────────────
+# SET-BASED DELETES
+# ─────────────────────────────────────────────
+
+def delete_messages_in_batches(
+    session: Session,
+    conversation_ids: List[int],
+    batch: int = PURGE_MESSAGE_BATCH,
+    pause: float = 0.0,
+) -> int:
+    """DELETE the conversations' messages `batch` rows per transaction."""
+    deleted = 0
+    while True:
+        ids = select(Message.id).where(
+            Message.conversation_id.in_(conversation_ids)
+        ).limit(batch)
+        n = session.execute(
+            delete(Message).where(Message.id.in_(ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+        deleted += n
+        if n < batch:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def delete_conversations(
+    session: Session,
+    conversation_ids: List[int],
+    batch: int = PURGE_MESSAGE_BATCH,
+    pause: float = 0.0,
+) -> int:
+    """
+    Remove conversations with their messages and archives.
+    Returns the number of messages deleted.
+    """
+    if not conversation_ids:
+        return 0
+
+    # Surviving forks keep the prefix they share with these conversations
+    hand_over_prefixes(session, conversation_ids)
+    messages = delete_messages_in_batches(session, conversation_ids, batch, pause)
+
+    no_sync = {"synchronize_session": False}
+    forget_archives(session, conversation_ids)
+    session.execute(
+        delete(ConversationArchive)
+        .where(ConversationArchive.conversation_id.in_(conversation_ids))
+        .execution_options(**no_sync)
+    )
+    session.execute(
+        delete(Conversation)
+        .where(Conversation.id.in_(conversation_ids))
+        .execution_options(**no_sync)
+    )
+    session.execute(
+        delete(ConversationShard)
+        .where(ConversationShard.conversation_id.in_(conversation_ids))
+        .execution_options(**no_sync)
+    )
+    session.commit()
+    session.expunge_all()
+    for conversation_id in conversation_ids:
+        invalidate_conversation(conversation_id)
+        forget_conversation(conversation_id)
+        invalidate_turns(conversation_id)
+    return messages
+
+
+# ─────────────────────────────────────────────
+# BACKGROUND PURGE JOBS
+# ─────────────────────────────────────────────
+
+_jobs: "OrderedDict[str, Dict]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def create_purge_job(user_id: int, bot_id: Optional[int] = None, include_memory: bool = False) -> Dict:
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "bot_id": bot_id,
+        "include_memory": include_memory,
+        "status": "queued",
+        "conversations_total": None,
+        "conversations_deleted": 0,
+        "messages_deleted": 0,
+        "memories_deleted": 0,
+        "created_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+        "error": None,
+    }
+    with _jobs_lock:
+        _jobs[job["job_id"]] = job
+        while len(_jobs) > MAX_TRACKED_JOBS:
+            _jobs.popitem(last=False)
+    return dict(job)
+
+
+def get_purge_job(job_id: str, user_id: int) -> Optional[Dict]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job and job["user_id"] == user_id else None
+
+
+def _set(job_id: str, **values):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job:
+            job.update(values)
+
+
+def _add(job_id: str, **counts):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job:
+            for key, n in counts.items():
+                job[key] += n
+
+
+def run_purge_job(job_id: str, make_session: Callable[[], Session]):
+    """Worker body; call from a background task / thread."""
+    with _jobs_lock:
+        job = dict(_jobs[job_id])
+
+    user_id, bot_id = job["user_id"], job["bot_id"]
+    _set(job_id, status="running")
+
+    try:
+        with make_session() as session:
+            shards = user_shards(session, user_id, bot_id)
+            total = 0
+            for shard in shards:
+                bind_shard(session, shard)
+                scope = owned_conversations(user_id, bot_id).subquery()
+                total += session.exec(select(func.count()).select_from(scope)).one()
+            _set(job_id, conversations_total=total)
+
+            for shard in shards:
+                bind_shard(session, shard)
+                while True:
+                    ids = session.exec(
+                        owned_conversations(user_id, bot_id)
+                        .order_by(Conversation.id)
+                        .limit(PURGE_CONVERSATION_BATCH)
+                    ).all()
+                    if not ids:
+                        break
+
+                    messages = delete_conversations(session, ids, pause=PURGE_PAUSE_S)
+                    _add(job_id, conversations_deleted=len(ids), messages_deleted=messages)
+                    time.sleep(PURGE_PAUSE_S)
+
+            if job["include_memory"]:
+                # Memory commands of turns before the purge must not land after it
+                post_turn.flush()
+                bind_user(session, user_id)
+                query = delete(UserMemory).where(UserMemory.user_id == user_id)
+                if bot_id is not None:
+                    query = query.where(UserMemory.bot_id == bot_id)
+                memories = session.execute(query).rowcount
+                session.commit()
+                _add(job_id, memories_deleted=memories)
+
+        _set(job_id, status="done", finished_at=datetime.utcnow().isoformat())
+
+    except Exception as e:
+        _set(
+            job_id,
+            status="failed",
+            error=f"{type(e).__name__}: {e}",
+            finished_at=datetime.utcnow().isoformat(),
+        )
+        raise
@@ -0,0 +1,121 @@
+"""
+Per-request SQL instrumentation.
+
+instrument_engine() hooks the engine's cursor events. Every statement is
+added to the QueryStats of the current request (held in a contextvar,
+which FastAPI copies into the threadpool that runs sync endpoints), and
+statements slower than SLOW_QUERY_MS are logged ("backend.sql") with
+their bound parameters and an EXPLAIN QUERY PLAN excerpt.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+SQL_DEBUG = os.getenv("SQL_DEBUG", "").lower() in ("1", "true", "yes")
+MAX_LOGGED_PARAM_CHARS = 200
+
+logger = logging.getLogger("backend.sql")
+
+
+class QueryStats:
+    __slots__ = ("count", "total_ms", "slowest_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+
+    def add(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.slowest_ms = max(self.slowest_ms, elapsed_ms)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Collect the statements executed in this context (e.g. one request)."""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+# ─────────────────────────────────────────────
+# SLOW QUERY LOG
+# ─────────────────────────────────────────────
+
+def _short_params(parameters) -> str:
+    text = repr(parameters)
+    return text if len(text) <= MAX_LOGGED_PARAM_CHARS else text[:MAX_LOGGED_PARAM_CHARS] + "…"
+
+
+def _plan_excerpt(cursor, statement: str, parameters) -> str:
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return ""
+    try:
+        rows = cursor.connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    except Exception as e:  # the plan is best-effort diagnostics
+        return f"(plan unavailable: {e})"
+    return "; ".join(str(row[-1]) for row in rows)
+
+
+def _log_slow(cursor, statement, parameters, elapsed_ms, executemany):
+    logger.warning(
+        "slow query",
+        extra={
+            "duration_ms": round(elapsed_ms, 1),
+            "statement": " ".join(statement.split()),
+            "params": _short_params(parameters),  # redacted unless LOG_REDACT=0
+            "plan": None if executemany else _plan_excerpt(cursor, statement, parameters) or None,
+        },
+    )
+
+
+# ─────────────────────────────────────────────
+# ENGINE HOOKS
+# ─────────────────────────────────────────────
+
+def instrument_engine(engine, slow_query_ms: float = SLOW_QUERY_MS):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+
+        stats = _current.get()
+        if stats is not None:
+            stats.add(elapsed_ms)
+
+        if elapsed_ms >= slow_query_ms:
+            _log_slow(cursor, statement, parameters, elapsed_ms, executemany)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            starts.pop()
+
+    return engine
+
+
+def add_query_headers(response, stats: QueryStats):
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["X-DB-Time-Ms"] = f"{stats.total_ms:.1f}"
+    response.headers["Server-Timing"] = f"db;dur={stats.total_ms:.1f};desc=\"{stats.count} queries\""
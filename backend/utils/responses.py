@@ -0,0 +1,110 @@
+"""
+Response encoding: fast JSON and compression.
+
+FastJSONResponse uses orjson when it is installed (several times faster
+than the stdlib encoder on message lists) and falls back to Starlette's
+JSONResponse otherwise. CompressionMiddleware is Starlette's gzip
+middleware plus brotli ("br") when the `brotli` package is available,
+choosing by the q-values of Accept-Encoding.
+"""
+import gzip
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6      # level 9 costs ~2x the CPU for ~1% smaller bodies
+BROTLI_QUALITY = 5
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def gzip_bytes(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """
+    Does an Accept-Encoding header allow `coding`? An entry for the coding
+    itself decides, otherwise "*" does; q=0 means "not acceptable".
+    """
+    explicit = wildcard = None
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == coding:
+            explicit = q
+        elif name == "*":
+            wildcard = q
+    q = explicit if explicit is not None else wildcard
+    return bool(q)
+
+
+# ─────────────────────────────────────────────
+# COMPRESSION MIDDLEWARE
+# ─────────────────────────────────────────────
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int = BROTLI_QUALITY):
+        super().__init__(app, minimum_size)
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        out = self._compressor.process(body)
+        return out + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """gzip / brotli for bodies of at least `minimum_size` bytes."""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=GZIP_LEVEL)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = Headers(scope=scope).get("Accept-Encoding", "")
+        if brotli is not None and accepts_encoding(accept, "br"):
+            responder = BrotliResponder(self.app, self.minimum_size)
+        elif accepts_encoding(accept, "gzip"):
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
@@ -0,0 +1,289 @@
+"""
+Incrementally maintained usage statistics per bot per hour.
+
+refresh_rollups() folds every message / conversation created since the
+last run (tracked by id high-water marks in RollupState) into
+BotUsageHourly rows, so dashboards read O(hours) rows instead of
+scanning `message`. Both tables are AUTOINCREMENT, so an id is never
+handed out twice and every new row lands above the marks; rows that
+restore had to renumber carry restored_from and are skipped. Distinct
+users and latency percentiles are stored as mergeable sketches (see
+sketches.py) so hours can be combined.
+
+With sharding each shard has its own marks (RollupState "bot_usage:shard<i>")
+and folds into the same BotUsageHourly rows in the catalog. Message ids
+only grow within a shard; rebalance catches every mark up before moving
+rows and then sets the marks of every target shard past what it holds, so
+moved rows are neither lost nor counted twice.
+
+The stats endpoint refreshes before reading; for large backlogs run it
+from cron / a scheduler as well:
+
+    python -m backend.utils.rollups
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, tuple_, update
+from sqlmodel import Session, select
+
+from ..models import Bot, BotUsageHourly, Conversation, Message, RollupState
+from ..sharding import all_shards, bind_shard
+from .sketches import HyperLogLog, add_latency, merge_histograms, quantiles
+
+ROLLUP_NAME = "bot_usage"
+ROLLUP_BATCH = 5000
+READ_REFRESH_BATCHES = 10   # bound the catch-up work done inside a request
+
+
+def _hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+class _Partial:
+    __slots__ = ("messages", "user_messages", "sessions", "latency_count",
+                 "latency_sum_ms", "latency_hist", "users")
+
+    def __init__(self):
+        self.messages = self.user_messages = self.sessions = 0
+        self.latency_count = self.latency_sum_ms = 0
+        self.latency_hist: Dict[str, int] = {}
+        self.users: Optional[HyperLogLog] = None
+
+
+# ─────────────────────────────────────────────
+# INCREMENTAL JOB
+# ─────────────────────────────────────────────
+
+def rollup_name(shard: Optional[int]) -> str:
+    return ROLLUP_NAME if shard is None else f"{ROLLUP_NAME}:shard{shard}"
+
+
+def _load_state(session: Session, name: str) -> RollupState:
+    state = session.get(RollupState, name)
+    if state is None:
+        # A new shard starts where the unsharded rollup stopped: the rows
+        # rebalanced out of the catalog were counted there
+        base = session.get(RollupState, ROLLUP_NAME) if name != ROLLUP_NAME else None
+        state = RollupState(
+            name=name,
+            last_message_id=base.last_message_id if base else 0,
+            last_conversation_id=base.last_conversation_id if base else 0,
+        )
+        session.add(state)
+        session.commit()
+        session.refresh(state)
+    return state
+
+
+def _apply_batch(session: Session, state: RollupState, batch: int) -> Optional[Dict]:
+    """Fold the next batch into the rollups. None when another worker got there first."""
+    last_message_id, last_conversation_id = state.last_message_id, state.last_conversation_id
+
+    messages = session.exec(
+        select(
+            Message.id, Message.role, Message.latency_ms, Message.created_at,
+            Conversation.bot_id, func.coalesce(Conversation.user_id, Bot.owner_id),
+        )
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .outerjoin(Bot, Bot.id == Conversation.bot_id)
+        .where(Message.id > last_message_id, Message.restored_from.is_(None))
+        .order_by(Message.id)
+        .limit(batch)
+    ).all()
+    conversations = session.exec(
+        select(Conversation.id, Conversation.bot_id, Conversation.created_at)
+        .where(Conversation.id > last_conversation_id)
+        .order_by(Conversation.id)
+        .limit(batch)
+    ).all()
+    session.rollback()  # end the read transaction before taking the write lock
+
+    if not messages and not conversations:
+        return {"messages": 0, "conversations": 0, "done": True}
+
+    partials: Dict[tuple, _Partial] = defaultdict(_Partial)
+    for _, role, latency_ms, created_at, bot_id, user_id in messages:
+        p = partials[(bot_id, _hour(created_at))]
+        p.messages += 1
+        if role == "user":
+            p.user_messages += 1
+            if user_id is not None:
+                p.users = p.users or HyperLogLog()
+                p.users.add(user_id)
+        if latency_ms is not None:
+            p.latency_count += 1
+            p.latency_sum_ms += latency_ms
+            add_latency(p.latency_hist, latency_ms)
+    for _, bot_id, created_at in conversations:
+        partials[(bot_id, _hour(created_at))].sessions += 1
+
+    new_message_id = messages[-1][0] if messages else last_message_id
+    new_conversation_id = conversations[-1][0] if conversations else last_conversation_id
+
+    # Compare-and-set on the high-water marks: the first write of the
+    # transaction, so concurrent runs can never double count a batch
+    moved = session.execute(
+        update(RollupState)
+        .where(
+            RollupState.name == state.name,
+            RollupState.last_message_id == last_message_id,
+            RollupState.last_conversation_id == last_conversation_id,
+        )
+        .values(
+            last_message_id=new_message_id,
+            last_conversation_id=new_conversation_id,
+            updated_at=datetime.utcnow(),
+        )
+    ).rowcount
+    if not moved:
+        session.rollback()
+        return None
+
+    existing = {
+        (row.bot_id, row.hour): row
+        for row in session.exec(
+            select(BotUsageHourly).where(
+                tuple_(BotUsageHourly.bot_id, BotUsageHourly.hour).in_(list(partials))
+            )
+        )
+    }
+
+    for (bot_id, hour), p in partials.items():
+        row = existing.get((bot_id, hour)) or BotUsageHourly(bot_id=bot_id, hour=hour)
+        row.messages += p.messages
+        row.user_messages += p.user_messages
+        row.sessions += p.sessions
+        row.latency_count += p.latency_count
+        row.latency_sum_ms += p.latency_sum_ms
+        if p.latency_hist:
+            row.latency_hist = merge_histograms([row.latency_hist, p.latency_hist])
+        if p.users:
+            row.users_hll = HyperLogLog.from_bytes(row.users_hll).merge(p.users).to_bytes()
+        session.add(row)
+
+    session.commit()
+    session.expunge_all()
+    return {
+        "messages": len(messages),
+        "conversations": len(conversations),
+        "done": len(messages) < batch and len(conversations) < batch,
+    }
+
+
+def refresh_rollups(
+    session: Session,
+    batch: int = ROLLUP_BATCH,
+    max_batches: Optional[int] = None,
+) -> Dict:
+    """
+    Catch the hourly rollups up with new messages and conversations, on
+    every shard (`max_batches` applies per shard). Rebinds `session`.
+    """
+    stats = {"messages": 0, "conversations": 0, "batches": 0}
+
+    for shard in all_shards(session):
+        bind_shard(session, shard)
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            state = _load_state(session, rollup_name(shard))
+            result = _apply_batch(session, state, batch)
+            if result is None:
+                session.expire_all()
+                continue
+            stats["messages"] += result["messages"]
+            stats["conversations"] += result["conversations"]
+            batches += 1
+            if result["done"]:
+                break
+        stats["batches"] += batches
+
+    return stats
+
+
+def skip_to_latest(session: Session, shard: Optional[int]):
+    """Treat every row now on the session's shard as counted (after rows were copied in)."""
+    state = _load_state(session, rollup_name(shard))
+    state.last_message_id = max(state.last_message_id, session.exec(select(func.max(Message.id))).one() or 0)
+    state.last_conversation_id = max(
+        state.last_conversation_id, session.exec(select(func.max(Conversation.id))).one() or 0
+    )
+    state.updated_at = datetime.utcnow()
+    session.add(state)
+    session.commit()
+
+
+# ─────────────────────────────────────────────
+# READ PATH
+# ─────────────────────────────────────────────
+
+def bot_stats(
+    session: Session,
+    bot_id: int,
+    since: datetime,
+    until: datetime,
+    granularity: str = "hour",
+) -> Dict:
+    """Totals and a time series for one bot, computed from the hourly rows only."""
+    rows = session.exec(
+        select(BotUsageHourly)
+        .where(
+            BotUsageHourly.bot_id == bot_id,
+            BotUsageHourly.hour >= _hour(since),
+            BotUsageHourly.hour < until,
+        )
+        .order_by(BotUsageHourly.hour)
+    ).all()
+
+    def summarize(group) -> Dict:
+        users = HyperLogLog()
+        for row in group:
+            if row.users_hll:
+                users.merge(HyperLogLog.from_bytes(row.users_hll))
+        latency_count = sum(r.latency_count for r in group)
+        return {
+            "messages": sum(r.messages for r in group),
+            "user_messages": sum(r.user_messages for r in group),
+            "sessions": sum(r.sessions for r in group),
+            "active_users": users.count(),
+            "latency_ms": {
+                "mean": round(sum(r.latency_sum_ms for r in group) / latency_count, 1) if latency_count else None,
+                **quantiles(merge_histograms(r.latency_hist for r in group)),
+            },
+        }
+
+    buckets: Dict[datetime, list] = defaultdict(list)
+    for row in rows:
+        start = row.hour if granularity == "hour" else row.hour.replace(hour=0)
+        buckets[start].append(row)
+
+    return {
+        "bot_id": bot_id,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "granularity": granularity,
+        "totals": summarize(rows),
+        "series": [{"start": start.isoformat(), **summarize(group)} for start, group in buckets.items()],
+    }
+
+
+def default_range(days: int = 7):
+    until = _hour(datetime.utcnow()) + timedelta(hours=1)
+    return until - timedelta(days=days), until
+
+
+def main():
+    from ..db import init_db
+    from ..sharding import new_session, router
+
+    init_db()
+    if router.enabled:
+        router.init()
+    with new_session() as session:
+        stats = refresh_rollups(session)
+    print(f"✅ Rolled up {stats['messages']} messages, {stats['conversations']} conversations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import json
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, text
+from sqlmodel import select
+
+from ..models import Bot, Conversation, Message
+
+# FTS5 index over message.text. It is an external-content table reading
+# from the message_search_src view, so the text is stored once (in
+# `message`). Besides the text it indexes a `scope` column of owner tokens
+# ("u<user_id> b<bot_id>"), which turns user/bot scoping into a posting
+# list intersection instead of a post-filter over every match.
+# Conversations created before user_id was recorded get "u0"; their bot's
+# owner finds them through the bot token. The view only reads chat tables,
+# so shard files (which see `bot` only through the attached catalog) hold
+# the same index.
+# The triggers keep it in sync whichever code path writes the rows.
+# Archiving moves rows out of `message` but keeps their entries: the
+# ArchivedMessage stub of an id makes the insert / delete triggers skip it.
+SCOPE_SQL = "'u' || coalesce(c.user_id, 0) || ' b' || c.bot_id"
+# Before shards had their own index, legacy rows were filed under the bot owner
+OLD_SCOPE_SQL = "'u' || coalesce(c.user_id, b.owner_id, 0) || ' b' || c.bot_id"
+
+FTS_SCHEMA = [
+    f"""
+    CREATE VIEW IF NOT EXISTS message_search_src AS
+    SELECT m.id AS id,
+           m.text AS text,
+           {SCOPE_SQL} AS scope
+    FROM message m
+    JOIN conversation c ON c.id = m.conversation_id
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+        text,
+        scope,
+        content='message_search_src',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    # External-content deletes must pass the exact indexed values, so they
+    # run BEFORE the row (and its conversation) disappear.
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message
+    WHEN NOT EXISTS (SELECT 1 FROM archivedmessage WHERE id = new.id) BEGIN
+        INSERT INTO message_fts(rowid, text, scope)
+        SELECT id, text, scope FROM message_search_src WHERE id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_bd BEFORE DELETE ON message
+    WHEN NOT EXISTS (SELECT 1 FROM archivedmessage WHERE id = old.id) BEGIN
+        INSERT INTO message_fts(message_fts, rowid, text, scope)
+        SELECT 'delete', id, text, scope FROM message_search_src WHERE id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_bu BEFORE UPDATE OF text ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, text, scope)
+        SELECT 'delete', id, text, scope FROM message_search_src WHERE id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF text ON message BEGIN
+        INSERT INTO message_fts(rowid, text, scope)
+        SELECT id, text, scope FROM message_search_src WHERE id = new.id;
+    END
+    """,
+    # Messages go first whenever a conversation is deleted
+    """
+    CREATE TRIGGER IF NOT EXISTS conversation_messages_bd BEFORE DELETE ON conversation BEGIN
+        DELETE FROM message WHERE conversation_id = old.id;
+    END
+    """,
+]
+
+SNIPPET_TOKENS = 12
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# For writing entries directly (archived messages); never created by create_all
+message_fts = Table(
+    "message_fts", MetaData(),
+    Column("message_fts", String), Column("rowid", Integer),
+    Column("text", String), Column("scope", String),
+)
+
+
+def init_search(conn):
+    """Create the FTS table, view + triggers, backfilling existing messages once."""
+    created = not conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'message_fts'"
+    ).first()
+    view = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'message_search_src'"
+    ).scalar()
+
+    # Triggers are recreated on every start so changed definitions apply
+    triggers = conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'message\\_fts\\_%' ESCAPE '\\'"
+    ).scalars().all()
+    for trigger in triggers:
+        conn.exec_driver_sql(f'DROP TRIGGER "{trigger}"')
+
+    if view and "owner_id" in view:
+        if not created:
+            _rescope_legacy_rows(conn)
+        conn.exec_driver_sql("DROP VIEW message_search_src")
+
+    for ddl in FTS_SCHEMA:
+        conn.exec_driver_sql(ddl)
+
+    if created:
+        # Rank on the text column only; scope tokens must not affect scores
+        conn.exec_driver_sql(
+            "INSERT INTO message_fts(message_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')"
+        )
+        conn.exec_driver_sql("INSERT INTO message_fts(message_fts) VALUES ('rebuild')")
+        add_entries(conn, archived_entries(conn))
+
+
+def _rescope_legacy_rows(conn):
+    """Re-file the entries of legacy rows on owned bots from "u<owner>" to "u0"."""
+    legacy = "c.user_id IS NULL AND b.owner_id IS NOT NULL"
+    hot = f"""
+        SELECT m.id FROM message m
+        JOIN conversation c ON c.id = m.conversation_id
+        JOIN bot b ON b.id = c.bot_id
+        WHERE {legacy}
+    """
+    conn.exec_driver_sql(f"""
+        INSERT INTO message_fts(message_fts, rowid, text, scope)
+        SELECT 'delete', id, text, scope FROM message_search_src WHERE id IN ({hot})
+    """)
+    forget_entries(conn, archived_entries(conn, legacy, scope=OLD_SCOPE_SQL))
+
+    conn.exec_driver_sql("DROP VIEW message_search_src")
+    conn.exec_driver_sql(FTS_SCHEMA[0])
+    conn.exec_driver_sql(f"""
+        INSERT INTO message_fts(rowid, text, scope)
+        SELECT id, text, scope FROM message_search_src WHERE id IN ({hot})
+    """)
+    add_entries(conn, archived_entries(conn, legacy))
+
+
+def build_match_query(
+    q: str,
+    user_id: int,
+    bot_id: Optional[int] = None,
+    owned_bots: Iterable[int] = (),
+) -> Optional[str]:
+    """
+    Turn free user input into a safe FTS5 query: every word must match,
+    the last word as a prefix (search-as-you-type), restricted to the
+    user's (and optionally one bot's) scope tokens. Legacy rows ("u0")
+    are included for the bots in `owned_bots`.
+    """
+    terms = TERM_RE.findall(q)
+    if not terms:
+        return None
+
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+
+    owned = sorted({int(b) for b in owned_bots})
+    if bot_id is not None:
+        owned = [b for b in owned if b == int(bot_id)]
+    scope = f"scope:u{int(user_id)}"
+    if owned:
+        scope = f"(scope:u{int(user_id)} OR (scope:u0 AND ({' OR '.join(f'scope:b{b}' for b in owned)})))"
+    if bot_id is not None:
+        scope += f" AND scope:b{int(bot_id)}"
+    return f"{scope} AND text:({' '.join(quoted)})"
+
+
+# ─────────────────────────────────────────────
+# ENTRIES OF ARCHIVED MESSAGES
+# ─────────────────────────────────────────────
+
+def conversation_scopes(session, conversation_ids: Iterable[int]) -> Dict[int, str]:
+    """The scope tokens message_search_src gives each conversation's messages."""
+    rows = session.exec(
+        select(Conversation.id, Conversation.user_id, Conversation.bot_id)
+        .where(Conversation.id.in_(list(conversation_ids)))
+    ).all()
+    return {
+        conversation_id: f"u{user_id or 0} b{bot_id}"
+        for conversation_id, user_id, bot_id in rows
+    }
+
+
+def archived_entries(conn, where: str = "1", scope: str = SCOPE_SQL) -> List[Tuple[int, str, str]]:
+    """
+    (rowid, text, scope) of the stubbed archived messages of the
+    conversations matching `where` (SQL over `c` = conversation, `b` = bot),
+    read straight from the archives.
+    """
+    from .archive import decompress  # archive imports this module
+
+    entries = []
+    archives = conn.exec_driver_sql(f"""
+        SELECT a.conversation_id, a.codec, a.payload, {scope}
+        FROM conversationarchive a
+        JOIN conversation c ON c.id = a.conversation_id
+        LEFT JOIN bot b ON b.id = c.bot_id
+        WHERE {where}
+    """).all()
+    for conversation_id, codec, payload, conversation_scope in archives:
+        stubbed = set(conn.exec_driver_sql(
+            "SELECT id FROM archivedmessage WHERE conversation_id = ?", (conversation_id,)
+        ).scalars())
+        for line in decompress(codec, payload).splitlines():
+            if line:
+                row = json.loads(line)
+                if row["id"] in stubbed:
+                    entries.append((row["id"], row["text"], conversation_scope))
+    return entries
+
+
+def add_entries(session, entries: List[Tuple[int, str, str]]):
+    """Index (rowid, text, scope) entries whose text is not in `message` (session or connection)."""
+    if entries:
+        session.execute(insert(message_fts), [
+            {"rowid": rowid, "text": body, "scope": scope} for rowid, body, scope in entries
+        ])
+
+
+def forget_entries(session, entries: List[Tuple[int, str, str]]):
+    """Drop entries added by add_entries(); the values must be the indexed ones."""
+    if entries:
+        session.execute(insert(message_fts), [
+            {"message_fts": "delete", "rowid": rowid, "text": body, "scope": scope}
+            for rowid, body, scope in entries
+        ])
+
+
+def _fold(token: str) -> str:
+    # Same folding as the unicode61 tokenizer with remove_diacritics
+    decomposed = unicodedata.normalize("NFKD", token.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def make_snippet(body: str, q: str, tokens: int = SNIPPET_TOKENS) -> str:
+    """snippet() for text FTS5 cannot read (archived messages)."""
+    terms = [_fold(t) for t in TERM_RE.findall(q)]
+    words = list(TERM_RE.finditer(body))
+    if not words or not terms:
+        return body
+
+    def matches(word: str) -> bool:
+        word = _fold(word)
+        return word in terms[:-1] or word.startswith(terms[-1])
+
+    first = next((i for i, w in enumerate(words) if matches(w.group())), 0)
+    start = max(0, min(first - tokens // 4, len(words) - tokens))
+    end = min(len(words), start + tokens)
+
+    parts, pos = [], words[start].start()
+    for w in words[start:end]:
+        parts.append(body[pos:w.start()])
+        parts.append(f"<mark>{w.group()}</mark>" if matches(w.group()) else w.group())
+        pos = w.end()
+    return ("…" if start else "") + "".join(parts) + ("…" if end < len(words) else "")
+
+
+# ─────────────────────────────────────────────
+# QUERY
+# ─────────────────────────────────────────────
+
+def search_messages(
+    session,
+    user_id: int,
+    q: str,
+    bot_id: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> Dict:
+    """
+    Ranked (bm25) search over the messages of one user's conversations,
+    archived ones included. Conversations created before user_id was
+    recorded fall back to bot ownership.
+    """
+    owned_bots = session.exec(select(Bot.id).where(Bot.owner_id == user_id)).all()
+    match = build_match_query(q, user_id, bot_id, owned_bots)
+    if not match:
+        return {"results": [], "has_more": False}
+    # Raw SQL carries no tables: route it like the message table (to the shard)
+    on_messages = {"mapper": Message.__mapper__}
+
+    # ORDER BY rank is answered inside FTS5 from the index alone; the text
+    # (snippets) is only read for the hits on this page
+    hits = session.execute(text("""
+        SELECT rowid, rank
+        FROM message_fts
+        WHERE message_fts MATCH :match
+        ORDER BY rank
+        LIMIT :limit OFFSET :offset
+    """), {"match": match, "limit": limit + 1, "offset": offset}, bind_arguments=on_messages).all()
+
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    if not hits:
+        return {"results": [], "has_more": False}
+
+    ids = {f"id{i}": h[0] for i, h in enumerate(hits)}
+    placeholders = ", ".join(f":{key}" for key in ids)
+    rows = {
+        r.id: r
+        for r in session.execute(text(f"""
+            SELECT m.id, m.conversation_id, m.role, m.created_at, c.session_id, c.bot_id, 0 AS archived
+            FROM message m
+            JOIN conversation c ON c.id = m.conversation_id
+            WHERE m.id IN ({placeholders})
+            UNION ALL
+            SELECT a.id, a.conversation_id, a.role, a.created_at, c.session_id, c.bot_id, 1
+            FROM archivedmessage a
+            JOIN conversation c ON c.id = a.conversation_id
+            WHERE a.id IN ({placeholders})
+        """), ids, bind_arguments=on_messages).all()
+    }
+
+    hot = {r.id for r in rows.values() if not r.archived}
+    snippets = {}
+    if hot:
+        hot_ids = {f"id{i}": message_id for i, message_id in enumerate(hot)}
+        snippets = dict(session.execute(text(f"""
+            SELECT rowid, snippet(message_fts, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS})
+            FROM message_fts
+            WHERE message_fts MATCH :match AND rowid IN ({", ".join(f":{key}" for key in hot_ids)})
+        """), {"match": match, **hot_ids}, bind_arguments=on_messages).all())
+
+    cold: Dict[int, List[int]] = {}
+    for r in rows.values():
+        if r.archived:
+            cold.setdefault(r.conversation_id, []).append(r.id)
+    if cold:
+        from .archive import archived_texts  # archive imports this module
+
+        for message_id, body in archived_texts(session, cold).items():
+            snippets[message_id] = make_snippet(body, q)
+
+    results: List[Dict] = []
+    for message_id, score in hits:
+        r = rows.get(message_id)
+        if r is None:
+            continue
+        results.append({
+            "message_id": r.id,
+            "conversation_id": r.conversation_id,
+            "session_id": r.session_id,
+            "bot_id": r.bot_id,
+            "role": r.role,
+            "created_at": str(r.created_at),
+            "archived": bool(r.archived),
+            "snippet": snippets.get(message_id, ""),
+            "score": round(-score, 4),
+        })
+
+    return {"results": results, "has_more": has_more}
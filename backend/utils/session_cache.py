@@ -0,0 +1,137 @@
+"""
+In-process cache: session_id -> (conversation_id, bot_id, bot owner_id,
+conversation user_id).
+
+Every turn and history read starts by resolving the session and checking
+who may use it; on a hot session that now costs no queries. Keys are the
+16 raw bytes of the session UUID (session ids that are not UUIDs fall
+back to their UTF-8 bytes). Entries are filled on create_session and on
+first lookup, and dropped by delete_conversations().
+
+Sessions never move between bots or users and bots never change owner, so the only
+invalidation needed is deletion (rebalancing shards runs with the app
+stopped). With several workers a deleted session
+can linger in the other workers' caches until evicted; callers still get
+a 404 once they load the conversation row.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from sqlmodel import Session, select
+
+from ..models import Bot, Conversation, ConversationShard
+from ..sharding import ShardedSession, bind_shard
+
+MAX_SESSIONS = 100_000
+
+
+class SessionInfo(NamedTuple):
+    conversation_id: int
+    bot_id: int
+    owner_id: Optional[int]   # None for system bots
+    user_id: Optional[int]    # None for legacy rows
+    shard: Optional[int] = None
+
+    def allows(self, user_id: int) -> bool:
+        """May `user_id` read it? Same rules as purge.can_read_conversation."""
+        if self.user_id is not None and self.user_id == user_id:
+            return True
+        if self.owner_id is not None:
+            return self.owner_id == user_id
+        return self.user_id is None
+
+    def allows_posting(self, user_id: int) -> bool:
+        """May `user_id` add turns? Same rules as purge.can_delete_conversation."""
+        if self.user_id is not None:
+            return self.user_id == user_id
+        return self.owner_id is not None and self.owner_id == user_id
+
+
+def session_key(session_id: str) -> bytes:
+    try:
+        return uuid.UUID(session_id).bytes
+    except ValueError:
+        return session_id.encode("utf-8")
+
+
+class SessionCache:
+    def __init__(self, max_entries: int = MAX_SESSIONS):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, SessionInfo]" = OrderedDict()
+        self._keys: Dict[int, bytes] = {}  # conversation_id -> key
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str) -> Optional[SessionInfo]:
+        key = session_key(session_id)
+        with self._lock:
+            info = self._entries.get(key)
+            if info is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return info
+
+    def put(self, session_id: str, info: SessionInfo):
+        key = session_key(session_id)
+        with self._lock:
+            self._entries[key] = info
+            self._entries.move_to_end(key)
+            self._keys[info.conversation_id] = key
+            while len(self._entries) > self.max_entries:
+                _, old = self._entries.popitem(last=False)
+                self._keys.pop(old.conversation_id, None)
+
+    def forget_conversation(self, conversation_id: int):
+        with self._lock:
+            key = self._keys.pop(conversation_id, None)
+            if key is not None:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+sessions = SessionCache()
+
+
+def remember_session(conv: Conversation, owner_id: Optional[int], shard: Optional[int] = None):
+    sessions.put(conv.session_id, SessionInfo(conv.id, conv.bot_id, owner_id, conv.user_id, shard))
+
+
+def resolve_session(db: Session, session_id: str) -> Optional[SessionInfo]:
+    """
+    Cached lookup; one joined query on a miss, None if the session does not
+    exist. With sharding, also binds `db` to the conversation's shard.
+    """
+    info = sessions.get(session_id)
+    if info is None:
+        if isinstance(db, ShardedSession):
+            query = (
+                select(ConversationShard.conversation_id, ConversationShard.bot_id, Bot.owner_id,
+                       ConversationShard.user_id, ConversationShard.shard)
+                .join(Bot, Bot.id == ConversationShard.bot_id)
+                .where(ConversationShard.session_id == session_id)
+            )
+        else:
+            query = (
+                select(Conversation.id, Conversation.bot_id, Bot.owner_id, Conversation.user_id)
+                .join(Bot, Bot.id == Conversation.bot_id)
+                .where(Conversation.session_id == session_id)
+            )
+        row = db.exec(query).first()
+        if row is None:
+            return None
+        info = SessionInfo(*row)
+        sessions.put(session_id, info)
+
+    bind_shard(db, info.shard)
+    return info
+
+
+def forget_conversation(conversation_id: int):
+    sessions.forget_conversation(conversation_id)
@@ -0,0 +1,116 @@
+"""
+Small mergeable sketches for the usage rollups.
+
+Both can be combined across hours without the raw data:
+HyperLogLog for distinct users, log-bucketed histograms for latency
+percentiles (relative error ~4%).
+"""
+import hashlib
+import math
+import struct
+from typing import Dict, Iterable, Optional
+
+
+# ─────────────────────────────────────────────
+# DISTINCT COUNT (HyperLogLog)
+# ─────────────────────────────────────────────
+
+class HyperLogLog:
+    P = 10                 # 1024 registers, ~3% standard error
+    M = 1 << P
+    _DENSE, _SPARSE = b"D", b"S"
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Optional[bytearray] = None):
+        self.registers = registers if registers is not None else bytearray(self.M)
+
+    def add(self, value) -> None:
+        h = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+        index = h >> (64 - self.P)
+        rest = h & ((1 << (64 - self.P)) - 1)
+        rank = (64 - self.P) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        m = self.M
+        zeros = self.registers.count(0)
+        if zeros == m:
+            return 0
+
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in self.registers)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small sets
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """Sparse (index, rank) pairs while most registers are empty, dense after."""
+        used = [(i, r) for i, r in enumerate(self.registers) if r]
+        if len(used) * 3 < self.M:
+            return self._SPARSE + b"".join(struct.pack(">HB", i, r) for i, r in used)
+        return self._DENSE + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "HyperLogLog":
+        hll = cls()
+        if not data:
+            return hll
+        if data[:1] == cls._DENSE:
+            hll.registers = bytearray(data[1:])
+        else:
+            for i, r in struct.iter_unpack(">HB", data[1:]):
+                hll.registers[i] = r
+        return hll
+
+
+# ─────────────────────────────────────────────
+# LATENCY HISTOGRAM (log buckets)
+# ─────────────────────────────────────────────
+
+GAMMA = 1.08
+_LOG_GAMMA = math.log(GAMMA)
+
+
+def bucket_of(value_ms: float) -> int:
+    return 0 if value_ms <= 1 else int(math.ceil(math.log(value_ms) / _LOG_GAMMA))
+
+
+def bucket_value(bucket: int) -> float:
+    """Representative value of a bucket (its midpoint in log space)."""
+    return 1.0 if bucket <= 0 else 2 * GAMMA ** bucket / (GAMMA + 1)
+
+
+def add_latency(hist: Dict[str, int], value_ms: float) -> None:
+    key = str(bucket_of(value_ms))
+    hist[key] = hist.get(key, 0) + 1
+
+
+def merge_histograms(hists: Iterable[Dict[str, int]]) -> Dict[str, int]:
+    merged: Dict[str, int] = {}
+    for hist in hists:
+        for key, n in (hist or {}).items():
+            merged[key] = merged.get(key, 0) + n
+    return merged
+
+
+def quantiles(hist: Dict[str, int], qs=(0.5, 0.95, 0.99)) -> Dict[str, Optional[float]]:
+    total = sum(hist.values())
+    out = {f"p{int(q * 100)}": None for q in qs}
+    if not total:
+        return out
+
+    buckets = sorted((int(k), n) for k, n in hist.items())
+    for q in qs:
+        target = q * (total - 1)
+        seen = 0
+        for bucket, n in buckets:
+            seen += n
+            if seen > target:
+                out[f"p{int(q * 100)}"] = round(bucket_value(bucket), 1)
+                break
+    return out
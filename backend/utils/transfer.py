@@ -0,0 +1,406 @@
+"""
+Bulk export / import of chat history as gzip-compressed JSONL.
+
+One record per line, tagged by "type":
+
+    {"type": "header", "version": 1, ...}
+    {"type": "conversation", "id": 7, "bot_id": 2, "session_id": ..., ...}
+    {"type": "message", "conversation_id": 7, "role": "user", "text": ..., ...}
+    {"type": "user_memory", "bot_id": 2, "key": "name", "value": ...}
+
+A conversation's messages always follow the conversation record, so the
+importer can remap ids while streaming. Both directions work in fixed
+size batches: memory stays flat no matter how much history is moved.
+
+    python -m backend.utils.transfer export --user-id 1 -o history.jsonl.gz
+    python -m backend.utils.transfer import --user-id 1 history.jsonl.gz
+"""
+import argparse
+import gzip
+import io
+import json
+import uuid
+import zlib
+from datetime import datetime
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from ..models import Bot, Conversation, ConversationArchive, ConversationShard, Message, UserMemory
+from .archive import decompress
+from .purge import owned_conversations
+from ..sharding import bind_shard, bind_user, register_rows, user_shards
+
+FORMAT_VERSION = 1
+CONVERSATION_BATCH = 500
+MESSAGE_BATCH = 2000
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _ts(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse_ts(value: Optional[str]) -> datetime:
+    return datetime.fromisoformat(value) if value else datetime.utcnow()
+
+
+# ─────────────────────────────────────────────
+# EXPORT
+# ─────────────────────────────────────────────
+
+def export_records(
+    session: Session,
+    user_id: int,
+    bot_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[Dict]:
+    """
+    Yield export records for one user's history. The time range applies
+    to when conversations were started; each selected conversation is
+    exported whole, including messages held in the archive tier.
+    """
+    yield {
+        "type": "header",
+        "version": FORMAT_VERSION,
+        "exported_at": datetime.utcnow().isoformat(),
+        "user_id": user_id,
+        "bot_id": bot_id,
+        "since": _ts(since),
+        "until": _ts(until),
+    }
+
+    scope = owned_conversations(user_id, bot_id)
+    if since:
+        scope = scope.where(Conversation.created_at >= since)
+    if until:
+        scope = scope.where(Conversation.created_at < until)
+
+    for shard in user_shards(session, user_id, bot_id):
+        bind_shard(session, shard)
+        yield from _conversation_records(session, scope)
+
+    bind_user(session, user_id)
+    memories = select(UserMemory).where(UserMemory.user_id == user_id).order_by(UserMemory.id)
+    if bot_id is not None:
+        memories = memories.where(UserMemory.bot_id == bot_id)
+
+    for m in session.exec(memories.execution_options(yield_per=MESSAGE_BATCH)):
+        yield {
+            "type": "user_memory",
+            "bot_id": m.bot_id,
+            "key": m.key,
+            "value": m.value,
+            "created_at": _ts(m.created_at),
+            "updated_at": _ts(m.updated_at),
+        }
+
+
+def _conversation_records(session: Session, scope) -> Iterator[Dict]:
+    """Conversation and message records of the conversations in `scope`, on the bound shard."""
+    after_id = 0
+    while True:
+        convs = session.exec(
+            select(Conversation)
+            .where(Conversation.id.in_(scope), Conversation.id > after_id)
+            .order_by(Conversation.id)
+            .limit(CONVERSATION_BATCH)
+        ).all()
+        if not convs:
+            break
+        after_id = convs[-1].id
+
+        archived = []
+        for conv in convs:
+            meta = dict(conv.metadata_json or {})
+            if meta.pop("archived", None):
+                archived.append(conv.id)
+            yield {
+                "type": "conversation",
+                "id": conv.id,
+                "bot_id": conv.bot_id,
+                "session_id": conv.session_id,
+                "created_at": _ts(conv.created_at),
+                "metadata": meta,
+            }
+
+        # Streamed row by row; never materialised for the whole batch
+        rows = session.execute(
+            select(
+                Message.conversation_id, Message.role, Message.text,
+                Message.latency_ms, Message.created_at,
+            )
+            .where(Message.conversation_id.in_([c.id for c in convs]))
+            .order_by(Message.conversation_id, Message.id)
+            .execution_options(yield_per=MESSAGE_BATCH)
+        )
+        for conversation_id, role, text, latency_ms, created_at in rows:
+            yield {
+                "type": "message",
+                "conversation_id": conversation_id,
+                "role": role,
+                "text": text,
+                "latency_ms": latency_ms,
+                "created_at": _ts(created_at),
+            }
+
+        for archive in session.exec(
+            select(ConversationArchive).where(ConversationArchive.conversation_id.in_(archived))
+        ):
+            for line in decompress(archive.codec, archive.payload).splitlines():
+                if line:
+                    row = json.loads(line)
+                    row.pop("id", None)
+                    row.pop("restored_from", None)
+                    yield {"type": "message", "conversation_id": archive.conversation_id, **row}
+
+        session.expunge_all()
+
+
+def gzip_jsonl(records: Iterable[Dict], level: int = 6) -> Iterator[bytes]:
+    """Encode records as gzip JSONL, yielding compressed chunks as they fill."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+    pending: List[bytes] = []
+    size = 0
+
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        pending.append(line)
+        size += len(line)
+        if size >= STREAM_CHUNK_BYTES:
+            chunk = compressor.compress(b"".join(pending))
+            pending, size = [], 0
+            if chunk:
+                yield chunk
+
+    yield compressor.compress(b"".join(pending)) + compressor.flush()
+
+
+# ─────────────────────────────────────────────
+# IMPORT
+# ─────────────────────────────────────────────
+
+def open_jsonl(stream: IO[bytes]) -> Iterator[Dict]:
+    """Parse a (optionally gzip-compressed) JSONL stream incrementally."""
+    if not stream.seekable():
+        stream = io.BufferedReader(stream)
+        magic = stream.peek(2)[:2]
+    else:
+        magic = stream.read(2)
+        stream.seek(0)
+    if magic == b"\x1f\x8b":
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class _Importer:
+    def __init__(self, session: Session, user_id: int, bot_id: Optional[int]):
+        self.session = session
+        self.user_id = user_id
+        self.target_bot = bot_id
+        self.allowed_bots: Dict[int, bool] = {}
+        self.conversation_ids: Dict[int, int] = {}  # exported id -> new id
+        self.conversations: List[Dict] = []
+        self.messages: List[Dict] = []
+        self.memories: List[Dict] = []
+        self.stats = {"conversations": 0, "messages": 0, "user_memories": 0, "skipped": 0}
+
+    def _bot_for(self, bot_id: Optional[int]) -> Optional[int]:
+        bot_id = self.target_bot or bot_id
+        if bot_id not in self.allowed_bots:
+            bot = self.session.get(Bot, bot_id) if bot_id else None
+            self.allowed_bots[bot_id] = bool(bot) and bot.owner_id in (None, self.user_id)
+        return bot_id if self.allowed_bots[bot_id] else None
+
+    def add(self, record: Dict):
+        kind = record.get("type")
+        if kind == "conversation":
+            self.conversations.append(record)
+            if len(self.conversations) >= CONVERSATION_BATCH:
+                self.flush_conversations()
+        elif kind == "message":
+            if self.conversations:
+                self.flush_conversations()
+            self.messages.append(record)
+            if len(self.messages) >= MESSAGE_BATCH:
+                self.flush_messages()
+        elif kind == "user_memory":
+            self.memories.append(record)
+            if len(self.memories) >= MESSAGE_BATCH:
+                self.flush_memories()
+        elif kind != "header":
+            self.stats["skipped"] += 1
+
+    def flush_conversations(self):
+        batch, self.conversations = self.conversations, []
+        rows, old_ids = [], []
+        for record in batch:
+            bot_id = self._bot_for(record.get("bot_id"))
+            if bot_id is None:
+                self.stats["skipped"] += 1
+                continue
+            old_ids.append(record.get("id"))
+            rows.append({
+                "bot_id": bot_id,
+                "user_id": self.user_id,
+                "session_id": record.get("session_id") or str(uuid.uuid4()),
+                "created_at": _parse_ts(record.get("created_at")),
+                "metadata_json": record.get("metadata") or {},
+            })
+        if not rows:
+            return
+
+        # Session ids are looked up directly by the chat endpoints, so
+        # re-importing into the same database must not duplicate them
+        # (the shard directory also has those on other shards)
+        session_ids = [r["session_id"] for r in rows]
+        taken = set(self.session.exec(
+            select(Conversation.session_id).where(Conversation.session_id.in_(session_ids))
+        ).all())
+        taken.update(self.session.exec(
+            select(ConversationShard.session_id).where(ConversationShard.session_id.in_(session_ids))
+        ).all())
+        for row in rows:
+            if row["session_id"] in taken:
+                row["session_id"] = str(uuid.uuid4())
+
+        register_rows(self.session, rows)
+        table = Conversation.__table__
+        new_ids = self.session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        self.conversation_ids.update(zip(old_ids, new_ids))
+        self.stats["conversations"] += len(new_ids)
+
+    def flush_messages(self):
+        batch, self.messages = self.messages, []
+        rows = []
+        for record in batch:
+            conversation_id = self.conversation_ids.get(record.get("conversation_id"))
+            if conversation_id is None or record.get("text") is None:
+                self.stats["skipped"] += 1
+                continue
+            rows.append({
+                "conversation_id": conversation_id,
+                "role": record.get("role") or "user",
+                "text": record["text"],
+                "latency_ms": record.get("latency_ms"),
+                "created_at": _parse_ts(record.get("created_at")),
+            })
+        if rows:
+            self.session.execute(insert(Message.__table__), rows)
+            self.stats["messages"] += len(rows)
+        self.session.commit()
+
+    def flush_memories(self):
+        batch, self.memories = self.memories, []
+        latest: Dict[tuple, Dict] = {}
+        for record in batch:
+            bot_id = self._bot_for(record.get("bot_id"))
+            if bot_id is None or not record.get("key"):
+                self.stats["skipped"] += 1
+                continue
+            latest[(bot_id, record["key"])] = record
+        if not latest:
+            return
+
+        existing = {
+            (m.bot_id, m.key): m
+            for m in self.session.exec(
+                select(UserMemory).where(
+                    UserMemory.user_id == self.user_id,
+                    UserMemory.key.in_(list({key for _, key in latest})),
+                )
+            )
+        }
+        for (bot_id, key), record in latest.items():
+            memory = existing.get((bot_id, key)) or UserMemory(
+                user_id=self.user_id,
+                bot_id=bot_id,
+                key=key,
+                created_at=_parse_ts(record.get("created_at")),
+            )
+            memory.value = str(record.get("value", ""))
+            memory.updated_at = _parse_ts(record.get("updated_at"))
+            self.session.add(memory)
+        self.session.commit()
+        self.stats["user_memories"] += len(latest)
+
+    def finish(self) -> Dict:
+        self.flush_conversations()
+        self.flush_messages()
+        self.flush_memories()
+        self.session.expunge_all()
+        return self.stats
+
+
+def import_records(
+    session: Session,
+    user_id: int,
+    records: Iterable[Dict],
+    bot_id: Optional[int] = None,
+) -> Dict:
+    """
+    Insert exported records as `user_id`'s history, assigning fresh ids.
+    With `bot_id` every conversation is attached to that bot; otherwise
+    the exported bot ids must exist here and be usable by the user.
+    """
+    importer = _Importer(session, user_id, bot_id)
+    for record in records:
+        if isinstance(record, dict):
+            importer.add(record)
+        else:
+            importer.stats["skipped"] += 1
+    return importer.finish()
+
+
+# ─────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import chat history")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export")
+    exp.add_argument("--user-id", type=int, required=True)
+    exp.add_argument("--bot-id", type=int, default=None)
+    exp.add_argument("--since", type=datetime.fromisoformat, default=None)
+    exp.add_argument("--until", type=datetime.fromisoformat, default=None)
+    exp.add_argument("-o", "--output", required=True)
+
+    imp = sub.add_parser("import")
+    imp.add_argument("--user-id", type=int, required=True)
+    imp.add_argument("--bot-id", type=int, default=None)
+    imp.add_argument("path")
+
+    args = parser.parse_args()
+
+    from ..db import init_db
+    from ..sharding import new_session, router
+
+    init_db()
+    if router.enabled:
+        router.init()
+    with new_session() as session:
+        bind_user(session, args.user_id)
+        if args.command == "export":
+            records = export_records(session, args.user_id, args.bot_id, args.since, args.until)
+            with open(args.output, "wb") as f:
+                for chunk in gzip_jsonl(records):
+                    f.write(chunk)
+            print(f"✅ Exported to {args.output}")
+        else:
+            with open(args.path, "rb") as f:
+                stats = import_records(session, args.user_id, open_jsonl(f), args.bot_id)
+            print(f"✅ Imported {stats}")
+
+
+if __name__ == "__main__":
+    main()
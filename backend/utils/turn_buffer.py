@@ -0,0 +1,175 @@
+"""
+Recent turns of active conversations, kept in memory for prompt assembly.
+
+The server writes every chat message itself, so instead of re-reading
+the tail of the conversation on each turn it appends the message to a
+small per-conversation ring buffer. A buffer is built from the DB on the
+first read (or after eviction) and then maintained on the write path.
+
+Memory is bounded globally: buffers idle for IDLE_SECONDS are dropped and
+the least recently used ones go first once MAX_BUFFER_BYTES is reached.
+Delete / archive / restore call invalidate_turns().
+
+A buffer only sees messages written by its own worker, so every hit is
+checked against the newest message id in the DB (one indexed aggregate
+instead of reading the rows); a buffer that missed a write from another
+worker or job is rebuilt. TURN_BUFFER_MAX_MB=0 turns buffering off.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from ..models import Message
+
+HISTORY_TURNS = 10
+MAX_BUFFER_BYTES = int(float(os.getenv("TURN_BUFFER_MAX_MB", 32)) * 1024 * 1024)
+IDLE_SECONDS = 30 * 60
+TURN_OVERHEAD_BYTES = 120  # object header + slots, roughly
+
+
+class Turn:
+    __slots__ = ("id", "role", "text")
+
+    def __init__(self, id: int, role: str, text: str):
+        self.id = id
+        self.role = role
+        self.text = text
+
+    @property
+    def size(self) -> int:
+        return TURN_OVERHEAD_BYTES + len(self.text)
+
+
+class TurnRing:
+    __slots__ = ("turns", "bytes", "last_used")
+
+    def __init__(self, turns, maxlen: int):
+        self.turns = deque(turns, maxlen=maxlen)
+        self.bytes = sum(t.size for t in self.turns)
+        self.last_used = time.monotonic()
+
+    @property
+    def last_id(self) -> int:
+        return self.turns[-1].id if self.turns else 0
+
+    def push(self, turn: Turn) -> int:
+        """Append, returning the change in bytes."""
+        before = self.bytes
+        if len(self.turns) == self.turns.maxlen:
+            self.bytes -= self.turns[0].size
+        self.turns.append(turn)
+        self.bytes += turn.size
+        return self.bytes - before
+
+
+class TurnBuffers:
+    def __init__(self, max_bytes: int = MAX_BUFFER_BYTES, turns: int = HISTORY_TURNS):
+        self.max_bytes = max_bytes
+        self.turns = turns
+        self.bytes = 0
+        self._rings: "OrderedDict[int, TurnRing]" = OrderedDict()
+        self._building: Dict[int, int] = {}  # conversation_id -> writes seen during rebuild
+        self._lock = threading.Lock()
+
+    def recent(self, db: Session, conversation_id: int, where=None) -> List[Turn]:
+        """
+        Last `turns` messages, oldest first; reads only the newest id on a hit.
+        `where` replaces the conversation_id filter (forks, see utils.branches).
+        """
+        scope = Message.conversation_id == conversation_id if where is None else where
+        with self._lock:
+            ring = self._rings.get(conversation_id)
+
+        if ring is not None:
+            newest = db.exec(select(func.max(Message.id)).where(scope)).one()
+            with self._lock:
+                if self._rings.get(conversation_id) is ring:
+                    # Writes on this worker may have landed since; never a missed one
+                    if ring.last_id >= (newest or 0):
+                        ring.last_used = time.monotonic()
+                        self._rings.move_to_end(conversation_id)
+                        return list(ring.turns)
+                    del self._rings[conversation_id]
+                    self.bytes -= ring.bytes
+
+        with self._lock:
+            self._building.setdefault(conversation_id, 0)
+
+        try:
+            rows = db.exec(
+                select(Message.id, Message.role, Message.text)
+                .where(scope)
+                .order_by(Message.id.desc())
+                .limit(self.turns)
+            ).all()
+        except Exception:
+            with self._lock:
+                self._building.pop(conversation_id, None)
+            raise
+        turns = [Turn(*row) for row in reversed(rows)]
+
+        with self._lock:
+            # Skip caching if a message was written while we were reading
+            clean = self._building.pop(conversation_id, None) == 0
+            if clean and self.max_bytes > 0 and conversation_id not in self._rings:
+                ring = TurnRing(turns, self.turns)
+                self._rings[conversation_id] = ring
+                self.bytes += ring.bytes
+                self._evict()
+        return turns
+
+    def append(self, conversation_id: int, msg: Message):
+        """Write path: only conversations that already have a buffer are updated."""
+        with self._lock:
+            ring = self._rings.get(conversation_id)
+            if ring is None:
+                if conversation_id in self._building:
+                    self._building[conversation_id] += 1
+                return
+            # A rebuild may already have read this message from the DB
+            if msg.id <= ring.last_id:
+                return
+            self.bytes += ring.push(Turn(msg.id, msg.role, msg.text))
+            ring.last_used = time.monotonic()
+            self._rings.move_to_end(conversation_id)
+            self._evict()
+
+    def invalidate(self, conversation_id: int):
+        with self._lock:
+            if conversation_id in self._building:
+                self._building[conversation_id] += 1
+            ring = self._rings.pop(conversation_id, None)
+            if ring is not None:
+                self.bytes -= ring.bytes
+
+    def _evict(self):
+        idle_before = time.monotonic() - IDLE_SECONDS
+        while self._rings:
+            conversation_id, ring = next(iter(self._rings.items()))
+            if self.bytes <= self.max_bytes and ring.last_used >= idle_before:
+                break
+            del self._rings[conversation_id]
+            self.bytes -= ring.bytes
+
+    def __len__(self):
+        return len(self._rings)
+
+
+turn_buffers = TurnBuffers()
+
+
+def recent_turns(db: Session, conversation_id: int, where=None) -> List[Turn]:
+    return turn_buffers.recent(db, conversation_id, where)
+
+
+def record_turn(msg: Message):
+    turn_buffers.append(msg.conversation_id, msg)
+
+
+def invalidate_turns(conversation_id: int):
+    turn_buffers.invalidate(conversation_id)
@@ -4,6 +4,9 @@ const API_BASE_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
 
 console.log("[API] Using API URL:", API_BASE_URL);
 
+// Time budget for a chat turn; the server stops the LLM call when it passes
+const MESSAGE_TIMEOUT_MS = 60000;
+
 // Create axios instance
 const apiClient = axios.create({
   baseURL: API_BASE_URL,
@@ -81,7 +84,11 @@ export async function sendMessage(botId, sessionId, message) {
 
     const response = await apiClient.post(
       `/bots/${botId}/sessions/${sessionId}/message`,
-      formData
+      formData,
+      {
+        timeout: MESSAGE_TIMEOUT_MS,
+        headers: { "X-Request-Timeout-Ms": String(MESSAGE_TIMEOUT_MS) },
+      }
     );
     console.log(`[API] Message sent successfully:`, response.data);
     return response.data;